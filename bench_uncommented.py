@@ -0,0 +1,502 @@
+#!/bin/env python3
+# Benchmarks for uncommented.
+# Generates synthetic headers of configurable size and shape, measures find() on them,
+# and compares the numbers against a stored baseline so regressions show up as numbers.
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from argparse import ArgumentParser
+from typing import Callable, NamedTuple
+
+import uncommented
+
+
+class Header(NamedTuple):
+    source: bytes
+    declarations: int  # declarations the query should match
+    undocumented: int  # how many of them find() should report
+
+
+def _doc(i: int, indent: str = "") -> str:
+    """
+    Every third declaration is left undocumented.
+    """
+    return "" if i % 3 == 0 else f"{indent}/// docs for item {i}\n"
+
+
+def _undocumented(n: int) -> int:
+    return (n + 2) // 3
+
+
+def free_functions(n: int) -> Header:
+    src = "".join(f"{_doc(i)}int function_{i}(int a, char *b);\n" for i in range(n))
+    return Header(src.encode(), n, _undocumented(n))
+
+
+def inline_functions(n: int) -> Header:
+    src = "".join(
+        f"{_doc(i)}inline int inline_{i}(int a) {{ return a + {i}; }}\n"
+        for i in range(n)
+    )
+    return Header(src.encode(), n, _undocumented(n))
+
+
+def free_operators(n: int) -> Header:
+    lines = []
+    for i in range(n):
+        if i % 2:
+            lines.append(f"{_doc(i)}bool operator==(const T{i}& a, const T{i}& b);\n")
+        else:
+            lines.append(f"{_doc(i)}T{i}& operator+=(T{i}& a, int b) {{ return a; }}\n")
+    return Header("".join(lines).encode(), n, _undocumented(n))
+
+
+def huge_class(n: int) -> Header:
+    """
+    One documented class with `n` public members, interleaved with private ones
+    behind alternating access specifiers.
+    """
+    lines = ["/// docs for Huge\n", "class Huge {\n"]
+    for i in range(n):
+        lines.append("public:\n")
+        lines.append(f"{_doc(i, '    ')}    void method_{i}(int a);\n")
+        lines.append("private:\n")
+        lines.append(f"    void hidden_{i}(int a);\n")
+    lines.append("};\n")
+    return Header("".join(lines).encode(), 2 * n + 1, _undocumented(n))
+
+
+def huge_public_class(n: int) -> Header:
+    """
+    One documented class with `n` public members after a single access specifier.
+    This is the worst case for scanning back to the access specifier.
+    """
+    lines = ["/// docs for Huge\n", "class Huge {\n", "public:\n"]
+    for i in range(n):
+        lines.append(f"{_doc(i, '    ')}    void method_{i}(int a);\n")
+    lines.append("};\n")
+    return Header("".join(lines).encode(), n + 1, _undocumented(n))
+
+
+def funcptr_members(n: int) -> Header:
+    lines = ["/// docs for Ops\n", "struct Ops {\n"]
+    for i in range(n):
+        lines.append(f"{_doc(i, '    ')}    int (*callback_{i})(int a);\n")
+    lines.append("};\n")
+    return Header("".join(lines).encode(), n + 1, _undocumented(n))
+
+
+def nested_structs(n: int, depth: int = 8) -> Header:
+    """
+    `n` documented top-level structs, each nesting `depth` levels of structs.
+    Nested definitions are members, which count as undocumented.
+    """
+    lines = []
+    for i in range(n):
+        lines.append(_doc(i))
+        for level in range(depth):
+            lines.append(f"{'  ' * level}struct S{i}_{level} {{\n")
+        lines.append(f"{'  ' * depth}int value;\n")
+        for level in reversed(range(depth)):
+            lines.append(f"{'  ' * level}}}{' member' if level else ''};\n")
+    return Header(
+        "".join(lines).encode(), n * depth, _undocumented(n) + n * (depth - 1)
+    )
+
+
+def macros(n: int) -> Header:
+    lines = []
+    for i in range(n):
+        lines.append(f"{_doc(i)}#define MACRO_{i}(x, y) \\\n    ((x) * {i} + (y))\n")
+        lines.append(f"#define CONSTANT_{i} {i}\n")
+    return Header("".join(lines).encode(), n, _undocumented(n))
+
+
+def templates(n: int) -> Header:
+    lines = []
+    for i in range(n):
+        kind = ("class", "struct", "union")[i % 3]
+        lines.append(f"{_doc(i)}template <typename T, int N = {i}>\n")
+        lines.append(f"{kind} Template{i} {{ T values[N]; }};\n")
+    return Header("".join(lines).encode(), n, _undocumented(n))
+
+
+def typedefs(n: int) -> Header:
+    src = "".join(
+        f"{_doc(i)}typedef struct Tag{i} {{ int x; }} Type{i};\n" for i in range(n)
+    )
+    return Header(src.encode(), n, _undocumented(n))
+
+
+SHAPES: dict[str, Callable[[int], Header]] = {
+    "free_functions": free_functions,
+    "inline_functions": inline_functions,
+    "free_operators": free_operators,
+    "huge_class": huge_class,
+    "huge_public_class": huge_public_class,
+    "funcptr_members": funcptr_members,
+    "nested_structs": nested_structs,
+    "macros": macros,
+    "templates": templates,
+    "typedefs": typedefs,
+}
+
+# Shapes that are plain C, which the C profile can check.
+C_SHAPES = (
+    "free_functions",
+    "inline_functions",
+    "funcptr_members",
+    "nested_structs",
+    "macros",
+    "typedefs",
+)
+
+# Shapes that are quadratic in the default engine get smaller inputs.
+_SIZE_DIVISOR = {"huge_public_class": 10, "funcptr_members": 10, "nested_structs": 8}
+
+
+class Measurement(NamedTuple):
+    seconds: float
+    seconds_per_declaration: float
+    peak_bytes: int
+    bytes_per_second: float
+
+
+def measure(
+    header: Header, engine: str = "query", repeat: int = 3, lang: str = "cpp"
+) -> Measurement:
+    """
+    Returns the best wall time of `repeat` runs of find() and the peak memory
+    allocated by Python during one run.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        found = uncommented.find(header.source, engine=engine, lang=lang)
+        best = min(best, time.perf_counter() - start)
+    if len(found) != header.undocumented:
+        raise AssertionError(
+            f"expected {header.undocumented} findings, got {len(found)}"
+        )
+    tracemalloc.start()
+    uncommented.find(header.source, engine=engine, lang=lang)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return Measurement(
+        best,
+        best / max(header.declarations, 1),
+        peak,
+        len(header.source) / best if best else 0.0,
+    )
+
+
+def measure_profiles(
+    size: int, engine: str, repeat: int
+) -> dict[str, dict[str, float]]:
+    """
+    Times the C shapes with the C++ and the C profile, and compiling the query
+    of each profile, which every process pays once.
+    """
+    results: dict[str, dict[str, float]] = {}
+    for name in C_SHAPES:
+        header = SHAPES[name](max(1, size // _SIZE_DIVISOR.get(name, 1)))
+        results[name] = {
+            lang: measure(header, engine, repeat, lang).seconds
+            for lang in uncommented.LANGUAGES
+        }
+    results["compile"] = {}
+    for lang in uncommented.LANGUAGES:
+        best = float("inf")
+        for _ in range(repeat):
+            uncommented._query.cache_clear()
+            uncommented._language.cache_clear()
+            start = time.perf_counter()
+            uncommented._query(lang)
+            best = min(best, time.perf_counter() - start)
+        results["compile"][lang] = best
+    return results
+
+
+def measure_workers(header: Header, files: int, jobs: list[int]) -> dict[int, float]:
+    """
+    Writes `files` copies of the header and times find_in_files() for each
+    worker count.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for i in range(files):
+            path = os.path.join(tmp, f"header_{i}.h")
+            with open(path, "wb") as f:
+                f.write(header.source)
+            paths.append(path)
+        for job_count in jobs:
+            start = time.perf_counter()
+            for _ in uncommented.find_in_files(paths, job_count):
+                pass
+            results[job_count] = time.perf_counter() - start
+    return results
+
+
+def measure_startup(repeat: int = 5) -> dict[str, float]:
+    """
+    Returns the best wall time of spawning a bare interpreter, `uncommented --help`
+    and `uncommented` on one small header, run through the launcher script.
+    """
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "uncommented")
+    with tempfile.TemporaryDirectory() as tmp:
+        header = os.path.join(tmp, "small.h")
+        with open(header, "wb") as f:
+            f.write(free_functions(20).source)
+        commands = {
+            "interpreter": [sys.executable, "-c", "pass"],
+            "help": [sys.executable, script, "--help"],
+            "small_header": [sys.executable, script, header],
+        }
+        results = {}
+        for name, command in commands.items():
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+                best = min(best, time.perf_counter() - start)
+            results[name] = best
+    return results
+
+
+def measure_executors(header: Header, buffers: int, workers: int) -> dict[str, float]:
+    """
+    Times find_many() on `buffers` in-memory copies of the header, serially
+    and with thread and process executors of `workers` workers.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+    inputs = [memoryview(header.source) for _ in range(buffers)]
+    results = {}
+    start = time.perf_counter()
+    uncommented.find_many(inputs)
+    results["serial"] = time.perf_counter() - start
+    for name, executor_type in (
+        ("thread", ThreadPoolExecutor),
+        ("process", ProcessPoolExecutor),
+    ):
+        with executor_type(max_workers=workers) as executor:
+            # warm the workers up so their start-up is not measured
+            uncommented.find_many([b""] * workers, executor)
+            start = time.perf_counter()
+            uncommented.find_many(inputs, executor)
+            results[name] = time.perf_counter() - start
+    return results
+
+
+def measure_chunked(header: Header, workers: int, engine: str) -> dict[str, float]:
+    """
+    Times iter_find() on the header against iter_find_chunked() with a
+    process executor of `workers` workers, one chunk per worker.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    source = header.source
+    chunk_bytes = max(1, len(source) // workers)
+    results = {}
+    start = time.perf_counter()
+    list(uncommented.iter_find(source, engine=engine))
+    results["single"] = time.perf_counter() - start
+    start = time.perf_counter()
+    uncommented.split_points(source)
+    results["split_points"] = time.perf_counter() - start
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        uncommented.find_many([b""] * workers, executor)
+        start = time.perf_counter()
+        list(
+            uncommented.iter_find_chunked(
+                source, executor, engine, chunk_bytes=chunk_bytes
+            )
+        )
+        results["chunked"] = time.perf_counter() - start
+    return results
+
+
+def run(args) -> dict:
+    report: dict = {"version": uncommented.__version__, "shapes": {}, "scaling": {}}
+    for name, shape in SHAPES.items():
+        if args.shapes and name not in args.shapes:
+            continue
+        size = max(1, args.size // _SIZE_DIVISOR.get(name, 1))
+        result = measure(shape(size), args.engine, args.repeat, args.lang)
+        report["shapes"][name] = result._asdict() | {"size": size}
+        print(
+            f"{name:>18} n={size:<6} {result.seconds * 1e3:9.2f} ms"
+            f" {result.seconds_per_declaration * 1e6:8.2f} us/decl"
+            f" {result.peak_bytes / 1024:9.0f} KiB peak"
+            f" {result.bytes_per_second / 1e6:7.2f} MB/s"
+        )
+
+    for factor in args.scale:
+        size = args.size * factor
+        result = measure(free_functions(size), args.engine, args.repeat, args.lang)
+        report["scaling"][str(size)] = result.seconds
+        print(f"{'scaling':>18} n={size:<6} {result.seconds * 1e3:9.2f} ms")
+
+    if args.profiles:
+        report["profiles"] = measure_profiles(args.size, args.engine, args.repeat)
+        for name, seconds in report["profiles"].items():
+            print(
+                f"{name:>18} {'cpp':<6} {seconds['cpp'] * 1e3:9.2f} ms"
+                f" {'c':<3} {seconds['c'] * 1e3:9.2f} ms"
+                f"  x{seconds['cpp'] / seconds['c']:.2f}"
+            )
+
+    if args.startup:
+        report["startup"] = measure_startup(args.repeat)
+        for name, seconds in report["startup"].items():
+            print(f"{'startup':>18} {name:<14} {seconds * 1e3:9.2f} ms")
+
+    if args.executors:
+        report["executors"] = measure_executors(
+            free_functions(args.size), args.files, args.executors
+        )
+        for name, seconds in report["executors"].items():
+            print(f"{'find_many':>18} {name:<14} {seconds * 1e3:9.2f} ms")
+
+    if args.chunked:
+        report["chunked"] = measure_chunked(
+            free_functions(args.size * args.scale[-1]), args.chunked, args.engine
+        )
+        for name, seconds in report["chunked"].items():
+            print(f"{'chunked':>18} {name:<14} {seconds * 1e3:9.2f} ms")
+
+    if args.jobs:
+        times = measure_workers(free_functions(args.size), args.files, args.jobs)
+        report["workers"] = {str(jobs): seconds for jobs, seconds in times.items()}
+        for jobs, seconds in times.items():
+            speedup = times[args.jobs[0]] / seconds
+            print(
+                f"{'workers':>18} j={jobs:<6} {seconds * 1e3:9.2f} ms  x{speedup:.2f}"
+            )
+    return report
+
+
+def regressions(report: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Lists every timing that is more than `threshold` slower than the baseline.
+    """
+    found = []
+    for name, result in report["shapes"].items():
+        old = baseline.get("shapes", {}).get(name)
+        if old is None or old["size"] != result["size"]:
+            continue
+        if result["seconds"] > old["seconds"] * (1 + threshold):
+            found.append(
+                f"{name}: {old['seconds'] * 1e3:.2f} ms"
+                f" -> {result['seconds'] * 1e3:.2f} ms"
+            )
+    for group in ("scaling", "startup"):
+        for name, seconds in report.get(group, {}).items():
+            old_seconds = baseline.get(group, {}).get(name)
+            if old_seconds is not None and seconds > old_seconds * (1 + threshold):
+                found.append(
+                    f"{group} {name}: {old_seconds * 1e3:.2f} ms"
+                    f" -> {seconds * 1e3:.2f} ms"
+                )
+    return found
+
+
+def main():
+    argParser = ArgumentParser(description="Benchmark uncommented on synthetic headers")
+    argParser.add_argument(
+        "--size", type=int, default=2000, help="Declarations per header."
+    )
+    argParser.add_argument(
+        "--repeat", type=int, default=3, help="Runs per measurement."
+    )
+    argParser.add_argument(
+        "--engine",
+        choices=uncommented.ENGINES,
+        default="query",
+        help="Engine to measure.",
+    )
+    argParser.add_argument(
+        "--lang",
+        choices=uncommented.LANGUAGES,
+        default="cpp",
+        help="Profile to measure. The C profile cannot check the C++ shapes.",
+    )
+    argParser.add_argument(
+        "--shapes", nargs="*", choices=list(SHAPES), help="Only run these shapes."
+    )
+    argParser.add_argument(
+        "--scale",
+        type=int,
+        nargs="*",
+        default=[1, 2, 4, 8],
+        help="Multiples of --size for the file size scaling curve.",
+    )
+    argParser.add_argument(
+        "--jobs",
+        type=int,
+        nargs="*",
+        default=[],
+        help="Worker counts for the worker scaling curve, e.g. --jobs 1 2 4 8.",
+    )
+    argParser.add_argument(
+        "--files", type=int, default=64, help="Files for the worker scaling curve."
+    )
+    argParser.add_argument(
+        "--executors",
+        type=int,
+        metavar="WORKERS",
+        help="Also compare find_many() with thread and process executors.",
+    )
+    argParser.add_argument(
+        "--chunked",
+        type=int,
+        metavar="WORKERS",
+        help="Also compare one pass over the largest --scale header with "
+        "chunked parsing.",
+    )
+    argParser.add_argument(
+        "--profiles",
+        action="store_true",
+        help="Also compare the C and C++ profiles on the plain C shapes.",
+    )
+    argParser.add_argument(
+        "--startup",
+        action="store_true",
+        help="Also time starting the command line tool.",
+    )
+    argParser.add_argument(
+        "--save-baseline", metavar="FILE", help="Write results to FILE."
+    )
+    argParser.add_argument(
+        "--baseline", metavar="FILE", help="Compare results against FILE."
+    )
+    argParser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.25,
+        help="Slowdown relative to the baseline that counts as a regression.",
+    )
+    args = argParser.parse_args()
+
+    report = run(args)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        slower = regressions(report, baseline, args.threshold)
+        for line in slower:
+            print("REGRESSION", line)
+        if slower:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
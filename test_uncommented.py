@@ -1,6 +1,15 @@
+import io
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import time
 import unittest
+from unittest import mock
 import uncommented
-
+import bench_uncommented
 
 class FunctionDeclarations(unittest.TestCase):
     def test_without_any_docs(self):
@@ -595,5 +604,1958 @@ class FreeOperators(unittest.TestCase):
         self.assertEqual(len(found), 0)
 
 
+class EngineMixin:
+    """
+    Reruns a test case with find() using another engine.
+    """
+
+    engine = "query"
+    lang = "cpp"
+
+    def setUp(self):
+        super().setUp()
+        find = uncommented.find
+        patcher = mock.patch.object(
+            uncommented,
+            "find",
+            lambda src, ranges=None, engine=self.engine: find(
+                src, ranges, engine, self.lang
+            ),
+        )
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class WalkEngineMixin(EngineMixin):
+    engine = "walk"
+
+
+class CProfileMixin(EngineMixin):
+    lang = "c"
+
+
+class AutoProfileMixin(EngineMixin):
+    lang = "auto"
+
+
+class CProfileFunctionDeclarations(CProfileMixin, FunctionDeclarations):
+    pass
+
+
+class CProfileInlineFunctionDefinitions(CProfileMixin, InlineFunctionDefinitions):
+    pass
+
+
+class CProfilePreprocMacroFunctions(CProfileMixin, PreprocMacroFunctions):
+    pass
+
+
+class CProfileStructFunctionPointerMembers(CProfileMixin, StructFunctionPointerMembers):
+    pass
+
+
+class AutoProfileFunctionDeclarations(AutoProfileMixin, FunctionDeclarations):
+    pass
+
+
+class AutoProfileInlineFunctionDefinitions(AutoProfileMixin, InlineFunctionDefinitions):
+    pass
+
+
+class AutoProfilePreprocMacroFunctions(AutoProfileMixin, PreprocMacroFunctions):
+    pass
+
+
+class AutoProfileStructFunctionPointerMembers(
+    AutoProfileMixin, StructFunctionPointerMembers
+):
+    pass
+
+
+class AutoProfileCppClassDefinitions(AutoProfileMixin, CppClassDefinitions):
+    pass
+
+
+class AutoProfileCppClassMembers(AutoProfileMixin, CppClassMembers):
+    pass
+
+
+class AutoProfileFreeOperators(AutoProfileMixin, FreeOperators):
+    pass
+
+
+class WalkFunctionDeclarations(WalkEngineMixin, FunctionDeclarations):
+    pass
+
+
+class WalkInlineFunctionDefinitions(WalkEngineMixin, InlineFunctionDefinitions):
+    pass
+
+
+class WalkPreprocMacroFunctions(WalkEngineMixin, PreprocMacroFunctions):
+    pass
+
+
+class WalkStructFunctionPointerMembers(WalkEngineMixin, StructFunctionPointerMembers):
+    pass
+
+
+class WalkCppClassDefinitions(WalkEngineMixin, CppClassDefinitions):
+    pass
+
+
+class WalkCppClassMembers(WalkEngineMixin, CppClassMembers):
+    pass
+
+
+class WalkFreeOperators(WalkEngineMixin, FreeOperators):
+    pass
+
+
+class EngineComparison(unittest.TestCase):
+    src = """\
+    /// docs
+    namespace ns {
+    void free_function();
+    struct Outer {
+        int (*callback)(int);
+        struct Inner { int x; } inner;
+    private:
+        void hidden();
+    protected:
+        // docs
+        void visible();
+        bool operator<(const Outer&) const;
+    };
+    template <typename T>
+    class Box {
+    public:
+        class Nested { T value; };
+        Box() {}
+        inline ~Box() {}
+        Box& operator=(const Box&) { return *this; }
+    };
+    typedef union Tag { int i; } Alias;
+    #define TWICE(x) ((x) * 2)
+    inline int helper() { return 0; }
+    void a(), b();
+    }
+    """
+
+    def test_engines_agree(self):
+        for engine in uncommented.ENGINES[1:]:
+            self.assertEqual(
+                uncommented.compare_engines(self.src.encode(), engine=engine), ([], [])
+            )
+
+    def test_engines_agree_on_ranges(self):
+        for engine in uncommented.ENGINES[1:]:
+            for start in range(0, 26, 3):
+                ranges = [(start, start + 2)]
+                self.assertEqual(
+                    uncommented.compare_engines(self.src.encode(), ranges, engine),
+                    ([], []),
+                )
+
+    def test_engines_agree_on_test_header(self):
+        with open(os.path.join(os.path.dirname(__file__), "test.h"), "rb") as f:
+            src = f.read()
+        for engine in uncommented.ENGINES[1:]:
+            self.assertEqual(uncommented.compare_engines(src, engine=engine), ([], []))
+
+    def test_unknown_engine(self):
+        with self.assertRaises(ValueError):
+            uncommented.find(b"", engine="magic")
+
+
+class LanguageProfiles(unittest.TestCase):
+    c_src = b"""\
+#include <stddef.h>
+struct Ops {
+    int (*callback)(int a);
+};
+/// docs
+static inline int twice(int a) { return 2 * a; }
+#define SQUARE(x) ((x) * (x))
+typedef union Value { int i; float f; } Value;
+size_t length(const char *s);
+"""
+
+    def test_c_profile_matches_cpp_profile_on_c(self):
+        expected = list(uncommented.iter_find(self.c_src))
+        self.assertEqual(len(expected), 5)
+        for engine in uncommented.ENGINES:
+            with self.subTest(engine):
+                self.assertEqual(
+                    list(uncommented.iter_find(self.c_src, engine=engine, lang="c")),
+                    expected,
+                )
+
+    def test_c_profile_leaves_out_cpp_patterns(self):
+        src = b"struct S {\n    void method();\n};\n"
+        self.assertEqual(len(uncommented.find(src)), 2)
+        for engine in uncommented.ENGINES:
+            with self.subTest(engine):
+                found = list(uncommented.iter_find(src, engine=engine, lang="c"))
+                self.assertEqual([f.capture for f in found], ["struct.declaration"])
+
+    def test_detection(self):
+        self.assertEqual(uncommented._detect_lang(self.c_src), "c")
+        self.assertEqual(uncommented._detect_lang(b"void f(std::string s);"), "cpp")
+        self.assertEqual(uncommented._detect_lang(b"class A;"), "cpp")
+        self.assertEqual(uncommented._detect_lang(b"int classify(int);"), "c")
+        self.assertEqual(uncommented._lang_for_path("a.hpp", "auto"), "cpp")
+        self.assertEqual(uncommented._lang_for_path("a.h", "auto"), "auto")
+        self.assertEqual(uncommented._lang_for_path("a.hpp", "c"), "c")
+
+    def test_auto_falls_back_to_cpp_on_syntax_errors(self):
+        src = b"int& counter();\nvoid f(int a = 0);\n"
+        self.assertEqual(uncommented._detect_lang(src), "c")
+        _, lang = uncommented._parse_profile(src, "auto")
+        self.assertEqual(lang, "cpp")
+        self.assertEqual(uncommented.find(src, lang="auto"), uncommented.find(src))
+
+    def test_auto_falls_back_to_cpp_on_member_functions(self):
+        src = (
+            b"struct S {\n    void f();\n    int *g(int);\n    void (*fp)(void);\n};\n"
+        )
+        self.assertEqual(uncommented._detect_lang(src), "c")
+        self.assertFalse(uncommented._parse(src, lang="c").root_node.has_error)
+        _, lang = uncommented._parse_profile(src, "auto")
+        self.assertEqual(lang, "cpp")
+        self.assertEqual(uncommented.find(src, lang="auto"), uncommented.find(src))
+        _, lang = uncommented._parse_profile(self.c_src, "auto")
+        self.assertEqual(lang, "c")
+
+    def test_command_line_reports_member_functions_in_c_headers(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "m.h")
+            with open(path, "w") as f:
+                f.write("struct S {\n    void f();\n};\n")
+            out = subprocess.run(
+                [sys.executable, uncommented.__file__, path],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+        self.assertEqual(out, "0: struct S\n1: void f();\n")
+
+    def test_cpp_grammar_is_used_without_the_c_grammar(self):
+        def reset():
+            uncommented._language.cache_clear()
+            uncommented._query.cache_clear()
+            uncommented._member_function_query.cache_clear()
+            getattr(uncommented._thread_local, "parsers", {}).pop("c", None)
+
+        reset()
+        self.addCleanup(reset)
+        with mock.patch.dict(sys.modules, {"tree_sitter_c": None}):
+            found = list(uncommented.iter_find(self.c_src, lang="c"))
+            self.assertIs(uncommented._language("c"), uncommented._language("cpp"))
+        self.assertEqual(found, list(uncommented.iter_find(self.c_src)))
+
+    def test_unknown_language(self):
+        with self.assertRaises(ValueError):
+            uncommented.find(b"", lang="rust")
+
+
+class CheckSelection(unittest.TestCase):
+    src = b"""\
+#define MACRO(x) (x)
+void function();
+bool operator==(const A& a, const A& b);
+struct Widget {
+    void member();
+    Widget& operator=(const Widget& other);
+};
+"""
+
+    def test_selectors(self):
+        select = uncommented.select_checks
+        self.assertIsNone(select([]))
+        self.assertIsNone(select(["function", "class", "struct", "union", "macro"]))
+        self.assertEqual(select(["macro"]), {"macro.func_def"})
+        self.assertEqual(
+            select(["function.definition"]), {"function.definition.inline"}
+        )
+        self.assertEqual(
+            select(["*operator_declaration"]),
+            {"function.operator_declaration", "function.refoperator_declaration"},
+        )
+        without = select(["-macro", "-*operator*"])
+        self.assertEqual(len(without), 11)
+        self.assertNotIn("macro.func_def", without)
+        self.assertEqual(select(["function", "-function.*"]), frozenset())
+        with self.assertRaises(ValueError):
+            select(["functions"])
+
+    def test_reduced_query_has_only_selected_patterns(self):
+        query = uncommented._query("cpp", uncommented.select_checks(["*operator*"]))
+        self.assertEqual(query.pattern_count, 4)
+        self.assertEqual(
+            uncommented._query("c", frozenset({"class.declaration"})).pattern_count, 0
+        )
+
+    def test_findings_are_the_selected_part_of_all_findings(self):
+        everything = list(uncommented.iter_find(self.src))
+        self.assertEqual(len(everything), 6)
+        for checks in (
+            ["function"],
+            ["-macro", "-*operator*"],
+            ["struct"],
+            ["function", "-function.*"],
+        ):
+            selected = uncommented.select_checks(checks)
+            expected = [f for f in everything if f.capture in selected]
+            for engine in uncommented.ENGINES:
+                with self.subTest(checks=checks, engine=engine):
+                    found = list(
+                        uncommented.iter_find(self.src, engine=engine, checks=checks)
+                    )
+                    self.assertEqual(found, expected)
+
+    def test_cache_key_depends_on_checks(self):
+        key = uncommented.ResultCache.key
+        self.assertNotEqual(key(self.src), key(self.src, checks=["macro"]))
+        self.assertEqual(
+            key(self.src, checks=["macro"]), key(self.src, checks=["macro.func_def"])
+        )
+        self.assertEqual(key(self.src), key(self.src, checks=["*"]))
+
+    def test_command_line(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        header = os.path.join(tmp.name, "a.h")
+        with open(header, "wb") as f:
+            f.write(self.src)
+
+        def run(*args):
+            return subprocess.run(
+                [sys.executable, uncommented.__file__, *args, header],
+                capture_output=True,
+                text=True,
+            )
+
+        out = run("--checks=-macro,-*operator*,-struct").stdout
+        self.assertEqual(
+            out.splitlines(),
+            [
+                "1: void function();",
+                "2: bool operator==(const A& a, const A& b);",
+                "4: void member();",
+            ],
+        )
+        self.assertEqual(run("--checks", "nothing").returncode, 2)
+
+
+class FileLimits(unittest.TestCase):
+    def setUp(self):
+        self.big = bench_uncommented.free_functions(20000).source
+        self.cls = bench_uncommented.huge_class(200).source
+
+    def test_max_bytes_skips(self):
+        limits = uncommented.Limits(max_bytes=len(self.cls) - 1)
+        with self.assertRaises(uncommented.LimitExceeded) as raised:
+            list(uncommented.iter_find(self.cls, limits=limits))
+        self.assertEqual(
+            (raised.exception.limit, raised.exception.status), ("max_bytes", "skipped")
+        )
+        limits = uncommented.Limits(max_bytes=len(self.cls))
+        found = list(uncommented.iter_find(self.cls, limits=limits))
+        self.assertEqual(found, list(uncommented.iter_find(self.cls)))
+
+    def test_parse_timeout_skips_and_resets_the_parser(self):
+        limits = uncommented.Limits(parse_timeout=1e-6)
+        for lang in ("cpp", "auto"):
+            with self.subTest(lang=lang):
+                with self.assertRaises(uncommented.LimitExceeded) as raised:
+                    list(uncommented.iter_find(self.big, lang=lang, limits=limits))
+                self.assertEqual(raised.exception.limit, "parse_timeout")
+                self.assertFalse(raised.exception.partial)
+        self.assertEqual(uncommented.find(b"void f();\n"), [(0, "void f();")])
+
+    def test_query_limits_keep_findings_so_far(self):
+        cases = (
+            (self.cls, uncommented.Limits(match_limit=1), "match_limit"),
+            (self.big, uncommented.Limits(query_timeout=1e-6), "query_timeout"),
+        )
+        for source, limits, limit in cases:
+            everything = uncommented.find(source)
+            with self.subTest(limit=limit):
+                found = []
+                with self.assertRaises(uncommented.LimitExceeded) as raised:
+                    for finding in uncommented.iter_find(source, limits=limits):
+                        found.append((finding.lineno, finding.text))
+                self.assertEqual(raised.exception.limit, limit)
+                self.assertEqual(raised.exception.status, "partial")
+                self.assertLess(len(found), len(everything))
+                self.assertTrue(set(found) <= set(everything))
+
+    def test_walk_engine_has_no_query_limits(self):
+        limits = uncommented.Limits(query_timeout=1e-6, match_limit=1)
+        found = list(uncommented.iter_find(self.cls, engine="walk", limits=limits))
+        self.assertEqual(found, list(uncommented.iter_find(self.cls, engine="walk")))
+
+    def test_find_in_files_reports_status_in_stats(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        paths = []
+        for name, source in (
+            ("big.h", self.big),
+            ("cls.hpp", self.cls),
+            ("small.h", b"void f();\n"),
+        ):
+            paths.append(os.path.join(tmp.name, name))
+            with open(paths[-1], "wb") as f:
+                f.write(source)
+        cache = os.path.join(tmp.name, "cache.sqlite")
+        limits = uncommented.Limits(max_bytes=len(self.big) - 1, match_limit=1)
+        options = uncommented.ScanOptions(cache, "query", "auto", limits=limits)
+        stats = uncommented.Stats()
+        results = dict(uncommented.find_in_files(paths, 1, options, stats=stats))
+        self.assertEqual(results[paths[0]], [])
+        self.assertEqual(len(results[paths[2]]), 1)
+        statuses = [stats.per_file[path].status for path in paths]
+        self.assertEqual(statuses, ["skipped", "partial", "ok"])
+        self.assertEqual((stats.skipped, stats.partial), (1, 1))
+        self.assertEqual(stats.limits, {"max_bytes": 1, "match_limit": 1})
+        self.assertIn("limits hit: match_limit 1, max_bytes 1", stats.format())
+        self.assertEqual(stats.as_dict()["limits"], {"max_bytes": 1, "match_limit": 1})
+        # Partial results are not cached, so the file is checked again.
+        stats = uncommented.Stats()
+        list(uncommented.find_in_files(paths, 1, options, stats=stats))
+        self.assertEqual((stats.cache_hits, stats.partial), (1, 1))
+
+    def test_command_line(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        for name, source in (("cls.hpp", self.cls), ("small.h", b"void f();\n")):
+            with open(os.path.join(tmp.name, name), "wb") as f:
+                f.write(source)
+
+        def run(*args):
+            return subprocess.run(
+                [sys.executable, uncommented.__file__, *args, tmp.name],
+                capture_output=True,
+                text=True,
+            )
+
+        result = run("--max-file-size", "100")
+        self.assertEqual(result.returncode, uncommented.EXIT_LIMITED)
+        self.assertEqual(
+            result.stdout.splitlines(),
+            [os.path.join(tmp.name, "small.h") + ":0: void f();"],
+        )
+        self.assertEqual(
+            result.stderr.splitlines(),
+            [os.path.join(tmp.name, "cls.hpp") + ": skipped, max_bytes exceeded"],
+        )
+        result = run(
+            "--engine",
+            "query",
+            "--match-limit",
+            "1",
+            "--stats",
+            "--stats-format",
+            "json",
+        )
+        self.assertEqual(result.returncode, uncommented.EXIT_LIMITED)
+        self.assertEqual(json.loads(result.stderr)["partial"], 1)
+        # The default engine would walk these small files, which has no limits.
+        result = run("--match-limit", "1")
+        self.assertEqual(result.returncode, uncommented.EXIT_LIMITED)
+        self.assertIn("cls.hpp: partial, match_limit exceeded", result.stderr)
+        result = run("--engine", "walk", "--query-timeout", "1")
+        self.assertEqual(result.returncode, 2)
+        self.assertIn("--engine walk cannot be combined", result.stderr)
+        result = run("--max-file-size", str(len(self.cls)))
+        self.assertEqual((result.returncode, result.stderr), (0, ""))
+        result = run("--stats")
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("small.h:0: void f();", result.stdout)
+        self.assertIn("parse", result.stderr)
+
+
+class StreamingFindings(unittest.TestCase):
+    def test_results_are_yielded_lazily(self):
+        found = uncommented.iter_find(b"void a();\nvoid b();\n")
+        self.assertEqual(next(found).lineno, 0)
+        self.assertEqual(next(found).lineno, 1)
+        self.assertIsNone(next(found, None))
+
+    def test_class_signature_stops_at_body(self):
+        src = b"class Big : public Base {\npublic:\n    /// docs\n    void f();\n};\n"
+        (finding,) = uncommented.iter_find(src)
+        self.assertEqual(finding.capture, "class.declaration")
+        self.assertEqual(finding.signature, "class Big : public Base")
+        self.assertEqual(finding.start_point, (0, 0))
+        self.assertEqual(finding.end_point, (4, 1))
+        self.assertEqual(
+            src[finding.start_byte : finding.end_byte].decode(), finding.text
+        )
+
+    def test_other_signatures(self):
+        src = b"""\
+template <typename T>
+struct Holder { T value; };
+inline int helper() { return 0; }
+#define TWICE(x) \\
+    ((x) * 2)
+void declared(int a);
+"""
+        signatures = [finding.signature for finding in uncommented.iter_find(src)]
+        self.assertEqual(
+            signatures,
+            [
+                "template <typename T>\nstruct Holder",
+                "inline int helper()",
+                "#define TWICE(x)",
+                "void declared(int a);",
+            ],
+        )
+
+    def test_pickled_finding_keeps_signature_only(self):
+        (finding,) = uncommented.iter_find(b"inline void f() { int big_body; }\n")
+        copy = pickle.loads(pickle.dumps(finding))
+        self.assertEqual(copy, finding)
+        self.assertEqual(copy.signature, "inline void f()")
+        with self.assertRaises(ValueError):
+            copy.text
+
+
+class RunStatistics(unittest.TestCase):
+    src = b"""\
+/// docs
+class Documented {
+public:
+    void undocumented();
+    /// docs
+    void documented();
+private:
+    void hidden();
+};
+void free_function();
+"""
+
+    def test_counts_are_the_same_for_every_engine(self):
+        for engine in uncommented.ENGINES:
+            with self.subTest(engine):
+                stats = uncommented.Stats()
+                found = list(
+                    uncommented.iter_find(self.src, engine=engine, stats=stats)
+                )
+                self.assertEqual(stats.findings, len(found))
+                self.assertEqual(stats.findings, 2)
+                self.assertEqual(stats.bytes, len(self.src))
+                self.assertEqual(stats.matches["function.member_declaration"], 3)
+                self.assertEqual(stats.matches["class.declaration"], 1)
+                self.assertEqual(
+                    stats.dropped["skip_this_node"]["function.member_declaration"], 1
+                )
+                self.assertEqual(
+                    stats.dropped["has_adjacent_comment"][
+                        "function.member_declaration"
+                    ],
+                    1,
+                )
+                self.assertEqual(
+                    stats.dropped["has_adjacent_comment"]["class.declaration"], 1
+                )
+                self.assertGreater(stats.seconds["parse"], 0)
+
+    def test_files_are_aggregated(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        paths = []
+        for name in ("a.h", "b.h"):
+            paths.append(os.path.join(tmp.name, name))
+            with open(paths[-1], "wb") as f:
+                f.write(self.src)
+        stats = uncommented.Stats()
+        for _ in uncommented.find_in_files(paths, jobs=2, stats=stats):
+            pass
+        self.assertEqual(stats.files, 2)
+        self.assertEqual(stats.findings, 4)
+        self.assertEqual(sorted(stats.per_file), paths)
+        self.assertEqual(stats.per_file[paths[0]].findings, 2)
+        as_dict = stats.as_dict()
+        self.assertEqual(as_dict["matches"]["function.member_declaration"], 6)
+        self.assertIn(paths[1], stats.format())
+
+
+class ColdStart(unittest.TestCase):
+    def test_import_does_not_load_heavy_modules(self):
+        code = (
+            "import sys, uncommented; "
+            "print(sorted({'tree_sitter', 'tree_sitter_cpp', 'numpy', 'sqlite3', "
+            "'concurrent.futures', 'argparse'} & set(sys.modules)))"
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        self.assertEqual(out.strip(), "[]")
+
+    def test_launcher_runs_main(self):
+        launcher = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), "uncommented"
+        )
+        out = subprocess.run(
+            [sys.executable, launcher, "--help"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        self.assertTrue(out.startswith("usage: uncommented "))
+
+    def test_capture_order_matches_compiled_query(self):
+        query = uncommented._query()
+        self.assertEqual(
+            uncommented._capture_order(),
+            [query.capture_name(i) for i in range(query.capture_count)],
+        )
+
+    def test_auto_engine_walks_small_inputs_until_query_is_compiled(self):
+        with mock.patch.object(uncommented, "_auto_bytes_seen", 0):
+            uncommented._query.cache_clear()
+            self.assertEqual(uncommented._auto_engine(100), "walk")
+            self.assertEqual(
+                uncommented._auto_engine(uncommented.AUTO_QUERY_BYTES), "query"
+            )
+            uncommented._query()
+            with mock.patch.object(uncommented, "_auto_bytes_seen", 0):
+                self.assertEqual(uncommented._auto_engine(100), "query")
+        with mock.patch.object(uncommented, "_auto_bytes_seen", 0):
+            uncommented._query.cache_clear()
+            limits = uncommented.Limits(match_limit=10)
+            self.assertEqual(uncommented._auto_engine(100, limits), "query")
+            self.assertEqual(
+                uncommented._auto_engine(100, uncommented.Limits()), "walk"
+            )
+
+
+class IncrementalDocuments(unittest.TestCase):
+    src = b"""\
+/// docs
+class Widget {
+public:
+    void draw();
+private:
+    void hidden();
+};
+void free_function();
+"""
+
+    def assertMatchesFreshParse(self, document):
+        fresh = list(uncommented.iter_find(document.source))
+        self.assertEqual(document.findings(), fresh)
+        reparsed = uncommented._parser().parse(document.source)
+        self.assertEqual(str(document.tree.root_node), str(reparsed.root_node))
+
+    def test_auto_profile_switches_to_cpp(self):
+        document = uncommented.Document(b"struct S {\n    int x;\n};\n", "auto")
+        self.assertEqual(document.lang, "c")
+        document.edit((1, 4), (1, 10), b"void f();")
+        self.assertEqual(document.lang, "cpp")
+        self.assertEqual(
+            document.findings(), list(uncommented.iter_find(document.source))
+        )
+
+    def test_edits_match_a_fresh_parse(self):
+        document = uncommented.Document(self.src)
+        self.assertEqual(len(document.findings()), 2)
+        document.edit((3, 4), (3, 4), b"/// docs\n    ")
+        self.assertEqual(
+            [f.signature for f in document.findings()], ["void free_function();"]
+        )
+        self.assertMatchesFreshParse(document)
+        document.edit((2, 0), (2, 6), b"private")
+        self.assertEqual(
+            [f.signature for f in document.findings()], ["void free_function();"]
+        )
+        self.assertMatchesFreshParse(document)
+        document.edit((8, 0), (9, 0), b"")
+        self.assertEqual(document.findings(), [])
+        self.assertMatchesFreshParse(document)
+
+    def test_updates_match_a_fresh_parse(self):
+        document = uncommented.Document(self.src)
+        for new in [
+            self.src.replace(b"void draw", b"/// docs\n    void draw"),
+            self.src.replace(b"};\n", b"};\nvoid added();\n"),
+            self.src + self.src,
+            self.src[: len(self.src) // 2],
+            b"",
+            self.src,
+        ]:
+            document.update(new)
+            self.assertEqual(document.source, new)
+            self.assertMatchesFreshParse(document)
+
+    def test_common_prefix_length(self):
+        for a, b, length in [
+            (b"", b"x", 0),
+            (b"abc", b"abd", 2),
+            (b"abc", b"abcde", 3),
+            (b"abc", b"abc", 3),
+        ]:
+            self.assertEqual(uncommented._common_prefix_length(a, b), length)
+
+    def test_points_and_offsets(self):
+        src = b"ab\ncd\n\nef"
+        for offset in range(len(src) + 1):
+            point = uncommented._point_at(src, offset)
+            self.assertEqual(uncommented._byte_offset(src, point), offset)
+
+
+class MemoryMappedInput(unittest.TestCase):
+    def test_mapped_file_gives_the_same_findings(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "big.h")
+        src = b"".join(
+            b"/// docs\nclass Documented%d {\npublic:\n    void m();\n};\n" % i
+            for i in range(200)
+        )
+        with open(path, "wb") as f:
+            f.write(src)
+        mapped = uncommented.read_source(path, mmap_bytes=1)
+        self.assertNotIsInstance(mapped, bytes)
+        self.assertIsInstance(uncommented.read_source(path), bytes)
+        with mock.patch.object(uncommented, "PARSE_CHUNK_BYTES", 7):
+            from_map = list(uncommented.iter_find(mapped))
+        from_bytes = list(uncommented.iter_find(src))
+        self.assertEqual(from_map, from_bytes)
+        self.assertEqual(len(from_map), 200)
+        self.assertEqual(from_map[-1].text, "void m();")
+        self.assertEqual(from_map[-1].signature, "void m();")
+
+    def test_empty_file_is_not_mapped(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "empty.h")
+        open(path, "wb").close()
+        self.assertEqual(uncommented.read_source(path, mmap_bytes=0), b"")
+
+
+class FindMany(unittest.TestCase):
+    sources = [
+        b"void a();\n",
+        b"/// docs\nvoid b();\n",
+        b"void c();\nvoid d();\n",
+    ]
+
+    def test_buffers_are_keyed_by_position(self):
+        found = uncommented.find_many([memoryview(src) for src in self.sources])
+        self.assertEqual(sorted(found), [0, 1, 2])
+        self.assertEqual([len(found[i]) for i in range(3)], [1, 0, 2])
+        self.assertEqual(found[2][1].signature, "void d();")
+
+    def test_paths_are_keyed_by_path(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "a.h")
+        with open(path, "wb") as f:
+            f.write(self.sources[2])
+        found = uncommented.find_many([path, self.sources[0]])
+        self.assertEqual(len(found[path]), 2)
+        self.assertEqual(len(found[1]), 1)
+
+    def test_executors_give_the_same_results(self):
+        from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+        inputs = [memoryview(src) for src in self.sources] * 4
+        serial = uncommented.find_many(inputs)
+        for executor_type in (ThreadPoolExecutor, ProcessPoolExecutor):
+            with self.subTest(executor_type.__name__), executor_type(
+                max_workers=2
+            ) as executor:
+                found = uncommented.find_many(inputs, executor)
+                self.assertEqual(found, serial)
+                self.assertEqual(found[5][0].signature, "void c();")
+
+    def test_each_thread_has_its_own_parser(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            parsers = {
+                id(parser)
+                for parser in executor.map(
+                    lambda _: (time.sleep(0.05), uncommented._parser())[1], range(2)
+                )
+            }
+        self.assertEqual(len(parsers), 2)
+        self.assertNotIn(id(uncommented._parser()), parsers)
+
+
+class ChunkedParsing(unittest.TestCase):
+    src = b"""\
+#ifndef WIDGETS_H
+#define WIDGETS_H
+/* braces { and ; inside comments */
+void first(const char *s = "};\\n");
+
+#if FEATURE
+void gated();
+#endif
+#define TABLE(x) \\
+    x(a); \\
+    x(b);
+struct Point { int x; int y; };
+/// docs
+void documented(); // trailing
+class Widget {
+public:
+    void member();
+};
+void last();
+#endif
+"""
+
+    def key(self, findings):
+        return [(finding._key(), finding.signature) for finding in findings]
+
+    def test_split_points(self):
+        src = self.src
+        lines = [
+            src[point:].split(b"\n", 1)[0] for point in uncommented.split_points(src)
+        ]
+        self.assertEqual(
+            lines,
+            [b"", b"/// docs", b"void last();", b"#endif"],
+        )
+
+    def test_declarations_go_on_after_type_bodies(self):
+        src = (
+            b"/// doc\ntypedef struct Foo {\n    int x;\n}\nFoo_t;\n"
+            b"/// doc\nstruct Bar {\n    int y;\n}\n__attribute__((packed));\n"
+            b"enum E {\n    A,\n}\nconst e;\n"
+            b"int table[] = {\n    1,\n}\n;\n"
+            b"/// doc\nvoid f(void)\n{\n}\n"
+            b'extern "C" {\nvoid g(void);\n}\n'
+            b"namespace ns {\nvoid h();\n}\n"
+        )
+        lines = [
+            src[point:].split(b"\n", 1)[0] for point in uncommented.split_points(src)
+        ]
+        self.assertEqual(
+            lines,
+            [
+                b"/// doc",
+                b"enum E {",
+                b"int table[] = {",
+                b"/// doc",
+                b'extern "C" {',
+                b"namespace ns {",
+                b"",
+            ],
+        )
+
+    def test_typedefs_split_between_workers(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        src = b"/// doc\ntypedef struct Foo {\n    int x;\n}\nFoo_t;\n" * 200
+        self.assertEqual(uncommented.find(src), [])
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            chunked = list(
+                uncommented.iter_find_chunked(src, executor, chunk_bytes=200)
+            )
+        self.assertEqual(chunked, [])
+
+    def test_wrapped_sources_are_not_split(self):
+        for src in (
+            b"namespace ns {\nvoid a();\nvoid b();\n}\n",
+            b"#if X\nvoid a();\n#endif\n",
+        ):
+            self.assertEqual(
+                [point for point in uncommented.split_points(src) if point < len(src)],
+                [],
+            )
+
+    def test_results_match_a_single_pass(self):
+        sources = [self.src] + [
+            shape(40).source for shape in bench_uncommented.SHAPES.values()
+        ]
+        for src in sources:
+            for engine in uncommented.ENGINES:
+                for lang in ("cpp", "auto"):
+                    with self.subTest(src=src[:30], engine=engine, lang=lang):
+                        whole = uncommented.iter_find(src, engine=engine, lang=lang)
+                        chunked = uncommented.iter_find_chunked(
+                            src, engine=engine, lang=lang, chunk_bytes=1
+                        )
+                        self.assertEqual(self.key(chunked), self.key(whole))
+
+    def test_chunks_run_on_an_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        src = bench_uncommented.free_functions(200).source
+        stats = uncommented.Stats()
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            chunked = list(
+                uncommented.iter_find_chunked(
+                    src, executor, stats=stats, chunk_bytes=1000
+                )
+            )
+        self.assertEqual(self.key(chunked), self.key(uncommented.iter_find(src)))
+        self.assertEqual(stats.bytes, len(src))
+        self.assertEqual(chunked[-1].text, chunked[-1].signature)
+
+    def test_limits_apply_to_every_chunk(self):
+        src = bench_uncommented.free_functions(200).source
+        limits = uncommented.Limits(max_bytes=len(src) - 1)
+        with self.assertRaises(uncommented.LimitExceeded) as raised:
+            list(uncommented.iter_find_chunked(src, limits=limits, chunk_bytes=1000))
+        self.assertEqual(raised.exception.status, "skipped")
+
+    def test_large_files_are_split_between_workers(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        paths = []
+        for name, src in (("big.h", self.src * 3), ("small.h", b"void small();\n")):
+            paths.append(os.path.join(tmp.name, name))
+            with open(paths[-1], "wb") as f:
+                f.write(src.replace(b"WIDGETS_H", b"X"))
+        options = uncommented.ScanOptions(split_bytes=100)
+        serial = list(uncommented.find_in_files(paths, jobs=1))
+        parallel = list(uncommented.find_in_files(paths, jobs=2, options=options))
+        self.assertEqual(
+            [(path, self.key(found)) for path, found in parallel],
+            [(path, self.key(found)) for path, found in serial],
+        )
+
+
+class JsonRpcServer(unittest.TestCase):
+    def request(self, server, request_id, method, **params):
+        return server.handle(
+            {"jsonrpc": "2.0", "id": request_id, "method": method, "params": params}
+        )
+
+    def test_open_change_close(self):
+        server = uncommented.Server()
+        opened = self.request(server, 1, "open", uri="a.h", text="void f();\n")
+        self.assertEqual(opened["result"][0]["signature"], "void f();")
+        changed = self.request(
+            server,
+            2,
+            "change",
+            uri="a.h",
+            edits=[{"start": [0, 0], "end": [0, 0], "text": "/// docs\n"}],
+        )
+        self.assertEqual(changed, {"jsonrpc": "2.0", "id": 2, "result": []})
+        self.request(server, 3, "close", uri="a.h")
+        missing = self.request(server, 4, "findings", uri="a.h")
+        self.assertEqual(missing["error"]["code"], uncommented.Server.INVALID_PARAMS)
+
+    def test_change_with_text_edits_the_open_document(self):
+        server = uncommented.Server()
+        self.request(server, 1, "open", uri="a.h", text="void f();\nvoid g();\n")
+        document = server.documents["a.h"]
+        with mock.patch.object(
+            uncommented, "_parse", wraps=uncommented._parse
+        ) as parse:
+            changed = self.request(
+                server, 2, "change", uri="a.h", text="/// docs\nvoid f();\nvoid g();\n"
+            )
+        self.assertIs(server.documents["a.h"], document)
+        self.assertEqual(len(parse.call_args_list), 1)
+        self.assertIsNotNone(parse.call_args.args[1])
+        self.assertEqual([r["signature"] for r in changed["result"]], ["void g();"])
+        opened = self.request(server, 3, "change", uri="b.h", text="void h();\n")
+        self.assertEqual(opened["result"][0]["signature"], "void h();")
+
+    def test_language_and_checks(self):
+        server = uncommented.Server(lang="auto", checks=["function"])
+        src = "struct S {\n    void f();\n};\nvoid g();\n"
+        opened = self.request(server, 1, "open", uri="a.h", text=src)
+        self.assertEqual(
+            [r["signature"] for r in opened["result"]], ["void f();", "void g();"]
+        )
+        server = uncommented.Server(lang="c")
+        opened = self.request(server, 1, "open", uri="a.h", text=src)
+        self.assertEqual(
+            [r["capture"] for r in opened["result"]],
+            ["struct.declaration", "function.declaration"],
+        )
+
+    def test_errors(self):
+        server = uncommented.Server()
+        self.assertEqual(
+            server.handle({"id": 1, "method": "nope"})["error"]["code"],
+            uncommented.Server.METHOD_NOT_FOUND,
+        )
+        self.assertEqual(
+            server.handle([1, 2])["error"]["code"], uncommented.Server.INVALID_REQUEST
+        )
+        self.assertIsNone(server.handle({"method": "close", "params": {"uri": "x"}}))
+
+    def test_serve_until_shutdown(self):
+        requests = [
+            {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "open",
+                "params": {"uri": "a", "text": "void f();"},
+            },
+            {"jsonrpc": "2.0", "id": 2, "method": "shutdown"},
+            {"jsonrpc": "2.0", "id": 3, "method": "findings", "params": {"uri": "a"}},
+        ]
+        rfile = io.BytesIO(
+            b"".join(json.dumps(r).encode() + b"\n" for r in requests) + b"oops\n"
+        )
+        wfile = io.BytesIO()
+        self.assertFalse(uncommented.Server().serve(rfile, wfile))
+        responses = [json.loads(line) for line in wfile.getvalue().splitlines()]
+        self.assertEqual([r["id"] for r in responses], [1, 2])
+
+
+class MultipleFiles(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def write(self, relpath, src):
+        path = os.path.join(self.tmp.name, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(src)
+        return path
+
+    def test_directories_are_expanded_in_sorted_order(self):
+        b = self.write("b.h", "void b();\n")
+        a = self.write("a.hpp", "void a();\n")
+        nested = self.write("sub/c.h", "void c();\n")
+        self.write("notes.txt", "void not_a_header();\n")
+        files = uncommented.collect_files([self.tmp.name])
+        self.assertEqual(files, [a, b, nested])
+
+    def test_explicit_files_are_kept(self):
+        src = self.write("source.c", "void c();\n")
+        self.assertEqual(uncommented.collect_files([src]), [src])
+
+    def test_parallel_results_match_serial_order(self):
+        paths = [
+            self.write(
+                f"f{i:02}.h", f"void undocumented_{i}();\n/// docs\nvoid ok();\n"
+            )
+            for i in range(12)
+        ]
+        serial = list(uncommented.find_in_files(paths, jobs=1))
+        parallel = list(uncommented.find_in_files(paths, jobs=3))
+        self.assertEqual(serial, parallel)
+        self.assertEqual([path for path, _ in parallel], paths)
+        self.assertIn("undocumented_7", parallel[7][1][0].signature)
+
+
+class IncludeGraph(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.include = os.path.join(self.tmp.name, "include")
+        self.api = self.write(
+            "include/lib/api.h",
+            '#include "detail.h"\n#include <lib/types.h>\n#include <vector>\n'
+            "#ifdef EXTRA\n#include <lib/extra.h>\n#endif\nvoid api();\n",
+        )
+        self.detail = self.write(
+            "include/lib/detail.h",
+            '#include "api.h"\n#include "../lib/types.h"\nvoid detail();\n',
+        )
+        self.types = self.write("include/lib/types.h", "/// docs\nstruct Type {};\n")
+        self.extra = self.write("include/lib/extra.h", '#include "types.h"\n')
+        self.write("include/lib/internal.h", "void internal();\n")
+
+    def write(self, relpath, src):
+        path = os.path.join(self.tmp.name, relpath)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(src)
+        return path
+
+    def scan(self, roots, jobs=1, stats=None):
+        return list(
+            uncommented.find_in_include_graph(roots, [self.include], jobs, stats=stats)
+        )
+
+    def test_reachable_headers_are_checked_once(self):
+        stats = uncommented.Stats()
+        found = self.scan([self.api, self.detail], stats=stats)
+        self.assertEqual(
+            [path for path, _ in found], [self.api, self.detail, self.types, self.extra]
+        )
+        self.assertEqual(found[0][1][0].signature, "void api();")
+        self.assertEqual(found[2][1], [])
+        self.assertEqual(stats.files, 4)
+
+    def test_parallel_scan_matches_serial(self):
+        self.assertEqual(self.scan([self.api], jobs=3), self.scan([self.api]))
+
+    def test_copies_are_followed_but_not_checked_again(self):
+        copy = self.write("vendored/api.h", open(self.api).read())
+        self.write("vendored/detail.h", "void vendored_detail();\n")
+        found = dict(self.scan([self.api, copy]))
+        self.assertNotIn(copy, found)
+        vendored = os.path.join(self.tmp.name, "vendored", "detail.h")
+        self.assertEqual(found[vendored][0].signature, "void vendored_detail();")
+
+    def test_resolve_include(self):
+        resolve = uncommented.resolve_include
+        self.assertEqual(resolve("detail.h", True, self.api, []), self.detail)
+        self.assertIsNone(resolve("detail.h", False, self.api, []))
+        self.assertEqual(
+            resolve("lib/types.h", False, self.api, [self.include]), self.types
+        )
+        self.assertIsNone(resolve("vector", False, self.api, [self.include]))
+
+    def test_command_line(self):
+        out = subprocess.run(
+            [
+                sys.executable,
+                uncommented.__file__,
+                "--follow-includes",
+                "-I",
+                self.include,
+                self.api,
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        self.assertEqual(
+            out, f"{self.api}:6: void api();\n{self.detail}:2: void detail();\n"
+        )
+
+
+class Baselines(unittest.TestCase):
+    src = b"""\
+namespace ns {
+class Widget {
+public:
+    void resize(int w, int h);
+};
+}
+void resize(int w, int h);
+"""
+
+    def fingerprints(self, src, path="a.h"):
+        return [uncommented.fingerprint(path, f) for f in uncommented.iter_find(src)]
+
+    def test_scope_is_recorded(self):
+        found = list(uncommented.iter_find(self.src))
+        self.assertEqual([f.scope for f in found], ["ns", "ns::Widget", ""])
+
+    def test_fingerprints_survive_line_and_whitespace_changes(self):
+        moved = b"\n\n" + self.src.replace(
+            b"int w, int h", b"int w,\n               int h"
+        )
+        self.assertEqual(self.fingerprints(moved), self.fingerprints(self.src))
+
+    def test_fingerprints_depend_on_scope_and_file(self):
+        fps = self.fingerprints(self.src)
+        self.assertEqual(len(set(fps)), 3)
+        self.assertNotEqual(self.fingerprints(self.src, "b.h"), fps)
+        self.assertEqual(self.fingerprints(self.src, "./a.h"), fps)
+
+    def test_only_new_findings_are_reported(self):
+        src = b"void f();\n#ifdef A\nvoid f();\n#endif\n"
+        baseline = uncommented.Baseline()
+        baseline.add("a.h", uncommented.iter_find(src[:10]))
+        found = list(uncommented.iter_find(src))
+        self.assertEqual(baseline.new("a.h", found), [found[1]])
+        self.assertEqual(baseline.new("b.h", found), found)
+
+    def test_save_and_load(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "baseline.txt")
+        baseline = uncommented.Baseline()
+        baseline.add("a.h", uncommented.iter_find(self.src))
+        baseline.save(path)
+        loaded = uncommented.Baseline.load(path)
+        self.assertEqual(loaded.counts, baseline.counts)
+        self.assertEqual(len(loaded), 3)
+
+    def test_command_line(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        header = os.path.join(tmp.name, "a.h")
+        baseline = os.path.join(tmp.name, "baseline.txt")
+        with open(header, "wb") as f:
+            f.write(self.src)
+
+        def run(*args):
+            return subprocess.run(
+                [
+                    sys.executable,
+                    uncommented.__file__,
+                    "--baseline",
+                    baseline,
+                    *args,
+                    header,
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+            ).stdout
+
+        self.assertEqual(run("--update-baseline"), "")
+        with open(header, "wb") as f:
+            f.write(b"void added();\n" + self.src)
+        self.assertEqual(run(), "0: void added();\n")
+
+
+class OutputFormats(unittest.TestCase):
+    src = b"void first();\n/// docs\nvoid documented();\nclass Widget {\npublic:\n    void\n    resize();\n};\n"
+
+    def render(self, writer_type, files=("a.h", "b.h")):
+        out = io.StringIO()
+        writer = writer_type(out)
+        for path in files:
+            writer.write(path, list(uncommented.iter_find(self.src)))
+        writer.close()
+        return out.getvalue()
+
+    def test_text(self):
+        out = io.StringIO()
+        writer = uncommented.TextWriter(out, show_paths=False)
+        writer.write("a.h", list(uncommented.iter_find(self.src)))
+        self.assertEqual(
+            out.getvalue(), "0: void first();\n3: class Widget\n5: void    resize();\n"
+        )
+
+    def test_json_lines(self):
+        records = [
+            json.loads(line)
+            for line in self.render(uncommented.JsonLinesWriter).splitlines()
+        ]
+        self.assertEqual(len(records), 6)
+        self.assertEqual(
+            records[5],
+            {
+                "file": "b.h",
+                "line": 5,
+                "column": 4,
+                "end_line": 6,
+                "end_column": 13,
+                "start_byte": 69,
+                "end_byte": 87,
+                "capture": "function.member_declaration",
+                "scope": "Widget",
+                "signature": "void\n    resize();",
+            },
+        )
+
+    def test_sarif(self):
+        log = json.loads(self.render(uncommented.SarifWriter))
+        self.assertEqual(log["version"], "2.1.0")
+        run = log["runs"][0]
+        rules = run["tool"]["driver"]["rules"]
+        results = run["results"]
+        self.assertEqual(len(results), 6)
+        result = results[1]
+        self.assertEqual(rules[result["ruleIndex"]]["id"], "class.declaration")
+        region = result["locations"][0]["physicalLocation"]["region"]
+        self.assertEqual((region["startLine"], region["endLine"]), (4, 8))
+        self.assertEqual(self.src[region["byteOffset"] :][:12], b"class Widget")
+        self.assertEqual(
+            result["partialFingerprints"]["uncommented/v1"],
+            uncommented.fingerprint("a.h", uncommented.find_many([self.src])[0][1]),
+        )
+        self.assertEqual(
+            results[3]["locations"][0]["physicalLocation"]["artifactLocation"]["uri"],
+            "b.h",
+        )
+
+    def test_empty_sarif_is_valid(self):
+        self.assertEqual(
+            json.loads(self.render(uncommented.SarifWriter, ()))["runs"][0]["results"],
+            [],
+        )
+
+
+class ResultStores(unittest.TestCase):
+    src = OutputFormats.src
+
+    def setUp(self):
+        self.store = uncommented.ResultStore()
+        for path in ("b.h", "a.h", "empty.h"):
+            found = [] if path == "empty.h" else list(uncommented.iter_find(self.src))
+            self.store.add(path, found)
+
+    def test_rows(self):
+        self.assertEqual(len(self.store), 6)
+        self.assertEqual(
+            self.store[5],
+            uncommented.StoredFinding(
+                "a.h",
+                "function.member_declaration",
+                5,
+                4,
+                69,
+                87,
+                "void\n    resize();",
+            ),
+        )
+        self.assertEqual(self.store.paths, ["b.h", "a.h", "empty.h"])
+        self.assertEqual(len(self.store.captures), 3)
+        self.assertEqual(self.store.columns["row"].itemsize, 4)
+
+    def test_without_signatures(self):
+        store = uncommented.ResultStore(signatures=False)
+        store.add("a.h", list(uncommented.iter_find(self.src)))
+        self.assertEqual(store[0].signature, None)
+        self.assertEqual(len(store.buffer), 0)
+
+    def test_sort_filter_group(self):
+        for numpy in (uncommented._numpy(), None):
+            with self.subTest(numpy=numpy is not None), mock.patch.object(
+                uncommented, "_numpy", lambda: numpy
+            ):
+                ordered = self.store.sort()
+                self.assertEqual(
+                    [(f.path, f.row) for f in ordered],
+                    [
+                        ("a.h", 0),
+                        ("a.h", 3),
+                        ("a.h", 5),
+                        ("b.h", 0),
+                        ("b.h", 3),
+                        ("b.h", 5),
+                    ],
+                )
+                by_capture = self.store.sort("capture", "path")
+                self.assertEqual(by_capture[0].capture, "class.declaration")
+                self.assertEqual([f.path for f in by_capture][:2], ["a.h", "b.h"])
+                self.assertEqual(
+                    list(ordered.sort("path", "start_byte")), list(ordered)
+                )
+        declarations = self.store.filter(captures=["function.declaration", "unknown"])
+        self.assertEqual([f.signature for f in declarations], ["void first();"] * 2)
+        self.assertEqual(
+            len(self.store.filter(paths=["a.h"], captures=["class.declaration"])), 1
+        )
+        self.assertEqual(len(self.store.filter(paths=["empty.h"])), 0)
+        self.assertEqual(self.store.count_by("capture")["class.declaration"], 2)
+        self.assertEqual(self.store.count_by("row"), {0: 2, 3: 2, 5: 2})
+        groups = self.store.group_by("path")
+        self.assertEqual(list(groups), ["b.h", "a.h"])
+        self.assertEqual(
+            list(groups["a.h"]), [f for f in self.store if f.path == "a.h"]
+        )
+        with self.assertRaises(ValueError):
+            self.store.sort("signature")
+
+    def test_save_and_load(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        path = os.path.join(tmp.name, "results")
+        for store in (
+            self.store,
+            self.store.filter(paths=["a.h"]),
+            uncommented.ResultStore(False),
+        ):
+            with self.subTest(len(store)):
+                store.save(path)
+                loaded = uncommented.ResultStore.load(path)
+                self.assertEqual(list(loaded), list(store))
+                self.assertEqual(loaded.paths, store.paths)
+                self.assertEqual(loaded.signatures, store.signatures)
+        with open(path, "wb") as f:
+            f.write(b"not a store")
+        with self.assertRaises(ValueError):
+            uncommented.ResultStore.load(path)
+
+    def test_command_line(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        header = os.path.join(tmp.name, "a.h")
+        with open(header, "wb") as f:
+            f.write(self.src)
+        store = os.path.join(tmp.name, "results")
+        subprocess.run(
+            [sys.executable, uncommented.__file__, "--store", store, header],
+            check=True,
+            capture_output=True,
+        )
+        self.assertEqual(
+            [(f.path, f.row) for f in uncommented.ResultStore.load(store)],
+            [(header, 0), (header, 3), (header, 5)],
+        )
+
+
+class DocumentationCoverage(unittest.TestCase):
+    src = b"""\
+/// docs
+void documented();
+void undocumented();
+class Widget {
+    void private_member();
+public:
+    /// docs
+    void member();
+};
+"""
+
+    def test_counts_per_capture(self):
+        for engine in uncommented.ENGINES:
+            with self.subTest(engine):
+                coverage = uncommented.coverage_of(self.src, engine)
+                self.assertEqual(
+                    coverage.documented,
+                    {"function.declaration": 1, "function.member_declaration": 1},
+                )
+                self.assertEqual(
+                    coverage.undocumented,
+                    {"function.declaration": 1, "class.declaration": 1},
+                )
+                self.assertEqual(coverage.total, 4)
+                self.assertEqual(coverage.ratio, 0.5)
+
+    def test_directories_roll_up(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        paths = []
+        for relpath, src in [
+            ("a/x.h", self.src),
+            ("a/b/y.h", b"/// docs\nvoid f();\n"),
+            ("a/b/z.h", b"void g();\n"),
+            ("c/w.h", b""),
+        ]:
+            path = os.path.join(tmp.name, relpath)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "wb") as f:
+                f.write(src)
+            paths.append(path)
+        rollups, total = uncommented.coverage_in_files(paths)
+        root = tmp.name
+        self.assertEqual(
+            {
+                os.path.relpath(path, root): coverage.total
+                for path, coverage in rollups.items()
+            },
+            {".": 6, "a": 6, os.path.join("a", "b"): 2, "c": 0},
+        )
+        self.assertEqual(rollups[os.path.join(root, "a", "b")].ratio, 0.5)
+        self.assertEqual((total.total, total.ratio), (6, 0.5))
+        parallel = uncommented.coverage_in_files(paths, jobs=2)
+        self.assertEqual(
+            uncommented.format_coverage(*parallel),
+            uncommented.format_coverage(rollups, total),
+        )
+
+    def test_command_line(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        header = os.path.join(tmp.name, "a.h")
+        with open(header, "wb") as f:
+            f.write(self.src)
+        out = subprocess.run(
+            [
+                sys.executable,
+                uncommented.__file__,
+                "--coverage",
+                "--coverage-format",
+                "json",
+                header,
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        report = json.loads(out)
+        self.assertEqual(report["total"]["documented"], 2)
+        self.assertEqual(report["directories"][tmp.name]["total"], 4)
+        self.assertEqual(
+            report["total"]["captures"]["function.declaration"],
+            {"documented": 1, "total": 2},
+        )
+        out = subprocess.run(
+            [sys.executable, uncommented.__file__, "--coverage", tmp.name],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        self.assertIn("2/4", out)
+
+
+class WatchMode(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.header = os.path.join(self.tmp.name, "a.h")
+        self.write(self.header, "void first();\nvoid second();\n")
+
+    def write(self, path, src):
+        with open(path, "w") as f:
+            f.write(src)
+
+    def test_added_and_resolved_findings(self):
+        watcher = uncommented.Watcher(self.tmp.name)
+        added, resolved = watcher.update(self.header)
+        self.assertEqual((len(added), resolved), (2, []))
+        self.write(
+            self.header, "void added();\nvoid first();\n/// docs\nvoid second();\n"
+        )
+        added, resolved = watcher.update(self.header)
+        self.assertEqual([f.signature for f in added], ["void added();"])
+        self.assertEqual(
+            [(f.lineno, f.signature) for f in resolved], [(1, "void second();")]
+        )
+        os.remove(self.header)
+        added, resolved = watcher.update(self.header)
+        self.assertEqual((added, len(resolved)), ([], 2))
+
+    def test_language_and_checks(self):
+        self.write(self.header, "struct S {\n    void f();\n};\n#define M(x) x\n")
+        watcher = uncommented.Watcher(self.tmp.name, "walk", "c", ["-macro"])
+        added, _ = watcher.update(self.header)
+        self.assertEqual([f.capture for f in added], ["struct.declaration"])
+        watcher = uncommented.Watcher(self.tmp.name, "query", "auto", ["function"])
+        added, _ = watcher.update(self.header)
+        self.assertEqual([f.signature for f in added], ["void f();"])
+
+    def test_command_line_rejects_other_options(self):
+        for args in (
+            ["--watch", self.tmp.name, "--format", "jsonl"],
+            ["--watch", self.tmp.name, "--baseline", "b.txt"],
+            ["--serve", "--query-timeout", "1"],
+            ["--serve", self.header],
+        ):
+            with self.subTest(args=args):
+                result = subprocess.run(
+                    [sys.executable, uncommented.__file__, *args],
+                    capture_output=True,
+                    text=True,
+                    stdin=subprocess.DEVNULL,
+                )
+                self.assertEqual(result.returncode, 2)
+                self.assertIn("cannot be combined with", result.stderr)
+
+    def test_run_prints_changes(self):
+        other = os.path.join(self.tmp.name, "b.h")
+
+        def events():
+            self.write(self.header, "/// docs\nvoid first();\nvoid second();\n")
+            self.write(other, "void other();\n")
+            yield {self.header, other}
+            os.remove(other)
+            yield None
+
+        out = io.StringIO()
+        uncommented.Watcher(self.tmp.name).run(events(), out)
+        self.assertEqual(
+            out.getvalue().splitlines(),
+            [
+                f"+{self.header}:0: void first();",
+                f"+{self.header}:1: void second();",
+                f"-{self.header}:0: void first();",
+                f"+{other}:0: void other();",
+                f"-{other}:0: void other();",
+            ],
+        )
+
+    def assertReportsChange(self, events):
+        self.addCleanup(events.close)
+        new = os.path.join(self.tmp.name, "sub", "b.h")
+        os.makedirs(os.path.dirname(new))
+        self.write(new, "")
+        self.write(self.header, "void changed();\n")
+        changed = set()
+        for batch in events:
+            changed |= batch
+            if changed >= {self.header, new}:
+                break
+
+    def test_polling_events(self):
+        self.assertReportsChange(
+            uncommented.PollingEvents(self.tmp.name, interval=0.01)
+        )
+
+    @unittest.skipUnless(sys.platform.startswith("linux"), "inotify is Linux only")
+    def test_inotify_events(self):
+        self.assertReportsChange(uncommented.InotifyEvents(self.tmp.name))
+
+
+class ResultCaching(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.header = os.path.join(self.tmp.name, "a.h")
+        with open(self.header, "w") as f:
+            f.write("void undocumented();\n")
+        self.cache_path = os.path.join(self.tmp.name, "cache.db")
+        self.options = uncommented.ScanOptions(cache_path=self.cache_path)
+        self.addCleanup(self.close_caches)
+
+    def close_caches(self):
+        for key in [
+            key for key in uncommented._open_caches if key[1] == self.cache_path
+        ]:
+            uncommented._open_caches.pop(key).close()
+
+    def test_unchanged_file_is_not_parsed_again(self):
+        cold = uncommented.find_in_file(self.header, self.options)
+        with mock.patch.object(uncommented, "iter_find") as iter_find:
+            warm = uncommented.find_in_file(self.header, self.options)
+        iter_find.assert_not_called()
+        self.assertEqual(cold, warm)
+        self.assertIn("undocumented", warm[0].signature)
+
+    def test_changed_file_is_parsed_again(self):
+        uncommented.find_in_file(self.header, self.options)
+        with open(self.header, "w") as f:
+            f.write("/// docs\nvoid documented();\n")
+        self.assertEqual(uncommented.find_in_file(self.header, self.options), [])
+
+    def test_key_depends_on_version(self):
+        key = uncommented.ResultCache.key(b"void f();")
+        with mock.patch.object(uncommented, "__version__", "0.0.0-other"):
+            self.assertNotEqual(key, uncommented.ResultCache.key(b"void f();"))
+
+    def test_each_process_opens_its_own_connection(self):
+        parent = uncommented._cache_for(self.options)
+        self.assertIs(uncommented._cache_for(self.options), parent)
+        with mock.patch.object(uncommented.os, "getpid", return_value=os.getpid() + 1):
+            child = uncommented._cache_for(self.options)
+        self.assertIsNot(child, parent)
+
+    def test_workers_do_not_use_the_parents_connection(self):
+        parent = uncommented._cache_for(self.options)
+        headers = []
+        for i in range(4):
+            headers.append(os.path.join(self.tmp.name, f"{i}.h"))
+            with open(headers[-1], "w") as f:
+                f.write(f"void f{i}();\n")
+        get = uncommented.ResultCache.get
+
+        def checked_get(cache, key, sourcecode):
+            if cache is parent:
+                raise AssertionError("used the parent's connection")
+            return get(cache, key, sourcecode)
+
+        with mock.patch.object(uncommented.ResultCache, "get", checked_get):
+            found = dict(uncommented.find_in_files(headers, 2, self.options))
+        self.assertEqual(sorted(found), sorted(headers))
+        self.assertTrue(all(len(items) == 1 for items in found.values()))
+
+    def test_cache_size_comes_from_the_options(self):
+        options = self.options._replace(cache_size=7)
+        self.assertEqual(uncommented._cache_for(options).max_entries, 7)
+
+    def test_eviction_keeps_most_recent_entries(self):
+        cache = uncommented.ResultCache(self.cache_path, max_entries=2)
+        self.addCleanup(cache.close)
+        for i in range(4):
+            cache.put(f"k{i}", [])
+        cache.get("k0", b"")
+        cache.evict()
+        self.assertEqual(cache.get("k0", b""), [])
+        self.assertIsNone(cache.get("k1", b""))
+        self.assertIsNone(cache.get("k2", b""))
+
+
+class ChangedRanges(unittest.TestCase):
+    src = """\
+void first();
+void second();
+
+void third();
+/// docs
+void fourth();
+"""
+
+    def test_only_declarations_in_range_are_checked(self):
+        found = uncommented.find(self.src.encode(), ranges=[(1, 2)])
+        self.assertEqual(len(found), 1)
+        self.assertIn("second", found[0].source)
+
+    def test_comment_change_checks_the_line_below(self):
+        found = uncommented.find(self.src.encode(), ranges=[(4, 5)])
+        self.assertEqual(found, [])
+        found = uncommented.find(self.src.encode(), ranges=[(2, 3)])
+        self.assertEqual(len(found), 1)
+        self.assertIn("third", found[0].source)
+
+    def test_overlapping_ranges_report_once(self):
+        found = uncommented.find(self.src.encode(), ranges=[(0, 2), (1, 4)])
+        self.assertEqual([item.lineno for item in found], [0, 1, 3])
+
+    def test_enclosing_class_is_matched(self):
+        src = """\
+        class Undocumented {
+        public:
+            /// docs
+            void documented();
+        };
+        """
+        found = uncommented.find(src.encode(), ranges=[(3, 4)])
+        self.assertEqual(len(found), 1)
+        self.assertIn("Undocumented", found[0].source)
+
+    def test_merge_ranges(self):
+        self.assertEqual(
+            uncommented.merge_ranges([(5, 6), (0, 2), (2, 3), (8, 9)]),
+            [(0, 3), (5, 6), (8, 9)],
+        )
+
+    def test_diff_ranges_from_git(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+
+        def git(*args):
+            subprocess.run(
+                ["git", *args], cwd=tmp.name, check=True, capture_output=True
+            )
+
+        header = os.path.join(tmp.name, "a.h")
+        with open(header, "w") as f:
+            f.write("void a();\nvoid b();\nvoid c();\nvoid d();\n")
+        git("init", "-q")
+        git("add", "a.h")
+        git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init")
+        with open(header, "w") as f:
+            f.write("void a();\nvoid b2();\nvoid c();\n")
+
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        self.assertEqual(uncommented.diff_ranges("HEAD"), {"a.h": [(1, 2), (3, 3)]})
+        out = subprocess.run(
+            [sys.executable, uncommented.__file__, "--diff", "HEAD"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        self.assertEqual(out.splitlines(), ["a.h:1: void b2();", "a.h:2: void c();"])
+
+
+class StagedFiles(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        self.write("gone.h", "void gone();\n")
+        self.write("kept.h", "void kept();\n")
+        self.git("init", "-q")
+        self.git("add", ".")
+        self.git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "init")
+        os.mkdir("sub")
+        self.write("sub/new.h", "/// docs\nvoid documented();\n")
+        self.write("kept.h", "void kept();\nvoid added();\n")
+        self.write("notes.txt", "void text();\n")
+        os.symlink("kept.h", "link.h")
+        self.git("rm", "-q", "gone.h")
+        self.git("add", ".")
+        # Only the staged contents are checked.
+        self.write("kept.h", "/// docs\nvoid kept();\n")
+
+    def git(self, *args):
+        return subprocess.run(
+            ["git", *args], check=True, capture_output=True, text=True
+        ).stdout.strip()
+
+    def write(self, path, text):
+        with open(path, "w") as f:
+            f.write(text)
+
+    def test_staged_blobs(self):
+        staged = uncommented.staged_blobs()
+        self.assertEqual(
+            [path for path, _ in staged], ["kept.h", "notes.txt", "sub/new.h"]
+        )
+        self.assertEqual(staged[0][1], self.git("rev-parse", ":kept.h"))
+        os.chdir("sub")
+        self.assertEqual([path for path, _ in uncommented.staged_blobs()], ["new.h"])
+
+    def test_read_blobs(self):
+        big = "void f();\n" * 100_000
+        self.write("big.h", big)
+        ids = [
+            self.git("hash-object", "-w", path) for path in ("big.h", "kept.h", "big.h")
+        ]
+        blobs = list(uncommented.read_blobs(ids))
+        self.assertEqual([object_id for object_id, _ in blobs], ids)
+        self.assertEqual(blobs[0][1], big.encode())
+        self.assertEqual(blobs[1][1], b"/// docs\nvoid kept();\n")
+        self.assertEqual(list(uncommented.read_blobs([])), [])
+        with self.assertRaises(ValueError):
+            list(uncommented.read_blobs(["0" * 40]))
+
+    def test_clean_blobs_are_not_read_again(self):
+        results = list(uncommented.find_in_staged(["notes.txt", "kept.h", "sub"]))
+        self.assertEqual(
+            [(path, [finding.lineno for finding in found]) for path, found in results],
+            [("kept.h", [0, 1]), ("notes.txt", [0]), ("sub/new.h", [])],
+        )
+        read = []
+        real_read_blobs = uncommented.read_blobs
+
+        def read_blobs(object_ids):
+            object_ids = list(object_ids)
+            read.extend(object_ids)
+            return real_read_blobs(object_ids)
+
+        with mock.patch.object(uncommented, "read_blobs", read_blobs):
+            stats = uncommented.Stats()
+            self.assertEqual(
+                dict(uncommented.find_in_staged(stats=stats))["sub/new.h"], []
+            )
+            self.assertEqual(read, [self.git("rev-parse", ":kept.h")])
+            self.assertEqual((stats.files, stats.cache_hits), (2, 1))
+            # A run limited to some paths keeps the record of the others.
+            list(uncommented.find_in_staged(["kept.h"]))
+            read.clear()
+            list(uncommented.find_in_staged())
+            self.assertEqual(len(read), 1)
+            # Other checks give other results, so the record does not apply.
+            read.clear()
+            options = uncommented.ScanOptions(checks=("class",))
+            list(uncommented.find_in_staged(options=options))
+            self.assertEqual(len(read), 2)
+
+    def test_command_line(self):
+        out = subprocess.run(
+            [sys.executable, uncommented.__file__, "--staged"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        self.assertEqual(
+            out.splitlines(), ["kept.h:0: void kept();", "kept.h:1: void added();"]
+        )
+
+
+class FindingsHistory(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cwd = os.getcwd()
+        os.chdir(tmp.name)
+        self.addCleanup(os.chdir, cwd)
+        self.git("init", "-q")
+        self.history = uncommented.History(os.path.join(tmp.name, "history.db"))
+        self.addCleanup(self.history.close)
+
+    def git(self, *args):
+        return subprocess.run(
+            ["git", *args], check=True, capture_output=True, text=True
+        ).stdout.strip()
+
+    def commit(self, **files):
+        for name, text in files.items():
+            path = name.replace("__", "/") + ".h"
+            if text is None:
+                os.remove(path)
+                continue
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path, "w") as f:
+                f.write(text)
+        self.git("add", "-A")
+        self.git("-c", "user.name=t", "-c", "user.email=t@t", "commit", "-qm", "change")
+        return self.git("rev-parse", "HEAD")
+
+    def record(self, **kwargs):
+        return uncommented.record_history(self.history, **kwargs)
+
+    def test_only_changed_files_are_checked(self):
+        first = self.commit(
+            a="void a();\n", b="void b();\nvoid b2();\n", sub__c="/// docs\nvoid c();\n"
+        )
+        self.assertEqual(self.record(), (first, 3, 3))
+        second = self.commit(a="/// docs\nvoid a();\n", sub__c="void c();\n")
+        self.assertEqual(self.record(), (second, 2, 3))
+        third = self.commit(b=None)
+        self.assertEqual(self.record(), (third, 0, 1))
+        self.assertEqual(self.record(), (third, 0, 1))
+        self.assertEqual(self.history.trend(), [(first, 3), (second, 3), (third, 1)])
+        at_second = self.history.findings(second)
+        self.assertEqual(
+            [(found.path, found.row, found.signature) for found in at_second],
+            [
+                ("b.h", 0, "void b();"),
+                ("b.h", 1, "void b2();"),
+                ("sub/c.h", 0, "void c();"),
+            ],
+        )
+        self.assertEqual(
+            [found.path for found in self.history.findings(third)], ["sub/c.h"]
+        )
+        self.assertEqual(self.history.findings(first, "a.h")[0].signature, "void a();")
+        self.assertEqual(self.history.introduced(at_second[2].fingerprint), second)
+        self.assertEqual(self.history.introduced(at_second[0].fingerprint), first)
+        with self.assertRaises(KeyError):
+            self.history.findings("0" * 40)
+
+    def test_repeated_findings_are_counted(self):
+        commit = self.commit(a="#ifdef X\nvoid f();\n#else\nvoid f();\n#endif\n")
+        self.record()
+        (found,) = self.history.findings(commit)
+        self.assertEqual((found.row, found.count), (1, 2))
+        self.assertEqual(self.history.trend(), [(commit, 2)])
+
+    def test_other_options_check_every_file(self):
+        self.commit(a="void a();\n", b="class B {};\n")
+        self.record()
+        self.commit(b="/// docs\nclass B {};\n")
+        commit, checked, total = self.record(
+            options=uncommented.ScanOptions(checks=("function",))
+        )
+        self.assertEqual((checked, total), (2, 1))
+        # Files deleted since are dropped when every file is checked again.
+        self.commit(a=None)
+        self.assertEqual(self.record()[1:], (1, 0))
+
+    def test_command_line(self):
+        self.commit(a="void a();\n")
+        first = self.commit(b="void b();\n")
+        self.commit(a="/// docs\nvoid a();\n")
+        db = self.history.path
+        for rev in ("HEAD~1", "HEAD"):
+            out = subprocess.run(
+                [
+                    sys.executable,
+                    uncommented.__file__,
+                    "--history",
+                    db,
+                    "--commit",
+                    rev,
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+        self.assertEqual(
+            out.strip(), f"{self.git('rev-parse', 'HEAD')}: 1 files checked, 1 findings"
+        )
+        self.assertEqual(self.history.trend()[0], (first, 2))
+
+
+class BenchmarkShapes(unittest.TestCase):
+    def test_shapes_report_expected_counts(self):
+        for name, shape in bench_uncommented.SHAPES.items():
+            with self.subTest(name):
+                header = shape(10)
+                self.assertEqual(
+                    len(uncommented.find(header.source)), header.undocumented
+                )
+
+    def test_regressions_are_reported(self):
+        baseline = {
+            "shapes": {"macros": {"seconds": 1.0, "size": 10}},
+            "scaling": {"10": 1.0},
+        }
+        report = {
+            "shapes": {"macros": {"seconds": 1.5, "size": 10}},
+            "scaling": {"10": 1.1},
+        }
+        self.assertEqual(len(bench_uncommented.regressions(report, baseline, 0.25)), 1)
+        self.assertEqual(bench_uncommented.regressions(report, baseline, 0.6), [])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -2,17 +2,38 @@
 # This program finds and displays uncommented/undocumented declarations/definitions.
 # It's useful for automated tools to block merges of undocumented APIs in header files.
 
-from typing import NamedTuple, Tuple
-import tree_sitter_cpp as tscpp
-from argparse import ArgumentParser
-from tree_sitter import Language, Node, Parser, Query, QueryCursor
+# Heavy modules (the grammar, the query engine, NumPy, SQLite, multiprocessing)
+# are imported where they are first used, so `--help` and small runs start fast.
 
+from __future__ import annotations
 
-_cpp_lang = Language(tscpp.language())
-_parser = Parser(_cpp_lang)
-_query = Query(
-    _cpp_lang,
-    """\
+import os
+import struct
+import sys
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from bisect import bisect_right
+from itertools import repeat
+from typing import (
+    TYPE_CHECKING,
+    Hashable,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    TextIO,
+    Tuple,
+    Union,
+)
+
+if TYPE_CHECKING:
+    from concurrent.futures import Executor
+    from tree_sitter import Language, Node, Parser, Query, QueryCursor, Tree
+
+__version__ = "0.3.0"
+
+_query_source = """\
     (declaration (function_declarator)) @function.declaration
 
     (function_definition (storage_class_specifier "inline")) @function.definition.inline
@@ -76,8 +97,198 @@ _query = Query(
             body: (field_declaration_list))) @union.template_declaration
 
     (preproc_function_def) @macro.func_def
-    """,
-)
+    """
+# The C profile: the patterns of `_query_source` that plain C can match.
+_c_query_source = """\
+    (declaration (function_declarator)) @function.declaration
+
+    (function_definition (storage_class_specifier "inline")) @function.definition.inline
+
+    (field_declaration
+        declarator: (function_declarator
+            declarator: (parenthesized_declarator (pointer_declarator)))) @struct.funcptr_member
+
+    (struct_specifier
+        name: (type_identifier)
+        body: (field_declaration_list)) @struct.declaration
+
+    (union_specifier
+        name: (type_identifier)
+        body: (field_declaration_list)) @union.declaration
+
+    (preproc_function_def) @macro.func_def
+    """
+_query_sources = {"cpp": _query_source, "c": _c_query_source}
+LANGUAGES = tuple(_query_sources)
+
+
+# Includes through a macro (`#include HEADER`) cannot be followed.
+_include_query_source = """\
+    (preproc_include path: [(string_literal) (system_lib_string)] @path)
+    """
+
+# The C grammar accepts member function declarations, as fields.
+_member_function_query_source = """\
+    (function_declarator declarator: (field_identifier)) @member
+    """
+
+
+@lru_cache(maxsize=None)
+def _language(lang: str = "cpp") -> Language:
+    """
+    The grammar of a profile. The C grammar is an optional dependency, without
+    it C is parsed with the C++ grammar, which accepts C as well.
+    """
+    from tree_sitter import Language
+
+    if lang == "c":
+        try:
+            import tree_sitter_c
+        except ImportError:
+            return _language("cpp")
+        return Language(tree_sitter_c.language())
+    import tree_sitter_cpp as tscpp
+
+    return Language(tscpp.language())
+
+
+_thread_local = threading.local()
+
+
+def _parser(lang: str = "cpp") -> Parser:
+    """
+    Returns this thread's parser for a profile. Parsers must not be shared
+    between threads, while the compiled queries can be.
+    """
+    parsers = getattr(_thread_local, "parsers", None)
+    if parsers is None:
+        parsers = _thread_local.parsers = {}
+    parser = parsers.get(lang)
+    if parser is None:
+        from tree_sitter import Parser
+
+        parser = parsers[lang] = Parser(_language(lang))
+    return parser
+
+
+@lru_cache(maxsize=None)
+def _query(lang: str = "cpp", checks: frozenset[str] | None = None) -> Query:
+    """
+    Compiles the query of a profile the first time it is needed. With
+    `checks`, only the patterns capturing one of those names are compiled, so
+    the others never produce matches.
+    """
+    from tree_sitter import Query
+
+    query_source = _query_sources[lang]
+    if checks is not None:
+        query_source = "\n\n".join(
+            pattern
+            for pattern in _patterns(query_source)
+            if _capture_of(pattern) in checks
+        )
+    return Query(_language(lang), query_source)
+
+
+def _patterns(query_source: str) -> list[str]:
+    """
+    Splits a query into its top-level patterns, each with its capture.
+    """
+    starts = []
+    depth = 0
+    in_string = False
+    for index, char in enumerate(query_source):
+        if char == '"':
+            in_string = not in_string
+        elif in_string:
+            continue
+        elif char in "([":
+            if depth == 0:
+                starts.append(index)
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+    ends = starts[1:] + [len(query_source)]
+    return [query_source[start:end].strip() for start, end in zip(starts, ends)]
+
+
+def _capture_of(pattern: str) -> str:
+    import re
+
+    return re.search(r"@([\w.]+)", pattern).group(1)
+
+
+def select_checks(checks: Iterable[str]) -> frozenset[str] | None:
+    """
+    Resolves check selectors to the capture names they select, or None when
+    they select every capture. A selector is a capture name such as
+    "function.declaration", a prefix of one ending at a dot such as "function",
+    or a glob such as "*operator*". Selectors starting with "-" deselect; when
+    all selectors do, they deselect from every capture.
+    Raises ValueError for a selector that selects nothing.
+    """
+    from fnmatch import fnmatchcase
+
+    every = _capture_order()
+
+    def selected_by(selector: str) -> list[str]:
+        found = [
+            capture
+            for capture in every
+            if fnmatchcase(capture, selector) or fnmatchcase(capture, selector + ".*")
+        ]
+        if not found:
+            raise ValueError(
+                f"{selector!r} does not select any check, expected one of {every}"
+            )
+        return found
+
+    include = [check for check in checks if not check.startswith("-")]
+    exclude = [check[1:] for check in checks if check.startswith("-")]
+    selected = (
+        set(every)
+        if not include
+        else {c for check in include for c in selected_by(check)}
+    )
+    for check in exclude:
+        selected.difference_update(selected_by(check))
+    return None if selected == set(every) else frozenset(selected)
+
+
+@lru_cache(maxsize=None)
+def _include_query(lang: str = "cpp") -> Query:
+    from tree_sitter import Query
+
+    return Query(_language(lang), _include_query_source)
+
+
+@lru_cache(maxsize=None)
+def _member_function_query() -> Query:
+    from tree_sitter import Query
+
+    return Query(_language("c"), _member_function_query_source)
+
+
+@lru_cache(maxsize=None)
+def _capture_order(lang: str = "cpp") -> list[str]:
+    """
+    The capture names of a profile's query in pattern order, without compiling it.
+    """
+    import re
+
+    return list(dict.fromkeys(re.findall(r"@([\w.]+)", _query_sources[lang])))
+
+
+@lru_cache(maxsize=None)
+def _numpy():
+    """
+    Returns the numpy module, or None when it is not installed.
+    """
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
 
 
 class UncommentedDeclaration(NamedTuple):
@@ -85,108 +296,4083 @@ class UncommentedDeclaration(NamedTuple):
     source: str
 
 
-def find(sourcecode: bytes) -> list[UncommentedDeclaration]:
+Point = Tuple[int, int]
+
+# bytes, or any buffer that slices to bytes, such as an mmap.mmap
+Source = bytes
+
+
+class Finding:
     """
-    Finds uncommented/undocumented function declarations.
-    Returns a list of undocumented declarations
+    An undocumented declaration, as yielded by iter_find().
+    Only byte and point ranges into the source are stored. The text is sliced
+    and decoded on demand, so large class bodies are never copied unless asked
+    for. A pickled Finding carries its signature but not the source.
     """
-    tree = _parser.parse(sourcecode)
-    found = []
-    qc = QueryCursor(_query)
-    for matches in qc.matches(tree.root_node):
-        _, captures = matches
-        assert len(captures) == 1, "Only 1 capture per pattern is supported."
-        cap_name, nodes = next(iter(captures.items()))
-        node_of_interest = nodes[0]  # there can only be one
-        if skip_this_node(cap_name, node_of_interest):
-            continue
-        if not has_adjacent_comment(node_of_interest):
-            assert node_of_interest.text is not None
-            found.append(
-                UncommentedDeclaration(
-                    node_of_interest.start_point.row, node_of_interest.text.decode()
-                )
+
+    __slots__ = (
+        "capture",
+        "start_byte",
+        "end_byte",
+        "start_point",
+        "end_point",
+        "signature_end",
+        "scope",
+        "_source",
+        "_signature",
+    )
+
+    def __init__(
+        self,
+        capture: str,
+        start_byte: int,
+        end_byte: int,
+        start_point: Point,
+        end_point: Point,
+        signature_end: int,
+        scope: str = "",
+        source: Source | None = None,
+    ):
+        self.capture = capture
+        self.start_byte = start_byte
+        self.end_byte = end_byte
+        self.start_point = start_point
+        self.end_point = end_point
+        self.signature_end = signature_end
+        self.scope = scope
+        self._source = source
+        self._signature: str | None = None
+
+    @classmethod
+    def from_node(cls, capture: str, node: Node, source: bytes) -> "Finding":
+        return cls(
+            capture,
+            node.start_byte,
+            node.end_byte,
+            tuple(node.start_point),
+            tuple(node.end_point),
+            _signature_end(node),
+            _scope_of(node),
+            source,
+        )
+
+    @property
+    def lineno(self) -> int:
+        return self.start_point[0]
+
+    @property
+    def text(self) -> str:
+        """
+        The full source of the declaration, including any body.
+        """
+        if self._source is None:
+            raise ValueError("the source of this finding is not available")
+        return bytes(self._source[self.start_byte : self.end_byte]).decode()
+
+    @property
+    def signature(self) -> str:
+        """
+        The source of the declaration up to its body.
+        """
+        if self._signature is None:
+            if self._source is None:
+                raise ValueError("the source of this finding is not available")
+            raw = self._source[self.start_byte : self.signature_end]
+            self._signature = bytes(raw).decode().rstrip()
+        return self._signature
+
+    def _key(self) -> tuple:
+        return (
+            self.capture,
+            self.start_byte,
+            self.end_byte,
+            self.start_point,
+            self.end_point,
+            self.signature_end,
+            self.scope,
+        )
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Finding):
+            return NotImplemented
+        return self._key() == other._key()
+
+    def __hash__(self) -> int:
+        return hash(self._key())
+
+    def __repr__(self) -> str:
+        return (
+            f"Finding({self.capture!r}, lineno={self.lineno},"
+            f" start_byte={self.start_byte})"
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "line": self.start_point[0],
+            "column": self.start_point[1],
+            "end_line": self.end_point[0],
+            "end_column": self.end_point[1],
+            "start_byte": self.start_byte,
+            "end_byte": self.end_byte,
+            "capture": self.capture,
+            "scope": self.scope,
+            "signature": self.signature,
+        }
+
+    def __getstate__(self):
+        return self._key() + (self.signature,)
+
+    def __setstate__(self, state):
+        self.__init__(*state[:-1])
+        self._signature = state[-1]
+
+
+class Stats:
+    """
+    Where the time of a run goes. Collects per-phase timings, matches per
+    capture name and how many matches each filter dropped. A run-level Stats
+    also keeps the Stats of every file in `per_file`.
+    Files that hit one of their Limits are counted as `skipped` or `partial`,
+    and `limits` counts them by the limit they hit.
+    Pass one to iter_find() or find_in_files() to fill it in.
+    """
+
+    PHASES = (
+        "read",
+        "parse",
+        "query",
+        "skip_this_node",
+        "has_adjacent_comment",
+        "walk",
+    )
+    FILTERS = ("skip_this_node", "has_adjacent_comment")
+
+    def __init__(self):
+        self.files = 0
+        self.bytes = 0
+        self.findings = 0
+        self.cache_hits = 0
+        self.skipped = 0
+        self.partial = 0
+        self.limits: Counter[str] = Counter()
+        self.seconds = dict.fromkeys(self.PHASES, 0.0)
+        self.matches: Counter[str] = Counter()
+        self.dropped: dict[str, Counter[str]] = {
+            name: Counter() for name in self.FILTERS
+        }
+        self.per_file: dict[str, Stats] = {}
+
+    @property
+    def status(self) -> str:
+        """
+        "skipped", "partial" or "ok", for the Stats of a single file.
+        """
+        if self.skipped:
+            return "skipped"
+        return "partial" if self.partial else "ok"
+
+    def limit_exceeded(self, error: LimitExceeded):
+        if error.partial:
+            self.partial += 1
+        else:
+            self.skipped += 1
+        self.limits[error.limit] += 1
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(self.seconds.values())
+
+    @property
+    def bytes_per_second(self) -> float:
+        total = self.total_seconds
+        return self.bytes / total if total else 0.0
+
+    def merge(self, other: "Stats"):
+        self.files += other.files
+        self.bytes += other.bytes
+        self.findings += other.findings
+        self.cache_hits += other.cache_hits
+        self.skipped += other.skipped
+        self.partial += other.partial
+        self.limits.update(other.limits)
+        for phase, seconds in other.seconds.items():
+            self.seconds[phase] += seconds
+        self.matches.update(other.matches)
+        for name, dropped in other.dropped.items():
+            self.dropped[name].update(dropped)
+
+    def as_dict(self) -> dict:
+        result = {
+            "files": self.files,
+            "bytes": self.bytes,
+            "findings": self.findings,
+            "cache_hits": self.cache_hits,
+            "skipped": self.skipped,
+            "partial": self.partial,
+            "limits": dict(self.limits),
+            "seconds": self.seconds,
+            "bytes_per_second": self.bytes_per_second,
+            "matches": dict(self.matches),
+            "dropped": {name: dict(dropped) for name, dropped in self.dropped.items()},
+        }
+        if self.per_file:
+            result["per_file"] = {
+                path: stats.as_dict() for path, stats in self.per_file.items()
+            }
+        return result
+
+    def format(self, slowest: int = 10) -> str:
+        """
+        Renders the aggregate and the slowest files as a human-readable table.
+        """
+        lines = [
+            f"files: {self.files}  bytes: {self.bytes}  findings: {self.findings}"
+            f"  cache hits: {self.cache_hits}"
+            f"  time: {self.total_seconds:.3f}s"
+            f"  ({self.bytes_per_second / 1e6:.2f} MB/s)",
+        ]
+        if self.limits:
+            hit = ", ".join(
+                f"{limit} {count}" for limit, count in sorted(self.limits.items())
             )
-    return found
+            lines.append(
+                f"skipped: {self.skipped}  partial: {self.partial}  limits hit: {hit}"
+            )
+        lines += ["", f"{'phase':<24}{'seconds':>10}"]
+        for phase, seconds in self.seconds.items():
+            if seconds:
+                lines.append(f"{phase:<24}{seconds:>10.4f}")
+        lines += [
+            "",
+            f"{'capture':<40}{'matches':>9}{'skipped':>9}{'documented':>12}",
+        ]
+        for capture, count in sorted(self.matches.items()):
+            lines.append(
+                f"{capture:<40}{count:>9}"
+                f"{self.dropped['skip_this_node'][capture]:>9}"
+                f"{self.dropped['has_adjacent_comment'][capture]:>12}"
+            )
+        if self.per_file:
+            lines += ["", "slowest files:"]
+            by_time = sorted(
+                self.per_file.items(),
+                key=lambda item: item[1].total_seconds,
+                reverse=True,
+            )
+            for path, stats in by_time[:slowest]:
+                lines.append(
+                    f"  {stats.total_seconds:8.4f}s"
+                    f" {stats.bytes_per_second / 1e6:8.2f} MB/s"
+                    f" {stats.matches.total():>7} matches  {path}"
+                )
+            limited = [
+                (path, stats) for path, stats in self.per_file.items() if stats.limits
+            ]
+            if limited:
+                lines += ["", "files over a limit:"]
+                for path, stats in limited:
+                    lines.append(
+                        f"  {stats.status:<8} {', '.join(stats.limits)}  {path}"
+                    )
+        return "\n".join(lines)
 
 
-def has_adjacent_comment(node: Node) -> bool:
+class Coverage:
     """
-    Returns True when an adjacent comment documents the node.
-    Handles typedef struct/union/class definitions where the comment precedes
-    the typedef, not the struct/union/class specifier itself.
+    How many of the declarations that are checked are documented, per capture
+    name. Declarations that skip_this_node() leaves out, such as private
+    members, are not counted.
     """
-    previous_node = node.prev_named_sibling
+
+    def __init__(self):
+        self.documented: Counter[str] = Counter()
+        self.undocumented: Counter[str] = Counter()
+
+    @property
+    def total(self) -> int:
+        return sum(self.documented.values()) + sum(self.undocumented.values())
+
+    @property
+    def ratio(self) -> float:
+        """
+        The documented fraction, 1.0 when there is nothing to document.
+        """
+        total = self.total
+        return sum(self.documented.values()) / total if total else 1.0
+
+    def merge(self, other: "Coverage"):
+        self.documented.update(other.documented)
+        self.undocumented.update(other.undocumented)
+
+    def as_dict(self) -> dict:
+        return {
+            "documented": sum(self.documented.values()),
+            "total": self.total,
+            "coverage": self.ratio,
+            "captures": {
+                capture: {
+                    "documented": self.documented[capture],
+                    "total": self.documented[capture] + self.undocumented[capture],
+                }
+                for capture in sorted(self.documented.keys() | self.undocumented.keys())
+            },
+        }
+
+
+class Limits(NamedTuple):
+    """
+    Bounds on the work spent on a single file, so one pathological header
+    cannot stall a run. None disables a limit.
+    """
+
+    # Larger files are skipped without being parsed.
+    max_bytes: int | None = None
+    # Seconds the parse may take before the file is skipped.
+    parse_timeout: float | None = None
+    # Seconds the query may take before its matches so far are used.
+    query_timeout: float | None = None
+    # Matches the query may have in progress at once. tree-sitter drops the
+    # oldest ones beyond this, so some declarations may not be reported.
+    match_limit: int | None = None
+
+
+class LimitExceeded(Exception):
+    """
+    Raised when a file hits one of its Limits. `limit` is the name of the
+    Limits field, and `partial` is True when the findings yielded before it
+    was raised are all there is, rather than none of the file being checked.
+    """
+
+    def __init__(self, limit: str, partial: bool):
+        super().__init__(limit, partial)
+        self.limit = limit
+        self.partial = partial
+
+    @property
+    def status(self) -> str:
+        return "partial" if self.partial else "skipped"
+
+    def __str__(self) -> str:
+        return f"{self.status}, {self.limit} exceeded"
+
+
+def _set_timeout(obj: Parser | QueryCursor, seconds: float | None):
+    """
+    Sets the `timeout_micros` of a parser or query cursor, 0 meaning none.
+    It is deprecated in favor of progress callbacks, but those crash the
+    tree-sitter version this tool pins.
+    """
+    import warnings
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", DeprecationWarning)
+        obj.timeout_micros = 0 if seconds is None else max(1, int(seconds * 1e6))
+
+
+LineRange = Tuple[int, int]
+
+
+ENGINES = ("query", "walk")
+
+
+def iter_find(
+    sourcecode: Source,
+    ranges: Iterable[LineRange] | None = None,
+    engine: str = "query",
+    stats: Stats | None = None,
+    lang: str = "cpp",
+    checks: Iterable[str] | None = None,
+    limits: Limits | None = None,
+) -> Iterator[Finding]:
+    """
+    Yields the uncommented/undocumented declarations as they are found.
+    `sourcecode` may also be a memory map, see read_source().
+    When `ranges` is given, only declarations intersecting those line ranges
+    (0-based, end exclusive) are checked.
+    `engine` selects how the tree is searched: "query" runs the tree-sitter
+    query and filters its matches, "walk" classifies nodes in a single pass.
+    Both give the same results.
+    `stats` collects timings and counts when given.
+    `lang` selects the profile: "cpp" parses with the C++ grammar and runs the
+    full query, "c" parses with the C grammar and leaves out the C++-only
+    patterns, "auto" picks C for sources that look like plain C.
+    `checks` limits the search to the captures select_checks() selects.
+    `limits` bounds the work spent on the source, LimitExceeded is raised
+    when it hits one. The query limits do not apply to the "walk" engine.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
+    if lang not in LANGUAGES and lang != "auto":
+        raise ValueError(
+            f"unknown language {lang!r}, expected 'auto' or one of {LANGUAGES}"
+        )
+    selected = None if checks is None else select_checks(checks)
     if (
-        previous_node is not None
-        and previous_node.type == "comment"
-        and previous_node.end_point.row + 1 == node.start_point.row
+        limits is not None
+        and limits.max_bytes is not None
+        and len(sourcecode) > limits.max_bytes
     ):
+        raise LimitExceeded("max_bytes", partial=False)
+    if stats is not None:
+        stats.bytes += len(sourcecode)
+        start = time.perf_counter()
+    try:
+        tree, lang = _parse_profile(sourcecode, lang, limits)
+    finally:
+        if stats is not None:
+            stats.seconds["parse"] += time.perf_counter() - start
+    yield from _iter_tree(
+        tree, sourcecode, ranges, engine, stats, lang, selected, limits
+    )
+
+
+# Source that is not a bytes object is fed to the parser in chunks of this size.
+PARSE_CHUNK_BYTES = 1024 * 1024
+
+
+_cpp_only = None
+
+
+def _detect_lang(sourcecode: Source) -> str:
+    """
+    Guesses the profile of a source: C unless it uses `::` or a keyword that
+    only C++ has.
+    """
+    global _cpp_only
+    if _cpp_only is None:
+        import re
+
+        _cpp_only = re.compile(
+            rb"::|\b(?:class|namespace|template|typename|public|private|protected"
+            rb"|operator|virtual|explicit|friend|using|constexpr|noexcept|nullptr"
+            rb"|decltype)\b"
+        )
+    return "cpp" if _cpp_only.search(sourcecode) else "c"
+
+
+def _needs_cpp(tree: Tree) -> bool:
+    """
+    Whether a tree parsed as C must be parsed again as C++: it has syntax
+    errors, or its structs declare member functions, which only C++ has.
+    """
+    if tree.root_node.has_error:
         return True
-    # deal with typedefs
-    parent = node.parent
-    if parent is None or parent.type != "type_definition":
+    if _language("c") is _language("cpp"):
         return False
-    parent_prev_node = parent.prev_named_sibling
-    return (
-        parent_prev_node is not None
-        and parent_prev_node.type == "comment"
-        and parent_prev_node.end_point.row + 1 == parent.start_point.row
-    )
+    from tree_sitter import QueryCursor
 
+    return bool(QueryCursor(_member_function_query()).captures(tree.root_node))
 
-def skip_this_node(capture_name: str, node: Node) -> bool:
+
+def _parse_profile(
+    sourcecode: Source, lang: str, limits: Limits | None = None
+) -> Tuple[Tree, str]:
     """
-    Tree-sitter queries are powerful but cannot handle all situations. This function
-    applies ad-hoc checks to captured nodes to indicate if we don't care about this node.
-    This keeps the queries very simple. Useful for annoying C++ parsing.
+    Parses with the grammar of `lang` and returns the tree and its profile.
+    For "auto", sources that look like C are parsed as C, and parsed again as
+    C++ if the C grammar reports syntax errors or member functions.
+    The parse timeout of `limits` bounds both parses together.
     """
-    class_like_caps = {
-        "class.declaration",
-        "struct.declaration",
-        "union.declaration",
-    }
-    if capture_name in class_like_caps:
-        cur_node = node
-        while cur_node is not None:
-            if cur_node.type == "template_declaration":
-                return True  # Templates have their own capture
-            cur_node = cur_node.parent
+    timeout = None if limits is None else limits.parse_timeout
+    if lang == "auto":
+        lang = _detect_lang(sourcecode)
+        if lang == "c":
+            start = time.perf_counter()
+            tree = _parse(sourcecode, lang="c", timeout=timeout)
+            if not _needs_cpp(tree):
+                return tree, lang
+            if timeout is not None:
+                timeout = max(0.0, timeout - (time.perf_counter() - start))
+            lang = "cpp"
+    return _parse(sourcecode, lang=lang, timeout=timeout), lang
 
-    # skip private members
-    it_is, the_type = is_in_user_type(node)
-    if it_is:
-        cur_node = node
-        while (cur_node := cur_node.prev_named_sibling) is not None:
-            if cur_node.type == "access_specifier":
-                return cur_node.text == b"private"
-        return the_type == "class_specifier"  # class members are private by default
 
-    return False
+def _parse(
+    sourcecode: Source,
+    old_tree: Tree | None = None,
+    lang: str = "cpp",
+    timeout: float | None = None,
+) -> Tree:
+    """
+    Parses bytes directly, and any other buffer (such as a memory map) through
+    the parser's read callback, one chunk at a time.
+    When the parse takes longer than `timeout` seconds, LimitExceeded is raised.
+    """
+    if isinstance(sourcecode, bytes):
+        source = sourcecode
+    else:
 
+        def source(offset: int, _point) -> bytes:
+            return sourcecode[offset : offset + PARSE_CHUNK_BYTES]
 
-def is_in_user_type(node: Node) -> Tuple[bool, str]:
-    cur_node = node.parent
-    while cur_node is not None:
-        if cur_node.type in {"class_specifier", "struct_specifier", "union_specifier"}:
-            return True, cur_node.type
-        cur_node = cur_node.parent
-    return False, ""
+    parser = _parser(lang)
+    if timeout is None:
+        if old_tree is None:
+            return parser.parse(source)
+        return parser.parse(source, old_tree)
+    _set_timeout(parser, timeout)
+    try:
+        tree = (
+            parser.parse(source) if old_tree is None else parser.parse(source, old_tree)
+        )
+    except ValueError:
+        tree = None
+    finally:
+        _set_timeout(parser, None)
+    if tree is None:
+        # Otherwise the next parse would resume this one.
+        parser.reset()
+        raise LimitExceeded("parse_timeout", partial=False)
+    return tree
 
 
-def main():
-    argParser = ArgumentParser(
-        description="Find and display commented/uncommented function declarations"
-    )
-    argParser.add_argument("file", help="Path to the file to analyze.")
-    args = argParser.parse_args()
+def _iter_tree(
+    tree: Tree,
+    sourcecode: Source,
+    ranges: Iterable[LineRange] | None,
+    engine: str,
+    stats: Stats | None = None,
+    lang: str = "cpp",
+    checks: frozenset[str] | None = None,
+    limits: Limits | None = None,
+) -> Iterator[Finding]:
+    """
+    iter_find() on a tree that is already parsed from `sourcecode` with the
+    grammar of `lang`, with `checks` as select_checks() returns them.
+    """
+    root = tree.root_node
+    if engine == "query":
+        undocumented = _query_engine(root, ranges, stats, lang, checks, limits)
+    else:
+        undocumented = _walk_engine(root, ranges, stats, lang, checks)
+    for cap_name, node_of_interest in undocumented:
+        if stats is not None:
+            stats.findings += 1
+        yield Finding.from_node(cap_name, node_of_interest, sourcecode)
+
+
+def find(
+    sourcecode: bytes,
+    ranges: Iterable[LineRange] | None = None,
+    engine: str = "query",
+    lang: str = "cpp",
+    checks: Iterable[str] | None = None,
+) -> list[UncommentedDeclaration]:
+    """
+    Finds uncommented/undocumented function declarations.
+    Returns a list of undocumented declarations
+    See iter_find() for the arguments.
+    """
+    return [
+        UncommentedDeclaration(finding.lineno, finding.text)
+        for finding in iter_find(sourcecode, ranges, engine, lang=lang, checks=checks)
+    ]
+
+
+# iter_find_chunked() cuts sources into chunks of at least this many bytes.
+CHUNK_BYTES = 4 * 1024 * 1024
+
+
+_split_tokens = None
+_guard_start = None
+_guard_end = None
+
+
+def _include_guard(sourcecode: Source) -> list[Tuple[int, int]]:
+    """
+    Returns the byte spans of the #ifndef, #define and #endif lines of an
+    include guard around the whole source, or nothing when there is none.
+    """
+    global _guard_start, _guard_end
+    if _guard_start is None:
+        import re
+
+        comments = rb"\s*(?:(?://[^\n]*|/\*.*?\*/)\s*)*"
+        _guard_start = re.compile(
+            comments
+            + rb"(\#)[ \t]*ifndef[ \t]+(\w+)[^\n]*\n\s*(\#)[ \t]*define[ \t]+\2\b",
+            re.DOTALL,
+        )
+        _guard_end = re.compile(
+            rb"\#[ \t]*endif\b[^\n]*" + comments + rb"\Z", re.DOTALL
+        )
+    guard = _guard_start.match(sourcecode)
+    if guard is None:
+        return []
+    last_directive = sourcecode.rfind(b"#")
+    if not _guard_end.match(sourcecode, last_directive):
+        return []
+    spans = []
+    for start in (guard.start(1), guard.start(3), last_directive):
+        end = sourcecode.find(b"\n", start)
+        spans.append((start, len(sourcecode) if end < 0 else end))
+    return spans
 
-    with open(args.file, "rb") as f:
-        file_b = f.read()
 
-    hooligans = find(file_b)
-    for hooligan in hooligans:
-        print(hooligan.lineno, ": ", hooligan.source.replace("\n", ""), sep="")
+def split_points(sourcecode: Source) -> list[int]:
+    """
+    Returns the byte offsets where `sourcecode` can be cut into pieces that
+    parse to the same declarations: the starts of lines after a line that
+    ends a declaration, at brace depth 0, outside #if blocks, comments and
+    directives. A declaration ends with `;`, or with the `}` of the body of a
+    function, namespace or `extern "C"` block (see _is_block_head()); after
+    the body of a struct, union, enum or class, its declarators and
+    attributes can follow on the next lines. Such a line does not end with a
+    comment, so no comment is cut off from the declaration it documents.
+    An include guard around the whole source does not count as an #if block,
+    iter_find_chunked() blanks it out of the chunks.
+    Sources wrapped in one block, such as a namespace or `extern "C"`, have
+    no split points.
+    """
+    global _split_tokens
+    if _split_tokens is None:
+        import re
+
+        # Runs of other bytes are skipped in one match. Comments, literals and
+        # whole directives, with their continuation lines, are matched as one
+        # token so the braces and semicolons inside them are ignored. Outside
+        # of those, `#` only starts directives.
+        _split_tokens = re.compile(
+            rb"""
+            [^/"'\#{};]+
+            | (?P<comment>//[^\n]*|/\*.*?\*/)
+            | (?P<literal>"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+            | (?P<directive>\#[ \t]*(?P<keyword>\w*)(?:[^\n\\]|\\\r?\n|\\)*)
+            | (?P<open>{)
+            | (?P<end>[;}])(?P<eol>[ \t\r]*\n)?
+            | .
+            """,
+            re.DOTALL | re.VERBOSE,
+        )
+    guard = {start for start, _ in _include_guard(sourcecode)}
+    depth = if_depth = 0
+    # Where the text before the next top-level `{` starts, and whether that
+    # `{` opens a block that its `}` ends.
+    head_start = 0
+    block = False
+    points = []
+    for match in _split_tokens.finditer(sourcecode):
+        kind = match.lastgroup
+        if kind == "eol" or kind == "end":
+            if match["end"] == b"}":
+                depth -= 1
+                ends = depth == 0 and block
+            else:
+                ends = depth == 0
+            if depth == 0:
+                head_start = match.end()
+            if kind == "eol" and ends and if_depth == 0:
+                points.append(match.end())
+        elif kind == "open":
+            if depth == 0:
+                block = _is_block_head(sourcecode[head_start : match.start()])
+            depth += 1
+        elif kind == "directive":
+            if depth == 0:
+                head_start = match.end()
+            if match.start() in guard:
+                continue
+            keyword = match["keyword"]
+            if keyword in (b"if", b"ifdef", b"ifndef"):
+                if_depth += 1
+            elif keyword == b"endif":
+                if_depth -= 1
+    return points
+
+
+_block_heads = None
+
+
+def _is_block_head(head: Source) -> bool:
+    """
+    Whether the text before a `{` opens the body of a function, a namespace
+    or an `extern "C"` block: it ends with a namespace name, a linkage string
+    or a parameter list (followed by qualifiers or member initializers), and
+    the parentheses are not those of an attribute.
+    """
+    global _block_heads
+    if _block_heads is None:
+        import re
+
+        _block_heads = (
+            re.compile(rb"//[^\n]*|/\*.*?\*/", re.DOTALL),
+            re.compile(rb'\b(?:namespace\s*[\w:]*|extern\s*"C(?:\+\+)?")\s*\Z'),
+            re.compile(rb"\)[\w\s&]*\Z"),
+            re.compile(rb"(?:__attribute__|__attribute|__declspec|alignas)\s*\Z"),
+        )
+    comments, linkage, parameters, attribute = _block_heads
+    head = comments.sub(b" ", bytes(head))
+    if linkage.search(head):
+        return True
+    match = parameters.search(head)
+    if match is None:
+        return False
+    depth = 0
+    for index in range(match.start(), -1, -1):
+        if head[index] == ord(")"):
+            depth += 1
+        elif head[index] == ord("("):
+            depth -= 1
+            if depth == 0:
+                return attribute.search(head, 0, index) is None
+    return False
+
+
+def _chunk_bounds(sourcecode: Source, chunk_bytes: int) -> list[int]:
+    """
+    Returns the offsets that cut `sourcecode` into chunks, from 0 to its end.
+    Each chunk ends at the first split point `chunk_bytes` after its start.
+    """
+    bounds = [0]
+    for point in split_points(sourcecode):
+        if point - bounds[-1] >= chunk_bytes:
+            bounds.append(point)
+    if bounds[-1] < len(sourcecode):
+        bounds.append(len(sourcecode))
+    return bounds
+
+
+def iter_find_chunked(
+    sourcecode: Source,
+    executor: Executor | None = None,
+    engine: str = "query",
+    stats: Stats | None = None,
+    lang: str = "cpp",
+    checks: Iterable[str] | None = None,
+    limits: Limits | None = None,
+    chunk_bytes: int = CHUNK_BYTES,
+) -> Iterator[Finding]:
+    """
+    iter_find() for giant sources: the source is cut at split_points() into
+    chunks of about `chunk_bytes`, which are parsed and searched in parallel
+    on `executor`, or one after the other without one.
+    The findings are the same as iter_find()'s, in the same order, with rows
+    and offsets into the whole source. They are yielded once every chunk is
+    done. When chunks hit a limit, LimitExceeded is raised after them.
+    """
+    if engine not in ENGINES:
+        raise ValueError(f"unknown engine {engine!r}, expected one of {ENGINES}")
+    if lang not in LANGUAGES and lang != "auto":
+        raise ValueError(
+            f"unknown language {lang!r}, expected 'auto' or one of {LANGUAGES}"
+        )
+    selected = None if checks is None else select_checks(checks)
+    if (
+        limits is not None
+        and limits.max_bytes is not None
+        and len(sourcecode) > limits.max_bytes
+    ):
+        raise LimitExceeded("max_bytes", partial=False)
+    if stats is not None:
+        stats.bytes += len(sourcecode)
+    bounds = _chunk_bounds(sourcecode, chunk_bytes)
+    chunks = [bytes(sourcecode[start:end]) for start, end in zip(bounds, bounds[1:])]
+    # Blanking keeps offsets, and the guard's lines are no comments, so no
+    # declaration gains or loses an adjacent comment.
+    for guard_start, guard_end in _include_guard(sourcecode):
+        index = bisect_right(bounds, guard_start) - 1
+        chunk = chunks[index]
+        start, end = guard_start - bounds[index], guard_end - bounds[index]
+        blank = bytes(b if b == 10 else 32 for b in chunk[start:end])
+        chunks[index] = chunk[:start] + blank + chunk[end:]
+    mapper = map if executor is None else executor.map
+
+    def run(lang: str) -> list:
+        return list(
+            mapper(
+                _find_in_chunk,
+                chunks,
+                repeat(engine),
+                repeat(lang),
+                repeat(selected),
+                repeat(limits),
+            )
+        )
+
+    profile = _detect_lang(sourcecode) if lang == "auto" else lang
+    results = run(profile)
+    # Like _parse_profile(), C with syntax errors or member functions is
+    # parsed again as C++.
+    if (
+        lang == "auto"
+        and profile == "c"
+        and any(needs_cpp for _, needs_cpp, _, _ in results)
+    ):
+        results = run("cpp")
+    row = 0
+    exceeded = []
+    for start, chunk, (found, _, error, chunk_stats) in zip(bounds, chunks, results):
+        if stats is not None:
+            stats.merge(chunk_stats)
+        for finding in found:
+            yield _shifted(finding, start, row, sourcecode)
+        if error is not None:
+            exceeded.append(error)
+        row += chunk.count(b"\n")
+    if exceeded:
+        partial = len(exceeded) < len(chunks) or any(
+            error.partial for error in exceeded
+        )
+        raise LimitExceeded(exceeded[0].limit, partial)
+
+
+def _find_in_chunk(
+    chunk: bytes,
+    engine: str,
+    lang: str,
+    checks: frozenset[str] | None,
+    limits: Limits | None,
+) -> Tuple[list[Finding], bool, LimitExceeded | None, Stats]:
+    """
+    The unit of work of iter_find_chunked(). Returns the findings of a chunk,
+    whether its tree must be parsed as C++ (see _needs_cpp()), the limit it hit
+    and its Stats.
+    """
+    stats = Stats()
+    found: list[Finding] = []
+    needs_cpp = False
+    start = time.perf_counter()
+    try:
+        try:
+            tree, lang = _parse_profile(chunk, lang, limits)
+        finally:
+            stats.seconds["parse"] += time.perf_counter() - start
+        needs_cpp = lang == "c" and _needs_cpp(tree)
+        found.extend(_iter_tree(tree, chunk, None, engine, stats, lang, checks, limits))
+    except LimitExceeded as error:
+        return found, needs_cpp, error, stats
+    return found, needs_cpp, None, stats
+
+
+def _shifted(
+    finding: Finding, byte_offset: int, row_offset: int, source: Source
+) -> Finding:
+    """
+    Moves a finding of a chunk that starts at `byte_offset` and `row_offset`
+    into the whole `source`. Chunks start at the start of a line, so columns
+    do not change.
+    """
+    (row, column), (end_row, end_column) = finding.start_point, finding.end_point
+    return Finding(
+        finding.capture,
+        finding.start_byte + byte_offset,
+        finding.end_byte + byte_offset,
+        (row + row_offset, column),
+        (end_row + row_offset, end_column),
+        finding.signature_end + byte_offset,
+        finding.scope,
+        source,
+    )
+
+
+_scope_types = {
+    "namespace_definition",
+    "class_specifier",
+    "struct_specifier",
+    "union_specifier",
+}
+
+
+def _scope_of(node: Node) -> str:
+    """
+    The names of the namespaces and user types around `node`, outermost first,
+    such as "ns::Outer::Inner". Anonymous ones are left out.
+    """
+    names = []
+    cur_node = node.parent
+    while cur_node is not None:
+        if cur_node.type in _scope_types:
+            name = cur_node.child_by_field_name("name")
+            if name is not None:
+                names.append(name.text.decode(errors="replace"))
+        cur_node = cur_node.parent
+    return "::".join(reversed(names))
+
+
+def _signature_end(node: Node) -> int:
+    """
+    Returns where the signature of a captured node ends: at the start of its
+    body, or at the end of the node when it has none.
+    """
+    if node.type == "preproc_function_def":
+        parameters = node.child_by_field_name("parameters")
+        return node.end_byte if parameters is None else parameters.end_byte
+    target = node
+    if node.type == "template_declaration":
+        for child in node.named_children:
+            if child.type in _user_types:
+                target = child
+                break
+    body = target.child_by_field_name("body")
+    return node.end_byte if body is None else body.start_byte
+
+
+def compare_engines(
+    sourcecode: bytes,
+    ranges: Iterable[LineRange] | None = None,
+    engine: str = "walk",
+    lang: str = "cpp",
+    checks: Iterable[str] | None = None,
+) -> Tuple[list[UncommentedDeclaration], list[UncommentedDeclaration]]:
+    """
+    Runs the "query" engine and `engine`, and returns the results that only
+    one of them found, as (only found by "query", only found by `engine`).
+    """
+    ranges = None if ranges is None else list(ranges)
+    by_query = sorted(find(sourcecode, ranges, "query", lang, checks))
+    by_other = sorted(find(sourcecode, ranges, engine, lang, checks))
+    return (
+        [item for item in by_query if item not in by_other],
+        [item for item in by_other if item not in by_query],
+    )
+
+
+def _query_engine(
+    root: Node,
+    ranges: Iterable[LineRange] | None,
+    stats: Stats | None = None,
+    lang: str = "cpp",
+    checks: frozenset[str] | None = None,
+    limits: Limits | None = None,
+):
+    """
+    Yields (capture name, node) for every undocumented node, using the query.
+    """
+    candidates = _query_candidates(root, ranges, stats, lang, checks, limits)
+    for cap_name, node_of_interest in candidates:
+        if stats is None:
+            if not has_adjacent_comment(node_of_interest):
+                yield cap_name, node_of_interest
+            continue
+        start = time.perf_counter()
+        documented = has_adjacent_comment(node_of_interest)
+        stats.seconds["has_adjacent_comment"] += time.perf_counter() - start
+        if documented:
+            stats.dropped["has_adjacent_comment"][cap_name] += 1
+        else:
+            yield cap_name, node_of_interest
+
+
+def _query_candidates(
+    root: Node,
+    ranges: Iterable[LineRange] | None,
+    stats: Stats | None = None,
+    lang: str = "cpp",
+    checks: frozenset[str] | None = None,
+    limits: Limits | None = None,
+):
+    """
+    Yields (capture name, node) for every query match that skip_this_node()
+    keeps, documented or not.
+    """
+    for matches in _matches(root, ranges, stats, lang, checks, limits):
+        _, captures = matches
+        assert len(captures) == 1, "Only 1 capture per pattern is supported."
+        cap_name, nodes = next(iter(captures.items()))
+        node_of_interest = nodes[0]  # there can only be one
+        if stats is None:
+            if not skip_this_node(cap_name, node_of_interest):
+                yield cap_name, node_of_interest
+            continue
+        stats.matches[cap_name] += 1
+        start = time.perf_counter()
+        skipped = skip_this_node(cap_name, node_of_interest)
+        stats.seconds["skip_this_node"] += time.perf_counter() - start
+        if skipped:
+            stats.dropped["skip_this_node"][cap_name] += 1
+        else:
+            yield cap_name, node_of_interest
+
+
+def _matches(
+    root: Node,
+    ranges: Iterable[LineRange] | None,
+    stats: Stats | None = None,
+    lang: str = "cpp",
+    checks: frozenset[str] | None = None,
+    limits: Limits | None = None,
+):
+    """
+    Runs the query over the whole tree, or only over the given line ranges.
+    Each range is widened by the line after it, since editing a comment changes
+    whether the declaration below it counts as documented.
+    Matches intersecting several ranges are only returned once. The cursor
+    also returns matches whose pattern root intersects a range while the
+    captured node does not, those are dropped.
+    When the query hits one of `limits`, the matches found until then are
+    yielded, then LimitExceeded is raised.
+    """
+    from tree_sitter import QueryCursor
+
+    if limits is None or limits.match_limit is None:
+        qc = QueryCursor(_query(lang, checks))
+    else:
+        qc = QueryCursor(_query(lang, checks), match_limit=limits.match_limit)
+    timeout = None if limits is None else limits.query_timeout
+    # The cursor stops silently when it times out, so a call that used up its
+    # time is taken to have stopped early.
+    timed_out = False
+    if ranges is None:
+        if timeout is not None:
+            _set_timeout(qc, timeout)
+        started = time.perf_counter()
+        matches = _timed_matches(qc, root, stats)
+        timed_out = timeout is not None and time.perf_counter() - started >= timeout
+        yield from matches
+    else:
+        seen = set()
+        for start, end in merge_ranges((start, end + 1) for start, end in ranges):
+            qc.set_point_range((start, 0), (end, 0))
+            if timeout is not None:
+                _set_timeout(qc, timeout)
+                started = time.perf_counter()
+            matches = _timed_matches(qc, root, stats)
+            if timeout is not None:
+                timeout -= time.perf_counter() - started
+                timed_out = timeout <= 0
+            for pattern, captures in matches:
+                node = next(iter(captures.values()))[0]
+                if not _intersects(node, [(start, end)]):
+                    continue
+                key = (pattern, node.start_byte, node.end_byte)
+                if key not in seen:
+                    seen.add(key)
+                    yield pattern, captures
+            if timed_out:
+                break
+    if qc.did_exceed_match_limit:
+        raise LimitExceeded("match_limit", partial=True)
+    if timed_out:
+        raise LimitExceeded("query_timeout", partial=True)
+
+
+def _timed_matches(qc: QueryCursor, root: Node, stats: Stats | None):
+    if stats is None:
+        return qc.matches(root)
+    start = time.perf_counter()
+    matches = qc.matches(root)
+    stats.seconds["query"] += time.perf_counter() - start
+    return matches
+
+
+def merge_ranges(ranges: Iterable[LineRange]) -> list[LineRange]:
+    """
+    Sorts line ranges and merges the ones that overlap or touch.
+    """
+    merged: list[LineRange] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(end, merged[-1][1]))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class _Scope:
+    """
+    What the tree walker knows about the node whose children it is visiting.
+    """
+
+    __slots__ = ("node", "field", "user_type", "in_template", "access", "prev_named")
+
+    def __init__(
+        self, node: Node | None, field: str | None, user_type: str, in_template: bool
+    ):
+        self.node = node
+        self.field = field
+        self.user_type = user_type  # nearest enclosing class/struct/union, or ""
+        self.in_template = in_template
+        self.access: Node | None = None  # last access specifier among the children
+        self.prev_named: Node | None = None  # last named child visited
+
+
+_user_types = {"class_specifier", "struct_specifier", "union_specifier"}
+_class_like_caps = {"class.declaration", "struct.declaration", "union.declaration"}
+
+
+def _walk_engine(
+    root: Node,
+    ranges: Iterable[LineRange] | None,
+    stats: Stats | None = None,
+    lang: str = "cpp",
+    checks: frozenset[str] | None = None,
+):
+    """
+    Yields (capture name, node) for every undocumented node in one depth-first
+    pass. A stack of scopes tracks the enclosing user type, whether a template
+    is open, the current access specifier and the previous named sibling, so
+    every node is classified without walking its ancestors or siblings.
+    Subtrees outside `ranges` are not entered.
+    Matching and filtering are interleaved, so `stats` times them together as
+    the "walk" phase. Captures that the query of `lang` lacks, or that are not
+    in `checks`, are left out.
+    """
+    wanted = None
+    if lang != "cpp" or checks is not None:
+        wanted = set(_capture_order(lang))
+        if checks is not None:
+            wanted &= checks
+    if stats is not None:
+        started = time.perf_counter()
+    merged = None
+    if ranges is not None:
+        merged = merge_ranges((start, end + 1) for start, end in ranges)
+    cursor = root.walk()
+    scopes = [_Scope(None, None, "", False)]
+    while True:
+        node = cursor.node
+        assert node is not None
+        scope = scopes[-1]
+        inside = merged is None or _intersects(node, merged)
+        if inside and node.is_named:
+            for cap_name in _classify(node, scopes):
+                if wanted is not None and cap_name not in wanted:
+                    continue
+                if stats is not None:
+                    stats.matches[cap_name] += 1
+                if _walk_skips(cap_name, scope):
+                    if stats is not None:
+                        stats.dropped["skip_this_node"][cap_name] += 1
+                    continue
+                if _walk_has_adjacent_comment(node, scopes):
+                    if stats is not None:
+                        stats.dropped["has_adjacent_comment"][cap_name] += 1
+                    continue
+                if stats is None:
+                    yield cap_name, node
+                    continue
+                stats.seconds["walk"] += time.perf_counter() - started
+                yield cap_name, node
+                started = time.perf_counter()
+        field = cursor.field_name
+        if inside and cursor.goto_first_child():
+            scopes.append(
+                _Scope(
+                    node,
+                    field,
+                    node.type if node.type in _user_types else scope.user_type,
+                    scope.in_template or node.type == "template_declaration",
+                )
+            )
+            continue
+        while True:
+            if node.is_named:
+                scope.prev_named = node
+                if node.type == "access_specifier":
+                    scope.access = node
+            if cursor.goto_next_sibling():
+                break
+            if not cursor.goto_parent():
+                if stats is not None:
+                    stats.seconds["walk"] += time.perf_counter() - started
+                return
+            scopes.pop()
+            scope = scopes[-1]
+            node = cursor.node
+            assert node is not None
+
+
+def _intersects(node: Node, ranges: list[LineRange]) -> bool:
+    """
+    Returns True when the node overlaps one of the sorted, merged line ranges.
+    """
+    start_row = node.start_point.row
+    end = node.end_point
+    for range_start, range_end in ranges:
+        if range_start >= end.row + (end.column > 0):
+            return False
+        if start_row < range_end:
+            return True
+    return False
+
+
+def _classify(node: Node, scopes: list[_Scope]) -> list[str]:
+    """
+    Returns the capture names of the `_query` patterns matching this node,
+    in pattern order.
+    """
+    node_type = node.type
+    if node_type == "declaration":
+        if any(child.type == "function_declarator" for child in node.named_children):
+            return ["function.declaration"]
+        return []
+    if node_type == "field_declaration":
+        caps = set()
+        for declarator in node.children_by_field_name("declarator"):
+            if declarator.type == "function_declarator":
+                inner = declarator.child_by_field_name("declarator")
+                inner_type = "" if inner is None else inner.type
+                if inner_type == "field_identifier":
+                    caps.add("function.member_declaration")
+                elif inner_type == "operator_name":
+                    caps.add("function.operator_declaration")
+                elif inner_type == "parenthesized_declarator" and any(
+                    child.type == "pointer_declarator" for child in inner.named_children
+                ):
+                    caps.add("struct.funcptr_member")
+            elif declarator.type == "reference_declarator" and _has_operator_function(
+                declarator
+            ):
+                caps.add("function.refoperator_declaration")
+        return sorted(caps, key=_capture_order().index)
+    if node_type == "function_definition":
+        caps = []
+        if any(
+            child.type == "storage_class_specifier"
+            and child.child_count > 0
+            and child.children[0].type == "inline"
+            for child in node.named_children
+        ):
+            caps.append("function.definition.inline")
+        declarator = node.child_by_field_name("declarator")
+        if declarator is None:
+            return caps
+        if declarator.type == "function_declarator":
+            inner = declarator.child_by_field_name("declarator")
+            inner_type = "" if inner is None else inner.type
+            parent = scopes[-1]
+            if (
+                inner_type in {"identifier", "destructor_name"}
+                and parent.field == "body"
+                and parent.node is not None
+                and parent.node.type == "field_declaration_list"
+                and scopes[-2].node is not None
+                and scopes[-2].node.type == "class_specifier"
+            ):
+                caps.append("function.con_des_structor_definition")
+            if inner_type == "operator_name":
+                caps.append("function.operator_definition")
+        elif declarator.type == "reference_declarator" and _has_operator_function(
+            declarator
+        ):
+            caps.append("function.refoperator_definition")
+        return caps
+    if node_type in _user_types:
+        if _is_named_definition(node):
+            return [node_type.replace("_specifier", ".declaration")]
+        return []
+    if node_type == "template_declaration":
+        kinds = {
+            child.type
+            for child in node.named_children
+            if child.type in _user_types and _is_named_definition(child)
+        }
+        return [
+            kind.replace("_specifier", ".template_declaration")
+            for kind in ("class_specifier", "struct_specifier", "union_specifier")
+            if kind in kinds
+        ]
+    if node_type == "preproc_function_def":
+        return ["macro.func_def"]
+    return []
+
+
+def _has_operator_function(reference_declarator: Node) -> bool:
+    return any(
+        child.type == "function_declarator"
+        and (inner := child.child_by_field_name("declarator")) is not None
+        and inner.type == "operator_name"
+        for child in reference_declarator.named_children
+    )
+
+
+def _is_named_definition(node: Node) -> bool:
+    name = node.child_by_field_name("name")
+    body = node.child_by_field_name("body")
+    return (
+        name is not None
+        and name.type == "type_identifier"
+        and body is not None
+        and body.type == "field_declaration_list"
+    )
+
+
+def _walk_skips(capture_name: str, scope: _Scope) -> bool:
+    """
+    skip_this_node() for the tree walker, answered from the enclosing scope.
+    """
+    if capture_name in _class_like_caps and scope.in_template:
+        return True
+    if scope.user_type:
+        if scope.access is not None:
+            return _is_private(scope.access)
+        return scope.user_type == "class_specifier"
+    return False
+
+
+def _walk_has_adjacent_comment(node: Node, scopes: list[_Scope]) -> bool:
+    """
+    has_adjacent_comment() for the tree walker, answered from the scope stack.
+    """
+    if _documents(scopes[-1].prev_named, node):
+        return True
+    parent = scopes[-1].node
+    if parent is None or parent.type != "type_definition":
+        return False
+    return _documents(scopes[-2].prev_named, parent)
+
+
+def _documents(comment: Node | None, node: Node) -> bool:
+    return (
+        comment is not None
+        and comment.type == "comment"
+        and comment.end_point.row + 1 == node.start_point.row
+    )
+
+
+def has_adjacent_comment(node: Node) -> bool:
+    """
+    Returns True when an adjacent comment documents the node.
+    Handles typedef struct/union/class definitions where the comment precedes
+    the typedef, not the struct/union/class specifier itself.
+    """
+    previous_node = node.prev_named_sibling
+    if (
+        previous_node is not None
+        and previous_node.type == "comment"
+        and previous_node.end_point.row + 1 == node.start_point.row
+    ):
+        return True
+    # deal with typedefs
+    parent = node.parent
+    if parent is None or parent.type != "type_definition":
+        return False
+    parent_prev_node = parent.prev_named_sibling
+    return (
+        parent_prev_node is not None
+        and parent_prev_node.type == "comment"
+        and parent_prev_node.end_point.row + 1 == parent.start_point.row
+    )
+
+
+def skip_this_node(capture_name: str, node: Node) -> bool:
+    """
+    Tree-sitter queries are powerful but cannot handle all situations. This function
+    applies ad-hoc checks to captured nodes to indicate if we don't care about this node.
+    This keeps the queries very simple. Useful for annoying C++ parsing.
+    """
+    class_like_caps = {
+        "class.declaration",
+        "struct.declaration",
+        "union.declaration",
+    }
+    if capture_name in class_like_caps:
+        cur_node = node
+        while cur_node is not None:
+            if cur_node.type == "template_declaration":
+                return True  # Templates have their own capture
+            cur_node = cur_node.parent
+
+    # skip private members
+    it_is, the_type = is_in_user_type(node)
+    if it_is:
+        cur_node = node
+        while (cur_node := cur_node.prev_named_sibling) is not None:
+            if cur_node.type == "access_specifier":
+                return _is_private(cur_node)
+        return the_type == "class_specifier"  # class members are private by default
+
+    return False
+
+
+def _is_private(access_specifier: Node) -> bool:
+    """
+    Looks at the keyword token rather than the node's text, so the source
+    does not have to be sliced.
+    """
+    return (
+        access_specifier.child_count > 0
+        and access_specifier.children[0].type == "private"
+    )
+
+
+def is_in_user_type(node: Node) -> Tuple[bool, str]:
+    cur_node = node.parent
+    while cur_node is not None:
+        if cur_node.type in {"class_specifier", "struct_specifier", "union_specifier"}:
+            return True, cur_node.type
+        cur_node = cur_node.parent
+    return False, ""
+
+
+class ResultCache:
+    """
+    On-disk cache of find() results.
+    Entries are keyed by a hash of the file contents, the tool version and the
+    query text, so any change to one of those is a miss. The cache is a SQLite
+    database in WAL mode, which lets parallel workers read and write it safely.
+    """
+
+    # Bumped whenever the stored fields of a Finding change.
+    FORMAT = 2
+
+    def __init__(self, path: str, max_entries: int = 200_000):
+        self.path = path
+        self.max_entries = max_entries
+        import sqlite3
+
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS results"
+            " (key TEXT PRIMARY KEY, value TEXT NOT NULL, used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS results_used ON results (used)")
+
+    @staticmethod
+    def key(
+        sourcecode: Source, lang: str = "cpp", checks: Iterable[str] | None = None
+    ) -> str:
+        import hashlib
+
+        digest = hashlib.sha256()
+        digest.update(__version__.encode())
+        digest.update(b"\0")
+        digest.update(str(ResultCache.FORMAT).encode())
+        digest.update(b"\0")
+        digest.update(lang.encode())
+        digest.update(b"\0")
+        selected = None if checks is None else select_checks(checks)
+        if selected is not None:
+            digest.update(",".join(sorted(selected)).encode())
+        digest.update(b"\0")
+        for query_source in _query_sources.values():
+            digest.update(query_source.encode())
+            digest.update(b"\0")
+        digest.update(sourcecode)
+        return digest.hexdigest()
+
+    def get(self, key: str, sourcecode: Source) -> list[Finding] | None:
+        """
+        Returns the cached findings for `key`, bound to `sourcecode`.
+        """
+        row = self._db.execute(
+            "SELECT value FROM results WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        import json
+
+        self._db.execute(
+            "UPDATE results SET used = ? WHERE key = ?", (time.time(), key)
+        )
+        return [
+            Finding(
+                cap,
+                start,
+                end,
+                tuple(start_point),
+                tuple(end_point),
+                sig_end,
+                scope,
+                sourcecode,
+            )
+            for cap, start, end, start_point, end_point, sig_end, scope in json.loads(
+                row[0]
+            )
+        ]
+
+    def put(self, key: str, found: list[Finding]):
+        import json
+
+        value = json.dumps([finding._key() for finding in found])
+        self._db.execute(
+            "INSERT OR REPLACE INTO results (key, value, used) VALUES (?, ?, ?)",
+            (key, value, time.time()),
+        )
+
+    def evict(self):
+        """
+        Drops the least recently used entries above `max_entries`.
+        """
+        self._db.execute(
+            "DELETE FROM results WHERE key IN"
+            " (SELECT key FROM results ORDER BY used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def close(self):
+        self._db.close()
+
+
+# Connections by process and path. SQLite connections must not be used across
+# fork(), so forked workers open their own instead of the inherited ones.
+_open_caches: dict[tuple[int, str], ResultCache] = {}
+
+
+def _cache_for(options: ScanOptions) -> ResultCache:
+    """
+    Returns this process's connection to the cache of `options`, opening it once.
+    """
+    key = (os.getpid(), options.cache_path)
+    cache = _open_caches.get(key)
+    if cache is None:
+        cache = _open_caches[key] = ResultCache(options.cache_path, options.cache_size)
+    return cache
+
+
+def fingerprint(path: str, finding: Finding) -> str:
+    """
+    Identifies a finding independently of its line: a hash of the file, the
+    capture, the enclosing scope and the signature without whitespace.
+    """
+    return next(_fingerprints(path, [finding]))
+
+
+def _fingerprints(path: str, found: Iterable[Finding]) -> Iterator[str]:
+    from hashlib import blake2b
+
+    prefix = os.path.normpath(path).replace(os.sep, "/").encode() + b"\0"
+    for finding in found:
+        key = "\0".join(
+            (finding.capture, finding.scope, "".join(finding.signature.split()))
+        )
+        yield blake2b(prefix + key.encode(), digest_size=16).hexdigest()
+
+
+class Baseline:
+    """
+    The fingerprints of known findings, so that only new ones are reported.
+    A finding that occurs several times (e.g. in different #if branches)
+    is suppressed as often as it was recorded.
+    The file starts with comment lines and then lists one fingerprint per
+    line, sorted so updates diff well.
+    """
+
+    HEADER = "# uncommented baseline v1"
+
+    def __init__(self, fingerprints: Iterable[str] = ()):
+        self.counts = Counter(fingerprints)
+
+    @classmethod
+    def load(cls, path: str) -> "Baseline":
+        with open(path) as f:
+            lines = f.read().splitlines()
+        start = 0
+        while start < len(lines) and lines[start].startswith("#"):
+            start += 1
+        return cls(lines[start:])
+
+    def save(self, path: str):
+        with open(path, "w") as f:
+            f.write(self.HEADER + "\n")
+            f.writelines(f"{fp}\n" for fp in sorted(self.counts.elements()))
+
+    def add(self, path: str, found: Iterable[Finding]):
+        self.counts.update(_fingerprints(path, found))
+
+    def new(self, path: str, found: list[Finding]) -> list[Finding]:
+        """
+        Returns the findings of `path` that are not in the baseline.
+        """
+        remaining = Counter()
+        new = []
+        for finding, fp in zip(found, _fingerprints(path, found)):
+            seen = remaining[fp] = remaining[fp] + 1
+            if seen > self.counts[fp]:
+                new.append(finding)
+        return new
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+
+HEADER_SUFFIXES = (".h", ".hh", ".hpp", ".hxx", ".h++", ".inl")
+
+
+def collect_files(paths: Iterable[str]) -> list[str]:
+    """
+    Expands the given paths into a list of files to analyze.
+    Files are kept as given. Directories are searched recursively for headers
+    and their contents are sorted so the output order is stable between runs.
+    """
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        found = []
+        for dirpath, dirnames, filenames in os.walk(path):
+            dirnames.sort()
+            for filename in filenames:
+                if filename.endswith(HEADER_SUFFIXES):
+                    found.append(os.path.join(dirpath, filename))
+        files.extend(sorted(found))
+    return files
+
+
+def diff_ranges(rev: str, paths: Iterable[str] = ()) -> dict[str, list[LineRange]]:
+    """
+    Returns the line ranges changed in the working tree since `rev`, per file.
+    Paths are relative to the current directory. Deleted files are left out.
+    """
+    import re
+    import subprocess
+
+    hunk_header = re.compile(rb"^@@ -\d+(?:,\d+)? \+(\d+)(?:,(\d+))? @@")
+    out = subprocess.run(
+        [
+            "git",
+            "diff",
+            "-U0",
+            "--no-color",
+            "--no-ext-diff",
+            "--relative",
+            "--src-prefix=a/",
+            "--dst-prefix=b/",
+            rev,
+            "--",
+            *paths,
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    changed: dict[str, list[LineRange]] = {}
+    current = None
+    for line in out.splitlines():
+        if line.startswith(b"+++ "):
+            target = line[4:]
+            current = None if target == b"/dev/null" else os.fsdecode(target[2:])
+            if current is not None:
+                changed.setdefault(current, [])
+        elif current is not None and (hunk := hunk_header.match(line)):
+            start = int(hunk.group(1))
+            count = 1 if hunk.group(2) is None else int(hunk.group(2))
+            # Pure deletions report the line before the removed ones.
+            first = start - 1 if count else start
+            changed[current].append((first, first + count))
+    return changed
+
+
+# Files at least this large are memory-mapped instead of read into memory.
+MMAP_BYTES = 16 * 1024 * 1024
+
+
+def read_source(path: str, mmap_bytes: int = MMAP_BYTES) -> Source:
+    """
+    Returns the contents of a file. Files of `mmap_bytes` or more are
+    memory-mapped, so their pages are only loaded when the parser reads them
+    and findings slice their text from the map.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < mmap_bytes or size == 0:
+            return f.read()
+        import mmap
+
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class ScanOptions(NamedTuple):
+    """
+    Settings shared by every file of a run, handed to the workers.
+    """
+
+    cache_path: str | None = None
+    # One of ENGINES, "auto" to pick one per file, or "compare" to run and check all.
+    engine: str = "query"
+    # One of LANGUAGES, or "auto" to pick one per file.
+    lang: str = "cpp"
+    # Selectors for select_checks(), or None for every check.
+    checks: Tuple[str, ...] | None = None
+    # Bounds on the work spent on each file.
+    limits: Limits = Limits()
+    # With worker processes, files larger than this many bytes are cut into
+    # chunks of about this size, which the workers check in parallel.
+    split_bytes: int | None = None
+    # Entries kept in the cache at `cache_path`.
+    cache_size: int = 200_000
+
+
+# Compiling `_query` takes longer than walking a small file. "auto" walks the
+# files of a process until this many bytes have been seen, then compiles it.
+AUTO_QUERY_BYTES = 256 * 1024
+_auto_bytes_seen = 0
+
+
+# With --lang auto, files with these suffixes are sniffed by _detect_lang(),
+# all others are C++.
+_C_SUFFIXES = (".h", ".c")
+
+
+def _lang_for_path(path: str, lang: str) -> str:
+    if lang == "auto" and not path.endswith(_C_SUFFIXES):
+        return "cpp"
+    return lang
+
+
+def _auto_engine(size: int, limits: Limits | None = None) -> str:
+    global _auto_bytes_seen
+    _auto_bytes_seen += size
+    if _query.cache_info().currsize or _auto_bytes_seen > AUTO_QUERY_BYTES:
+        return "query"
+    # The walker has no query to bound.
+    if limits is not None and (
+        limits.query_timeout is not None or limits.match_limit is not None
+    ):
+        return "query"
+    return "walk"
+
+
+def find_in_file(
+    path: str,
+    options: ScanOptions = ScanOptions(),
+    ranges: list[LineRange] | None = None,
+    stats: Stats | None = None,
+    executor: Executor | None = None,
+) -> list[Finding]:
+    """
+    Reads a file and returns its undocumented declarations.
+    This is the unit of work handed to the worker processes.
+    When a cache is configured, unchanged files are answered from it without
+    being parsed. When `ranges` is given, only those lines are checked and the
+    cache is not used.
+    A file that hits one of `options.limits` is counted in `stats` as skipped
+    or partially checked, and returns the findings made before the limit.
+    With an `executor`, a file larger than `options.split_bytes` is checked
+    in chunks on it, see iter_find_chunked().
+    """
+    if stats is not None:
+        stats.files += 1
+    if _too_large(path, options.limits, stats):
+        return []
+    if stats is not None:
+        start = time.perf_counter()
+    sourcecode = read_source(path)
+    if stats is not None:
+        stats.seconds["read"] += time.perf_counter() - start
+    return _find_in_source(path, sourcecode, options, ranges, stats, executor=executor)
+
+
+def _too_large(path: str, limits: Limits, stats: Stats | None) -> bool:
+    """
+    Checks the size limit before a file is read.
+    """
+    if limits.max_bytes is None or os.path.getsize(path) <= limits.max_bytes:
+        return False
+    if stats is not None:
+        stats.limit_exceeded(LimitExceeded("max_bytes", partial=False))
+    return True
+
+
+def _find_in_source(
+    path: str,
+    sourcecode: Source,
+    options: ScanOptions,
+    ranges: list[LineRange] | None = None,
+    stats: Stats | None = None,
+    tree: Tree | None = None,
+    executor: Executor | None = None,
+) -> list[Finding]:
+    """
+    find_in_file() on contents that are already read, and possibly parsed.
+    A `tree` must have been parsed with the profile of `options.lang`.
+    """
+    lang = _lang_for_path(path, options.lang)
+    checks = options.checks
+    limits = options.limits
+    exceeded = None
+
+    def search(engine: str) -> list[Finding]:
+        nonlocal exceeded
+        found: list[Finding] = []
+        try:
+            if (
+                executor is not None
+                and tree is None
+                and ranges is None
+                and options.split_bytes is not None
+                and len(sourcecode) > options.split_bytes
+            ):
+                found.extend(
+                    iter_find_chunked(
+                        sourcecode,
+                        executor,
+                        engine,
+                        stats,
+                        lang,
+                        checks,
+                        limits,
+                        options.split_bytes,
+                    )
+                )
+            elif tree is None:
+                found.extend(
+                    iter_find(sourcecode, ranges, engine, stats, lang, checks, limits)
+                )
+            else:
+                if stats is not None:
+                    stats.bytes += len(sourcecode)
+                selected = None if checks is None else select_checks(checks)
+                found.extend(
+                    _iter_tree(
+                        tree, sourcecode, ranges, engine, stats, lang, selected, limits
+                    )
+                )
+        except LimitExceeded as error:
+            exceeded = error
+            if stats is not None:
+                stats.limit_exceeded(error)
+        return found
+
+    engine = options.engine
+    if engine == "auto":
+        engine = _auto_engine(len(sourcecode), limits)
+    if engine == "compare":
+        for engine in ENGINES[1:]:
+            only_query, only_other = compare_engines(
+                sourcecode, ranges, engine, lang, checks
+            )
+            for found_by, items in (("query", only_query), (engine, only_other)):
+                for item in items:
+                    print(
+                        f"{path}:{item.lineno}: only found by the {found_by} engine"
+                        f" when comparing query and {engine}",
+                        file=sys.stderr,
+                    )
+        return search("query")
+    if options.cache_path is None or ranges is not None:
+        return search(engine)
+    cache = _cache_for(options)
+    key = cache.key(sourcecode, lang, checks)
+    found = cache.get(key, sourcecode)
+    if found is None:
+        found = search(engine)
+        if exceeded is None:
+            cache.put(key, found)
+    elif stats is not None:
+        stats.cache_hits += 1
+        stats.bytes += len(sourcecode)
+        stats.findings += len(found)
+    return found
+
+
+def _find_in_file_with_stats(
+    path: str, options: ScanOptions, ranges: list[LineRange] | None
+) -> Tuple[list[Finding], Stats]:
+    stats = Stats()
+    return find_in_file(path, options, ranges, stats), stats
+
+
+def find_in_files(
+    paths: list[str],
+    jobs: int = 1,
+    options: ScanOptions = ScanOptions(),
+    ranges: dict[str, list[LineRange]] | None = None,
+    stats: Stats | None = None,
+) -> Iterable[Tuple[str, list[Finding]]]:
+    """
+    Runs find() on every file, spreading the work across `jobs` processes.
+    Each worker imports this module once, so the parser and query are built
+    once per worker rather than once per file.
+    Results are yielded in the same order as `paths`.
+    `ranges` optionally restricts each file to its changed line ranges.
+    `stats`, when given, receives the totals and the Stats of every file.
+    With several jobs, files larger than `options.split_bytes` are read by
+    this process and checked in chunks by the workers.
+    """
+    path_ranges = [None if ranges is None else ranges[path] for path in paths]
+    work = find_in_file if stats is None else _find_in_file_with_stats
+    split = [False] * len(paths)
+    if jobs == 1 or (len(paths) < 2 and options.split_bytes is None):
+        results = map(work, paths, repeat(options), path_ranges)
+        pool = None
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        if options.split_bytes is not None:
+            split = [
+                file_ranges is None and os.path.getsize(path) > options.split_bytes
+                for path, file_ranges in zip(paths, path_ranges)
+            ]
+        whole = [
+            (path, file_ranges)
+            for path, file_ranges, large in zip(paths, path_ranges, split)
+            if not large
+        ]
+        chunksize = max(1, len(whole) // (jobs * 4))
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        results = pool.map(
+            work,
+            [path for path, _ in whole],
+            repeat(options),
+            [file_ranges for _, file_ranges in whole],
+            chunksize=chunksize,
+        )
+    try:
+        for path, large in zip(paths, split):
+            if large:
+                file_stats = None if stats is None else Stats()
+                result = find_in_file(path, options, None, file_stats, pool)
+                if stats is not None:
+                    result = result, file_stats
+            else:
+                result = next(results)
+            if stats is None:
+                yield path, result
+                continue
+            found, file_stats = result
+            stats.per_file[path] = file_stats
+            stats.merge(file_stats)
+            yield path, found
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    if options.cache_path is not None:
+        _cache_for(options).evict()
+
+
+FindManyInput = Union[bytes, bytearray, memoryview, str, os.PathLike]
+
+
+def find_many(
+    inputs: Iterable[FindManyInput],
+    executor: Executor | None = None,
+    engine: str = "query",
+    lang: str = "cpp",
+    checks: Iterable[str] | None = None,
+) -> dict[Hashable, list[Finding]]:
+    """
+    Runs iter_find() on many inputs and returns the findings keyed by input.
+    Paths (str or os.PathLike) are read from disk and keyed by the path itself.
+    Buffers (bytes, bytearray, memoryview, mmap) are keyed by their position
+    in `inputs`. Buffers that are not bytes are parsed through the read
+    callback, so memoryviews are never copied.
+
+    With a ThreadPoolExecutor every worker thread uses its own parser. With a
+    ProcessPoolExecutor buffers have to be copied to the workers, and the
+    returned findings carry their signatures but not the source.
+    """
+    keyed = [
+        (item if isinstance(item, (str, os.PathLike)) else index, item)
+        for index, item in enumerate(inputs)
+    ]
+    checks = None if checks is None else tuple(checks)
+    if executor is None:
+        return {key: _find_one(item, engine, lang, checks) for key, item in keyed}
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    if isinstance(executor, ProcessPoolExecutor):
+        keyed = [
+            (key, item if isinstance(item, (str, os.PathLike, bytes)) else bytes(item))
+            for key, item in keyed
+        ]
+    futures = [
+        (key, executor.submit(_find_one, item, engine, lang, checks))
+        for key, item in keyed
+    ]
+    return {key: future.result() for key, future in futures}
+
+
+def _find_one(
+    item: FindManyInput, engine: str, lang: str, checks: Tuple[str, ...] | None
+) -> list[Finding]:
+    if isinstance(item, (str, os.PathLike)):
+        path = os.fspath(item)
+        item = read_source(path)
+        lang = _lang_for_path(path, lang)
+    return list(iter_find(item, engine=engine, lang=lang, checks=checks))
+
+
+def resolve_include(
+    name: str, quoted: bool, including_file: str, include_dirs: Iterable[str]
+) -> str | None:
+    """
+    Finds the header an #include directive names. Like compilers, quoted names
+    are looked up next to the including file before the include directories.
+    Returns None when the header is not found, e.g. for system headers.
+    """
+    if quoted:
+        include_dirs = [os.path.dirname(including_file), *include_dirs]
+    for directory in include_dirs:
+        path = os.path.join(directory, name)
+        if os.path.isfile(path):
+            return os.path.normpath(path)
+    return None
+
+
+def _includes(root: Node, lang: str = "cpp") -> list[Tuple[str, bool]]:
+    """
+    The headers named by the #include directives of a tree, as (name, quoted).
+    """
+    from tree_sitter import QueryCursor
+
+    paths = QueryCursor(_include_query(lang)).captures(root).get("path", [])
+    return [
+        (node.text[1:-1].decode(errors="replace"), node.type == "string_literal")
+        for node in sorted(paths, key=lambda node: node.start_byte)
+    ]
+
+
+def _scan_header(
+    path: str, options: ScanOptions
+) -> Tuple[list[Finding], list[Tuple[str, bool]], Stats]:
+    """
+    find_in_file() that also returns the header's includes from the same parse.
+    This is the unit of work of find_in_include_graph().
+    """
+    stats = Stats()
+    stats.files += 1
+    if _too_large(path, options.limits, stats):
+        return [], [], stats
+    start = time.perf_counter()
+    sourcecode = read_source(path)
+    stats.seconds["read"] += time.perf_counter() - start
+    start = time.perf_counter()
+    try:
+        tree, lang = _parse_profile(
+            sourcecode, _lang_for_path(path, options.lang), options.limits
+        )
+    except LimitExceeded as error:
+        stats.limit_exceeded(error)
+        return [], [], stats
+    finally:
+        stats.seconds["parse"] += time.perf_counter() - start
+    includes = _includes(tree.root_node, lang)
+    options = options._replace(lang=lang)
+    return (
+        _find_in_source(path, sourcecode, options, stats=stats, tree=tree),
+        includes,
+        stats,
+    )
+
+
+def find_in_include_graph(
+    roots: list[str],
+    include_dirs: Iterable[str] = (),
+    jobs: int = 1,
+    options: ScanOptions = ScanOptions(),
+    stats: Stats | None = None,
+) -> Iterable[Tuple[str, list[Finding]]]:
+    """
+    Checks the headers reachable from `roots` through #include directives.
+    Every header is checked once, however often it is included: headers are
+    told apart by their resolved path, and a header with the same contents as
+    one already checked is only followed, not checked again.
+    Headers that resolve_include() cannot find are skipped.
+    The graph is scanned breadth first, each level spread across `jobs`
+    processes, and results are yielded in the order headers were reached.
+    """
+    import hashlib
+
+    include_dirs = list(include_dirs)
+    seen_paths: set[str] = set()
+    includes_by_digest: dict[bytes, list[Tuple[str, bool]]] = {}
+
+    def reach(paths: Iterable[str]) -> list[str]:
+        reached = []
+        for path in paths:
+            real = os.path.realpath(path)
+            if real not in seen_paths:
+                seen_paths.add(real)
+                reached.append(path)
+        return reached
+
+    def follow(path: str, includes: list[Tuple[str, bool]]) -> Iterator[str]:
+        for name, quoted in includes:
+            header = resolve_include(name, quoted, path, include_dirs)
+            if header is not None:
+                yield header
+
+    pool = None
+    level = reach(roots)
+    try:
+        while level:
+            unique, copies = [], []
+            for path in level:
+                with open(path, "rb") as f:
+                    digest = hashlib.sha256(f.read()).digest()
+                if digest in includes_by_digest:
+                    copies.append((path, digest))
+                else:
+                    includes_by_digest[digest] = []
+                    unique.append((path, digest))
+            paths = [path for path, _ in unique]
+            if jobs == 1 or len(paths) < 2:
+                results = map(_scan_header, paths, repeat(options))
+            else:
+                if pool is None:
+                    from concurrent.futures import ProcessPoolExecutor
+
+                    pool = ProcessPoolExecutor(max_workers=jobs)
+                chunksize = max(1, len(paths) // (jobs * 4))
+                results = pool.map(
+                    _scan_header, paths, repeat(options), chunksize=chunksize
+                )
+            reached = []
+            for (path, digest), (found, includes, file_stats) in zip(unique, results):
+                if stats is not None:
+                    stats.per_file[path] = file_stats
+                    stats.merge(file_stats)
+                includes_by_digest[digest] = includes
+                reached.extend(follow(path, includes))
+                yield path, found
+            # Quoted includes of a copy are resolved next to the copy.
+            for path, digest in copies:
+                reached.extend(follow(path, includes_by_digest[digest]))
+            level = reach(reached)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    if options.cache_path is not None:
+        _cache_for(options).evict()
+
+
+def staged_blobs(paths: Iterable[str] = ()) -> list[Tuple[str, str]]:
+    """
+    Returns (path, object id) for every file added or modified in the git
+    index, with paths relative to the current directory. Deleted files,
+    symbolic links and submodules are left out.
+    """
+    changed = _diff_blobs(["--cached", "--diff-filter=d"], paths)
+    return [(path, object_id) for path, object_id in changed if object_id is not None]
+
+
+def changed_blobs(
+    since: str | None, commit: str, paths: Iterable[str] = ()
+) -> list[Tuple[str, str | None]]:
+    """
+    Returns (path, object id) for every file that differs between the commits
+    `since` and `commit`, or every file of `commit` when `since` is None, with
+    paths relative to the current directory. Files that were deleted, or are
+    no longer regular files, have None as their object id.
+    """
+    import subprocess
+
+    if since is None:
+        since = (
+            subprocess.run(
+                ["git", "hash-object", "-t", "tree", "--stdin"],
+                input=b"",
+                check=True,
+                stdout=subprocess.PIPE,
+            )
+            .stdout.decode()
+            .strip()
+        )
+    return _diff_blobs([since, commit], paths)
+
+
+def _diff_blobs(
+    diff_args: list[str], paths: Iterable[str]
+) -> list[Tuple[str, str | None]]:
+    """
+    Runs `git diff --raw` and returns (path, object id) for every changed
+    file, with None as the object id of those that are not regular files
+    afterwards.
+    """
+    import subprocess
+
+    out = subprocess.run(
+        [
+            "git",
+            "diff",
+            *diff_args,
+            "--raw",
+            "-z",
+            "--no-abbrev",
+            "--no-renames",
+            "--relative",
+            "--",
+            *paths,
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+    ).stdout
+    fields = out.split(b"\0")
+    changed = []
+    # Each entry is ":<old mode> <new mode> <old id> <new id> <status>" and a path.
+    for entry, path in zip(fields[::2], fields[1::2]):
+        _, mode, _, object_id, _ = entry.split(b" ")
+        regular = mode.startswith(b"100")
+        changed.append((os.fsdecode(path), object_id.decode() if regular else None))
+    return changed
+
+
+def read_blobs(object_ids: Iterable[str]) -> Iterator[Tuple[str, bytes]]:
+    """
+    Yields (object id, contents) for every blob, in order, read through a
+    single `git cat-file --batch` process instead of one process per blob.
+    """
+    import subprocess
+
+    object_ids = list(object_ids)
+    if not object_ids:
+        return
+    process = subprocess.Popen(
+        ["git", "cat-file", "--batch"], stdin=subprocess.PIPE, stdout=subprocess.PIPE
+    )
+
+    # Requests are written from a thread, so neither side of the pipe fills up
+    # while the other waits.
+    def request():
+        try:
+            process.stdin.write(
+                "".join(f"{object_id}\n" for object_id in object_ids).encode()
+            )
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+
+    writer = threading.Thread(target=request, daemon=True)
+    writer.start()
+    try:
+        for object_id in object_ids:
+            header = process.stdout.readline().split()
+            if len(header) != 3:
+                problem = b" ".join(header).decode()
+                raise ValueError(f"git cat-file cannot read {object_id}: {problem}")
+            contents = process.stdout.read(int(header[2]))
+            process.stdout.read(1)  # the newline after the contents
+            yield object_id, contents
+    finally:
+        process.stdout.close()
+        writer.join()
+        process.wait()
+
+
+def _find_in_blob(
+    path: str, sourcecode: bytes, options: ScanOptions
+) -> Tuple[list[Finding], Stats]:
+    stats = Stats()
+    stats.files += 1
+    return _find_in_source(path, sourcecode, options, stats=stats), stats
+
+
+def _find_in_blobs(
+    blobs: list[Tuple[str, str]], jobs: int, options: ScanOptions
+) -> Iterator[Tuple[list[Finding], Stats]]:
+    """
+    Yields the findings and Stats of every (path, object id) in order, reading
+    the blobs through read_blobs() and checking them on `jobs` processes.
+    """
+    contents = (blob for _, blob in read_blobs(object_id for _, object_id in blobs))
+    args = ([path for path, _ in blobs], contents)
+    if jobs == 1 or len(blobs) < 2:
+        yield from map(_find_in_blob, *args, repeat(options))
+        return
+    chunksize = max(1, len(blobs) // (jobs * 4))
+    from concurrent.futures import ProcessPoolExecutor
+
+    pool = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        yield from pool.map(_find_in_blob, *args, repeat(options), chunksize=chunksize)
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+# Name of the file in the git directory that records the clean staged blobs.
+CLEAN_BLOBS = "uncommented-clean"
+
+
+def find_in_staged(
+    paths: Iterable[str] = (),
+    jobs: int = 1,
+    options: ScanOptions = ScanOptions(),
+    stats: Stats | None = None,
+) -> Iterable[Tuple[str, list[Finding]]]:
+    """
+    Checks the headers staged in the git index, as a pre-commit hook sees
+    them, rather than the working tree. `paths` limit the files like a git
+    pathspec, and files they name are checked whatever their suffix.
+    The staged blobs are read through one `git cat-file --batch` process.
+    Once every result is consumed, the blobs that had no findings are recorded
+    in the git directory, and the next run with the same options skips them
+    without reading them again.
+    Results are yielded in the order git lists the files.
+    """
+    import subprocess
+
+    explicit = set(paths)
+    staged = [
+        (path, object_id)
+        for path, object_id in staged_blobs(paths)
+        if path.endswith(HEADER_SUFFIXES) or path in explicit
+    ]
+    record = subprocess.run(
+        ["git", "rev-parse", "--git-path", CLEAN_BLOBS],
+        check=True,
+        stdout=subprocess.PIPE,
+        text=True,
+    ).stdout.strip()
+    key = ResultCache.key(b"", options.lang, options.checks)
+    header = f"# uncommented clean blobs {key}"
+    clean = set()
+    if os.path.exists(record):
+        with open(record) as f:
+            lines = f.read().splitlines()
+        if lines and lines[0] == header:
+            clean.update(lines[1:])
+    entries = [f"{object_id} {path}" for path, object_id in staged]
+    to_check = [item for item, entry in zip(staged, entries) if entry not in clean]
+    # Each path keeps at most one entry, the one of its latest clean blob.
+    listed = {path for path, _ in staged}
+    now_clean = [entry for entry in clean if entry.split(" ", 1)[1] not in listed]
+    results = _find_in_blobs(to_check, jobs, options)
+    try:
+        for (path, _), entry in zip(staged, entries):
+            if entry in clean:
+                if stats is not None:
+                    stats.files += 1
+                    stats.cache_hits += 1
+                now_clean.append(entry)
+                yield path, []
+                continue
+            found, file_stats = next(results)
+            if stats is not None:
+                stats.per_file[path] = file_stats
+                stats.merge(file_stats)
+            if not found and file_stats.status == "ok":
+                now_clean.append(entry)
+            yield path, found
+    finally:
+        results.close()
+    if options.cache_path is not None:
+        _cache_for(options).evict()
+    with open(record + ".tmp", "w") as f:
+        f.write(header + "\n")
+        f.writelines(f"{entry}\n" for entry in sorted(now_clean))
+    os.replace(record + ".tmp", record)
+
+
+class RecordedFinding(NamedTuple):
+    """
+    A finding as a History holds it. Identical findings of a file share one
+    entry, `count` times, at the row of the first.
+    """
+
+    path: str
+    fingerprint: str
+    capture: str
+    scope: str
+    row: int
+    signature: str
+    count: int
+
+
+class History:
+    """
+    Findings of a series of commits in a SQLite database, for trend and blame
+    queries. Each commit only stores the files that changed since the commit
+    recorded before it, so a file's findings at a commit are those stored for
+    it at the latest commit up to that one. Commits are ordered by when they
+    were recorded. Every commit also stores its total number of findings.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        import sqlite3
+
+        self._db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS commits (
+                id INTEGER PRIMARY KEY,
+                hash TEXT NOT NULL UNIQUE,
+                key TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                recorded REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT NOT NULL,
+                commit_id INTEGER NOT NULL,
+                blob TEXT,
+                PRIMARY KEY (path, commit_id)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS findings (
+                commit_id INTEGER NOT NULL,
+                path TEXT NOT NULL,
+                fingerprint TEXT NOT NULL,
+                capture TEXT NOT NULL,
+                scope TEXT NOT NULL,
+                row INTEGER NOT NULL,
+                signature TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (commit_id, path, fingerprint)
+            );
+            CREATE INDEX IF NOT EXISTS findings_path ON findings (path, commit_id);
+            CREATE INDEX IF NOT EXISTS findings_fingerprint
+                ON findings (fingerprint, commit_id);
+            """)
+
+    def last(self) -> Tuple[str, str] | None:
+        """
+        Returns the hash and options key of the last recorded commit.
+        """
+        return self._db.execute(
+            "SELECT hash, key FROM commits ORDER BY id DESC LIMIT 1"
+        ).fetchone()
+
+    def record(
+        self,
+        commit: str,
+        changes: Iterable[Tuple[str, str | None, list[Finding]]],
+        key: str = "",
+        full: bool = False,
+    ) -> int:
+        """
+        Records `commit` from the (path, object id, findings) of the files
+        that changed since the last recorded commit. Deleted files have None
+        as their object id. With `full`, `changes` lists every file and the
+        files that are not listed count as deleted. `key` identifies the
+        options the findings were made with.
+        Returns the commit's total number of findings.
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            last = self._db.execute(
+                "SELECT total FROM commits ORDER BY id DESC LIMIT 1"
+            ).fetchone()
+            total = 0 if last is None else last[0]
+            commit_id = self._db.execute(
+                "INSERT INTO commits (hash, key, total, recorded) VALUES (?, ?, 0, ?)",
+                (commit, key, time.time()),
+            ).lastrowid
+            written = set()
+            for path, object_id, found in changes:
+                total += self._write(commit_id, path, object_id, found)
+                written.add(path)
+            if full:
+                for path in self._live_paths(commit_id):
+                    if path not in written:
+                        total += self._write(commit_id, path, None, [])
+            self._db.execute(
+                "UPDATE commits SET total = ? WHERE id = ?", (total, commit_id)
+            )
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        self._db.execute("COMMIT")
+        return total
+
+    def _write(
+        self, commit_id: int, path: str, object_id: str | None, found: list[Finding]
+    ) -> int:
+        """
+        Stores the findings of one file and returns how much they change the
+        total.
+        """
+        before = self._db.execute(
+            "SELECT COALESCE(SUM(count), 0) FROM findings"
+            " WHERE path = ? AND commit_id ="
+            " (SELECT MAX(commit_id) FROM files WHERE path = ? AND commit_id < ?)",
+            (path, path, commit_id),
+        ).fetchone()[0]
+        self._db.execute(
+            "INSERT INTO files (path, commit_id, blob) VALUES (?, ?, ?)",
+            (path, commit_id, object_id),
+        )
+        self._db.executemany(
+            "INSERT INTO findings"
+            " (commit_id, path, fingerprint, capture, scope, row, signature, count)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, 1)"
+            " ON CONFLICT (commit_id, path, fingerprint)"
+            " DO UPDATE SET count = count + 1",
+            (
+                (
+                    commit_id,
+                    path,
+                    fp,
+                    finding.capture,
+                    finding.scope,
+                    finding.lineno,
+                    finding.signature,
+                )
+                for finding, fp in zip(found, _fingerprints(path, found))
+            ),
+        )
+        return len(found) - before
+
+    def _live_paths(self, commit_id: int) -> list[str]:
+        """
+        The paths that exist at `commit_id`.
+        """
+        return [
+            path
+            for path, in self._db.execute(
+                "SELECT path FROM files AS f WHERE blob IS NOT NULL AND commit_id ="
+                " (SELECT MAX(commit_id) FROM files"
+                " WHERE path = f.path AND commit_id <= ?)",
+                (commit_id,),
+            )
+        ]
+
+    def _commit_id(self, commit: str) -> int:
+        row = self._db.execute(
+            "SELECT id FROM commits WHERE hash = ?", (commit,)
+        ).fetchone()
+        if row is None:
+            raise KeyError(f"commit {commit} is not recorded")
+        return row[0]
+
+    def trend(self) -> list[Tuple[str, int]]:
+        """
+        Returns (commit, total number of findings) for every recorded commit,
+        in the order they were recorded.
+        """
+        return self._db.execute(
+            "SELECT hash, total FROM commits ORDER BY id"
+        ).fetchall()
+
+    def findings(self, commit: str, path: str | None = None) -> list[RecordedFinding]:
+        """
+        Returns the findings at a recorded commit, of every file or of `path`,
+        sorted by path and row.
+        """
+        commit_id = self._commit_id(commit)
+        condition = "" if path is None else "AND path = ?"
+        params = (commit_id,) if path is None else (commit_id, path)
+        rows = self._db.execute(
+            "SELECT f.path, fingerprint, capture, scope, row, signature, count"
+            " FROM findings AS f JOIN"
+            " (SELECT path, MAX(commit_id) AS latest FROM files"
+            f" WHERE commit_id <= ? {condition}"
+            " GROUP BY path) USING (path)"
+            " WHERE f.commit_id = latest ORDER BY f.path, row",
+            params,
+        )
+        return [RecordedFinding(*row) for row in rows]
+
+    def introduced(self, fingerprint: str) -> str | None:
+        """
+        Returns the first recorded commit that has a finding with this
+        fingerprint, or None.
+        """
+        row = self._db.execute(
+            "SELECT hash FROM findings JOIN commits ON commits.id = commit_id"
+            " WHERE fingerprint = ? ORDER BY commit_id LIMIT 1",
+            (fingerprint,),
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def close(self):
+        self._db.close()
+
+
+def record_history(
+    history: History,
+    commit: str = "HEAD",
+    paths: Iterable[str] = (),
+    jobs: int = 1,
+    options: ScanOptions = ScanOptions(),
+    stats: Stats | None = None,
+) -> Tuple[str, int, int]:
+    """
+    Checks the headers of a git commit and records their findings in
+    `history`. Only the files that changed since the last recorded commit are
+    read and checked, unless it was recorded with other options (or another
+    version of this tool), in which case every file is. `paths` limit the
+    files like a git pathspec and should be the same on every run.
+    Returns the commit's hash, the number of files checked and the commit's
+    total number of findings. A commit that is already recorded is left as is.
+    """
+    import subprocess
+
+    commit = subprocess.run(
+        ["git", "rev-parse", "--verify", "--end-of-options", f"{commit}^{{commit}}"],
+        check=True,
+        stdout=subprocess.PIPE,
+        text=True,
+    ).stdout.strip()
+    key = ResultCache.key(b"", options.lang, options.checks)
+    try:
+        history._commit_id(commit)
+    except KeyError:
+        pass
+    else:
+        return commit, 0, dict(history.trend())[commit]
+    last = history.last()
+    full = last is None or last[1] != key
+    explicit = set(paths)
+    changed = [
+        (path, object_id)
+        for path, object_id in changed_blobs(None if full else last[0], commit, paths)
+        if path.endswith(HEADER_SUFFIXES) or path in explicit
+    ]
+    to_check = [
+        (path, object_id) for path, object_id in changed if object_id is not None
+    ]
+    results = _find_in_blobs(to_check, jobs, options)
+
+    def changes() -> Iterator[Tuple[str, str | None, list[Finding]]]:
+        for path, object_id in changed:
+            if object_id is None:
+                yield path, None, []
+                continue
+            found, file_stats = next(results)
+            if stats is not None:
+                stats.per_file[path] = file_stats
+                stats.merge(file_stats)
+            yield path, object_id, found
+
+    try:
+        total = history.record(commit, changes(), key, full)
+    finally:
+        results.close()
+    if options.cache_path is not None:
+        _cache_for(options).evict()
+    return commit, len(to_check), total
+
+
+class Document:
+    """
+    A buffer that stays parsed between edits.
+    Edits are applied to the previous tree first, so re-parsing only redoes
+    the parts of the tree that changed.
+    """
+
+    def __init__(self, source: bytes, lang: str = "cpp"):
+        self.source = source
+        self.auto = lang == "auto"
+        self.tree, self.lang = _parse_profile(source, lang)
+
+    def edit(self, start: Point, end: Point, text: bytes):
+        """
+        Replaces the bytes between the (row, column) points `start` and `end`.
+        Columns count bytes, as in tree-sitter.
+        """
+        start_byte = _byte_offset(self.source, start)
+        old_end_byte = _byte_offset(self.source, end)
+        self.replace(start_byte, old_end_byte, text)
+
+    def replace(self, start_byte: int, old_end_byte: int, text: bytes):
+        """
+        Replaces source[start_byte:old_end_byte] with `text`.
+        """
+        new_end_byte = start_byte + len(text)
+        new_source = self.source[:start_byte] + text + self.source[old_end_byte:]
+        self.tree.edit(
+            start_byte=start_byte,
+            old_end_byte=old_end_byte,
+            new_end_byte=new_end_byte,
+            start_point=_point_at(self.source, start_byte),
+            old_end_point=_point_at(self.source, old_end_byte),
+            new_end_point=_point_at(new_source, new_end_byte),
+        )
+        self.source = new_source
+        self.tree = _parse(new_source, self.tree, self.lang)
+        # Like _parse_profile(), C that stopped parsing as C is parsed as C++.
+        if self.auto and self.lang == "c" and _needs_cpp(self.tree):
+            self.tree, self.lang = _parse(new_source, lang="cpp"), "cpp"
+
+    def update(self, source: bytes):
+        """
+        Replaces the whole source. The tree is only edited between the common
+        prefix and suffix of the old and new source, so an editor's save
+        re-parses as little as an edit sent over the Server would.
+        """
+        old = self.source
+        start = _common_prefix_length(old, source)
+        if start == len(old) == len(source):
+            return
+        limit = min(len(old), len(source)) - start
+        end = min(_common_prefix_length(old[::-1], source[::-1]), limit)
+        self.replace(start, len(old) - end, source[start : len(source) - end])
+
+    def findings(
+        self, engine: str = "query", checks: frozenset[str] | None = None
+    ) -> list[Finding]:
+        """
+        The findings of the document, with `checks` as select_checks()
+        returns them.
+        """
+        return list(
+            _iter_tree(self.tree, self.source, None, engine, None, self.lang, checks)
+        )
+
+
+def _common_prefix_length(a: bytes, b: bytes) -> int:
+    """
+    Binary search over slice comparisons, which run at memcmp speed.
+    """
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        middle = (low + high + 1) // 2
+        if a[low:middle] == b[low:middle]:
+            low = middle
+        else:
+            high = middle - 1
+    return low
+
+
+def _byte_offset(source: bytes, point: Point) -> int:
+    row, column = point
+    if row == 0:
+        return min(column, len(source))
+    lines = source.split(b"\n", row)
+    if len(lines) <= row:
+        return len(source)
+    return min(len(source) - len(lines[-1]) + column, len(source))
+
+
+def _point_at(source: bytes, offset: int) -> Point:
+    row = source.count(b"\n", 0, offset)
+    return row, offset - (source.rfind(b"\n", 0, offset) + 1)
+
+
+class Server:
+    """
+    A JSON-RPC 2.0 server that keeps the parser, the query and the tree of
+    every open document warm between requests. Messages are JSON objects,
+    one per line.
+
+    Methods:
+    - open {uri, text}: parses a document and returns its findings.
+    - change {uri, edits: [{start: [row, column], end: [row, column], text}]}
+      or {uri, text}: edits or replaces a document and returns its findings.
+    - findings {uri}: returns the findings of an open document.
+    - close {uri}: forgets a document.
+    - shutdown: stops the server.
+    """
+
+    PARSE_ERROR = -32700
+    INVALID_REQUEST = -32600
+    METHOD_NOT_FOUND = -32601
+    INVALID_PARAMS = -32602
+
+    def __init__(
+        self,
+        engine: str = "query",
+        lang: str = "cpp",
+        checks: Iterable[str] | None = None,
+    ):
+        self.engine = engine
+        self.lang = lang
+        self.checks = None if checks is None else select_checks(checks)
+        self.documents: dict[str, Document] = {}
+        self.running = True
+
+    def open(self, uri: str, text: str) -> list[dict]:
+        self.documents[uri] = Document(text.encode(), _lang_for_path(uri, self.lang))
+        return self.findings(uri)
+
+    def change(
+        self, uri: str, edits: list[dict] | None = None, text: str | None = None
+    ) -> list[dict]:
+        if text is not None and uri not in self.documents:
+            return self.open(uri, text)
+        document = self.documents[uri]
+        if text is not None:
+            document.update(text.encode())
+        for edit in edits or []:
+            document.edit(
+                tuple(edit["start"]), tuple(edit["end"]), edit["text"].encode()
+            )
+        return self.findings(uri)
+
+    def findings(self, uri: str) -> list[dict]:
+        return [
+            finding.as_dict()
+            for finding in self.documents[uri].findings(self.engine, self.checks)
+        ]
+
+    def close(self, uri: str):
+        self.documents.pop(uri, None)
+
+    def shutdown(self):
+        self.running = False
+
+    def handle(self, request) -> dict | None:
+        """
+        Answers one request. Notifications (requests without an id) get no
+        answer.
+        """
+        if not isinstance(request, dict) or not isinstance(request.get("method"), str):
+            return self._error(None, self.INVALID_REQUEST, "invalid request")
+        request_id = request.get("id")
+        method = request["method"]
+        if method not in {"open", "change", "findings", "close", "shutdown"}:
+            return self._error(
+                request_id, self.METHOD_NOT_FOUND, f"unknown method {method}"
+            )
+        params = request.get("params") or {}
+        try:
+            result = getattr(self, method)(**params)
+        except (KeyError, TypeError, ValueError) as e:
+            return self._error(
+                request_id, self.INVALID_PARAMS, f"{type(e).__name__}: {e}"
+            )
+        if request_id is None:
+            return None
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def serve(self, rfile, wfile) -> bool:
+        """
+        Answers requests from `rfile` until it is closed or a shutdown request
+        arrives. Returns False after a shutdown.
+        """
+        import json
+
+        for line in rfile:
+            if not line.strip():
+                continue
+            try:
+                request = json.loads(line)
+            except ValueError as e:
+                response = self._error(None, self.PARSE_ERROR, str(e))
+            else:
+                response = self.handle(request)
+            if response is not None:
+                wfile.write(json.dumps(response).encode() + b"\n")
+                wfile.flush()
+            if not self.running:
+                return False
+        return True
+
+    @staticmethod
+    def _error(request_id, code: int, message: str) -> dict:
+        return {
+            "jsonrpc": "2.0",
+            "id": request_id,
+            "error": {"code": code, "message": message},
+        }
+
+
+def serve_socket(server: Server, path: str):
+    """
+    Serves clients on a Unix socket at `path`, one connection at a time.
+    """
+    import socket
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.bind(path)
+        try:
+            sock.listen()
+            while server.running:
+                connection, _ = sock.accept()
+                with connection, connection.makefile(
+                    "rb"
+                ) as rfile, connection.makefile("wb") as wfile:
+                    server.serve(rfile, wfile)
+        finally:
+            os.unlink(path)
+
+
+class InotifyEvents:
+    """
+    Yields the sets of headers that changed below a directory, using Linux
+    inotify through ctypes. Events that arrive within `settle` seconds of
+    each other are reported together, since editors save in several steps.
+    New subdirectories are watched as they appear. Yields None when the
+    kernel dropped events, meaning that every file has to be checked again.
+    Raises OSError where inotify is not available.
+    """
+
+    _IN_CLOSE_WRITE = 0x8
+    _IN_MOVED_FROM = 0x40
+    _IN_MOVED_TO = 0x80
+    _IN_CREATE = 0x100
+    _IN_DELETE = 0x200
+    _IN_Q_OVERFLOW = 0x4000
+    _IN_ISDIR = 0x40000000
+    _IN_CLOEXEC = 0o2000000
+    _MASK = _IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+    def __init__(self, directory: str, settle: float = 0.05):
+        import ctypes
+        import ctypes.util
+
+        if not sys.platform.startswith("linux"):
+            raise OSError("inotify is only available on Linux")
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        self.settle = settle
+        self._fd = self._libc.inotify_init1(self._IN_CLOEXEC)
+        if self._fd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        self._directories: dict[int, str] = {}
+        self._watch_tree(directory)
+
+    def _watch_tree(self, directory: str) -> list[str]:
+        """
+        Watches `directory` and its subdirectories, and returns their headers.
+        """
+        headers = []
+        for dirpath, _, filenames in os.walk(directory):
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(dirpath), self._MASK
+            )
+            if wd >= 0:
+                self._directories[wd] = dirpath
+            headers += [os.path.join(dirpath, name) for name in filenames]
+        return [path for path in headers if path.endswith(HEADER_SUFFIXES)]
+
+    def __iter__(self) -> Iterator[set[str] | None]:
+        import select
+        import struct
+
+        while True:
+            changed: set[str] = set()
+            overflowed = False
+            timeout = None
+            while select.select([self._fd], [], [], timeout)[0]:
+                timeout = self.settle
+                buffer = os.read(self._fd, 64 * 1024)
+                offset = 0
+                while offset < len(buffer):
+                    wd, mask, _, length = struct.unpack_from("iIII", buffer, offset)
+                    name = buffer[offset + 16 : offset + 16 + length].rstrip(b"\0")
+                    offset += 16 + length
+                    if mask & self._IN_Q_OVERFLOW:
+                        overflowed = True
+                        continue
+                    directory = self._directories.get(wd)
+                    if directory is None or not name:
+                        continue
+                    path = os.path.join(directory, os.fsdecode(name))
+                    if mask & self._IN_ISDIR:
+                        if mask & (self._IN_CREATE | self._IN_MOVED_TO):
+                            changed.update(self._watch_tree(path))
+                    elif path.endswith(HEADER_SUFFIXES):
+                        changed.add(path)
+            if overflowed:
+                yield None
+            elif changed:
+                yield changed
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingEvents:
+    """
+    The fallback for InotifyEvents: compares the size and modification time
+    of every header below a directory every `interval` seconds.
+    """
+
+    def __init__(self, directory: str, interval: float = 0.5):
+        self.directory = directory
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[str, Tuple[int, int]]:
+        snapshot = {}
+        for path in collect_files([self.directory]):
+            try:
+                info = os.stat(path)
+            except FileNotFoundError:
+                continue
+            snapshot[path] = (info.st_mtime_ns, info.st_size)
+        return snapshot
+
+    def __iter__(self) -> Iterator[set[str] | None]:
+        while True:
+            time.sleep(self.interval)
+            snapshot = self._scan()
+            old = self._snapshot
+            self._snapshot = snapshot
+            changed = {
+                path
+                for path in snapshot.keys() | old.keys()
+                if snapshot.get(path) != old.get(path)
+            }
+            if changed:
+                yield changed
+
+    def close(self):
+        pass
+
+
+def watch_events(directory: str) -> InotifyEvents | PollingEvents:
+    try:
+        return InotifyEvents(directory)
+    except (OSError, AttributeError):  # not Linux, or no inotify in libc
+        return PollingEvents(directory)
+
+
+class Watcher:
+    """
+    Keeps every header below a directory parsed, and re-parses a header from
+    its previous tree when it changes. Reports the findings that a change
+    added and resolved, matched by their --baseline fingerprints so findings
+    that only moved are not reported.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        engine: str = "query",
+        lang: str = "cpp",
+        checks: Iterable[str] | None = None,
+    ):
+        self.directory = directory
+        self.engine = engine
+        self.lang = lang
+        self.checks = None if checks is None else select_checks(checks)
+        self.documents: dict[str, Document] = {}
+        self.findings: dict[str, list[Finding]] = {}
+
+    def update(self, path: str) -> Tuple[list[Finding], list[Finding]]:
+        """
+        Checks `path` again and returns its (added, resolved) findings.
+        A missing file resolves all of its findings.
+        """
+        try:
+            with open(path, "rb") as f:
+                source = f.read()
+        except (FileNotFoundError, IsADirectoryError):
+            self.documents.pop(path, None)
+            return [], self.findings.pop(path, [])
+        document = self.documents.get(path)
+        if document is None:
+            document = self.documents[path] = Document(
+                source, _lang_for_path(path, self.lang)
+            )
+        else:
+            document.update(source)
+        old = self.findings.get(path, [])
+        new = self.findings[path] = document.findings(self.engine, self.checks)
+        return _unmatched(path, new, old), _unmatched(path, old, new)
+
+    def rescan(self) -> Iterator[Tuple[str, list[Finding], list[Finding]]]:
+        """
+        Checks every header, including ones that disappeared, and yields
+        (path, added, resolved) for each.
+        """
+        for path in sorted(
+            set(collect_files([self.directory])) | self.documents.keys()
+        ):
+            yield (path, *self.update(path))
+
+    def run(self, events: Iterable[set[str] | None], out: TextIO):
+        """
+        Prints the findings of every header, then `+path:line: signature` for
+        each finding a change adds and `-path:line: signature` for each one it
+        resolves, where resolved lines are those before the change.
+        """
+        for path, added, _ in self.rescan():
+            self._print(out, "+", path, added)
+        out.flush()
+        for changed in events:
+            if changed is None:
+                updates = list(self.rescan())
+            else:
+                updates = [(path, *self.update(path)) for path in sorted(changed)]
+            for path, added, resolved in updates:
+                self._print(out, "-", path, resolved)
+                self._print(out, "+", path, added)
+            out.flush()
+
+    @staticmethod
+    def _print(out: TextIO, sign: str, path: str, found: list[Finding]):
+        for finding in found:
+            signature = finding.signature.replace("\n", "")
+            out.write(f"{sign}{path}:{finding.lineno}: {signature}\n")
+
+
+def _unmatched(path: str, found: list[Finding], others: list[Finding]) -> list[Finding]:
+    """
+    The findings in `found` whose fingerprint is not matched by one in `others`.
+    """
+    remaining = Counter(_fingerprints(path, others))
+    unmatched = []
+    for finding, fp in zip(found, _fingerprints(path, found)):
+        if remaining[fp]:
+            remaining[fp] -= 1
+        else:
+            unmatched.append(finding)
+    return unmatched
+
+
+def coverage_of(
+    sourcecode: Source,
+    engine: str = "query",
+    lang: str = "cpp",
+    checks: Iterable[str] | None = None,
+) -> Coverage:
+    """
+    Counts the documented and undocumented declarations of one source.
+    """
+    stats = Stats()
+    coverage = Coverage()
+    coverage.undocumented.update(
+        finding.capture
+        for finding in iter_find(
+            sourcecode, engine=engine, stats=stats, lang=lang, checks=checks
+        )
+    )
+    coverage.documented.update(stats.dropped["has_adjacent_comment"])
+    return coverage
+
+
+def _coverage_by_directory(
+    paths: list[str], engine: str, lang: str, checks: Tuple[str, ...] | None
+) -> dict[str, Coverage]:
+    """
+    The map step of coverage_in_files(): the coverage of the files of each
+    directory, combined in the worker so only one Coverage per directory is
+    sent back.
+    """
+    by_directory: dict[str, Coverage] = {}
+    for path in paths:
+        sourcecode = read_source(path)
+        if engine == "auto":
+            file_engine = _auto_engine(len(sourcecode))
+        else:
+            file_engine = "query" if engine == "compare" else engine
+        directory = os.path.dirname(path) or "."
+        if directory not in by_directory:
+            by_directory[directory] = Coverage()
+        by_directory[directory].merge(
+            coverage_of(sourcecode, file_engine, _lang_for_path(path, lang), checks)
+        )
+    return by_directory
+
+
+def coverage_in_files(
+    paths: list[str],
+    jobs: int = 1,
+    engine: str = "query",
+    lang: str = "cpp",
+    checks: Iterable[str] | None = None,
+) -> Tuple[dict[str, Coverage], Coverage]:
+    """
+    Measures the documentation coverage of many files in one parallel pass.
+    The files are split into chunks that the `jobs` workers count per
+    directory, and their counts are then merged. Returns the rollup of every
+    directory, counting all the files below it, up to the directory common
+    to all files, and the total.
+    """
+    checks = None if checks is None else tuple(checks)
+    if jobs == 1 or len(paths) < 2:
+        chunks = [paths]
+        results: Iterable[dict[str, Coverage]] = map(
+            _coverage_by_directory, chunks, [engine], [lang], [checks]
+        )
+        pool = None
+    else:
+        size = max(1, len(paths) // (jobs * 4))
+        chunks = [paths[start : start + size] for start in range(0, len(paths), size)]
+        from concurrent.futures import ProcessPoolExecutor
+
+        pool = ProcessPoolExecutor(max_workers=jobs)
+        results = pool.map(
+            _coverage_by_directory, chunks, repeat(engine), repeat(lang), repeat(checks)
+        )
+    own: dict[str, Coverage] = {}
+    try:
+        for by_directory in results:
+            for directory, coverage in by_directory.items():
+                if directory not in own:
+                    own[directory] = Coverage()
+                own[directory].merge(coverage)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    try:
+        top = os.path.commonpath(list(own)) if own else ""
+    except ValueError:  # absolute and relative paths
+        top = ""
+    rollups: dict[str, Coverage] = {}
+    total = Coverage()
+    for directory, coverage in own.items():
+        total.merge(coverage)
+        while True:
+            if directory not in rollups:
+                rollups[directory] = Coverage()
+            rollups[directory].merge(coverage)
+            parent = os.path.dirname(directory)
+            if directory == top or not parent or parent == directory:
+                break
+            directory = parent
+    return dict(sorted(rollups.items())), total
+
+
+def format_coverage(rollups: dict[str, Coverage], total: Coverage) -> str:
+    """
+    Renders coverage_in_files() as a table: one line per directory, then the
+    total per capture name.
+    """
+    lines = [f"{'coverage':>8} {'documented':>10}/{'total':<10}  directory"]
+    for directory, coverage in rollups.items():
+        documented = sum(coverage.documented.values())
+        lines.append(
+            f"{coverage.ratio:>8.1%} {documented:>10}/{coverage.total:<10}  {directory}"
+        )
+    lines += ["", f"{'coverage':>8} {'documented':>10}/{'total':<10}  capture"]
+    for capture, counts in total.as_dict()["captures"].items():
+        ratio = counts["documented"] / counts["total"]
+        lines.append(
+            f"{ratio:>8.1%} {counts['documented']:>10}/{counts['total']:<10}  {capture}"
+        )
+    documented = sum(total.documented.values())
+    lines.append(f"{total.ratio:>8.1%} {documented:>10}/{total.total:<10}  total")
+    return "\n".join(lines)
+
+
+class TextWriter:
+    """
+    The default output: one `path:line: signature` line per finding, with the
+    signature joined onto one line.
+    """
+
+    def __init__(self, out: TextIO, show_paths: bool = True):
+        self.out = out
+        self.show_paths = show_paths
+
+    def write(self, path: str, found: list[Finding]):
+        prefix = f"{path}:" if self.show_paths else ""
+        for finding in found:
+            signature = finding.signature.replace("\n", "")
+            self.out.write(f"{prefix}{finding.lineno}: {signature}\n")
+
+    def close(self):
+        pass
+
+
+class JsonLinesWriter:
+    """
+    One JSON object per finding and line: the file and Finding.as_dict().
+    """
+
+    def __init__(self, out: TextIO):
+        import json
+
+        self.out = out
+        self._dumps = json.dumps
+
+    def write(self, path: str, found: list[Finding]):
+        for finding in found:
+            self.out.write(self._dumps({"file": path, **finding.as_dict()}) + "\n")
+
+    def close(self):
+        pass
+
+
+class SarifWriter:
+    """
+    A SARIF 2.1.0 log with one run, one rule per capture and one result per
+    finding. The log is streamed: its head is written first, every result as
+    soon as it is written and the tail by close(), so findings are not kept.
+    Lines are 1-based. Regions also give the byte range, since columns are
+    counted in bytes. Results carry the --baseline fingerprint.
+    """
+
+    def __init__(self, out: TextIO):
+        import json
+
+        self.out = out
+        self._dumps = json.dumps
+        self._rules = {capture: index for index, capture in enumerate(_capture_order())}
+        rules = [
+            {
+                "id": capture,
+                "shortDescription": {
+                    "text": "Undocumented "
+                    + capture.replace(".", " ").replace("_", " ")
+                },
+            }
+            for capture in self._rules
+        ]
+        head = self._dumps(
+            {
+                "$schema": "https://json.schemastore.org/sarif-2.1.0.json",
+                "version": "2.1.0",
+                "runs": [
+                    {
+                        "tool": {
+                            "driver": {
+                                "name": "uncommented",
+                                "version": __version__,
+                                "rules": rules,
+                            }
+                        },
+                        "results": [],
+                    }
+                ],
+            }
+        )
+        # Everything up to the empty results array, which is filled in by write().
+        self.out.write(head[: -len("]}]}")])
+        self._separator = "\n"
+
+    def write(self, path: str, found: list[Finding]):
+        from pathlib import Path
+        from urllib.parse import quote
+
+        uri = (
+            Path(path).as_uri()
+            if os.path.isabs(path)
+            else quote(path.replace(os.sep, "/"))
+        )
+        for finding, fp in zip(found, _fingerprints(path, found)):
+            signature = finding.signature
+            result = {
+                "ruleId": finding.capture,
+                "ruleIndex": self._rules[finding.capture],
+                "level": "warning",
+                "message": {
+                    "text": "Undocumented declaration: " + signature.replace("\n", "")
+                },
+                "locations": [
+                    {
+                        "physicalLocation": {
+                            "artifactLocation": {"uri": uri},
+                            "region": {
+                                "startLine": finding.start_point[0] + 1,
+                                "endLine": finding.end_point[0] + 1,
+                                "byteOffset": finding.start_byte,
+                                "byteLength": finding.end_byte - finding.start_byte,
+                                "snippet": {"text": signature},
+                            },
+                        }
+                    }
+                ],
+                "partialFingerprints": {"uncommented/v1": fp},
+            }
+            self.out.write(self._separator + self._dumps(result))
+            self._separator = ",\n"
+
+    def close(self):
+        self.out.write("\n]}]}\n")
+
+
+WRITERS = {"text": TextWriter, "jsonl": JsonLinesWriter, "sarif": SarifWriter}
+
+
+class StoredFinding(NamedTuple):
+    """
+    A finding as a ResultStore holds it. `signature` is None when the store
+    does not keep signatures.
+    """
+
+    path: str
+    capture: str
+    row: int
+    column: int
+    start_byte: int
+    end_byte: int
+    signature: str | None
+
+
+class ResultStore:
+    """
+    The findings of many files in array-backed columns, for reports over a
+    whole tree. Paths and capture names are interned, and signatures, when
+    kept, share one UTF-8 buffer, so a finding costs about 40 bytes plus its
+    signature instead of a Python object per field.
+    Stores are sorted, filtered and grouped into new stores, and saved to and
+    loaded from a binary file.
+    """
+
+    MAGIC = b"uncommented results\0"
+    VERSION = 1
+    # Column name and array typecode. Sizes are fixed so saved stores load
+    # on every platform.
+    COLUMNS = (
+        ("file", "I"),
+        ("row", "I"),
+        ("column", "I"),
+        ("start_byte", "Q"),
+        ("end_byte", "Q"),
+        ("capture", "H"),
+        ("signature_start", "q"),
+        ("signature_length", "I"),
+    )
+    # Keys of sort(), group_by() and count_by().
+    KEYS = ("path", "capture", "row", "column", "start_byte", "end_byte")
+    # Version, findings, whether signatures are kept, then the number and the
+    # encoded size of the paths and of the capture names, and the buffer size.
+    _HEADER = struct.Struct("<IQ?IIQQQ")
+
+    def __init__(self, signatures: bool = True):
+        from array import array
+
+        self.signatures = signatures
+        self.paths: list[str] = []
+        self.captures: list[str] = []
+        self._path_ids: dict[str, int] = {}
+        self._capture_ids: dict[str, int] = {}
+        self.columns = {name: array(code) for name, code in self.COLUMNS}
+        self.buffer = bytearray()
+
+    def _intern(self, table: list[str], ids: dict[str, int], value: str) -> int:
+        id_ = ids.get(value)
+        if id_ is None:
+            id_ = ids[value] = len(table)
+            table.append(value)
+        return id_
+
+    def add(self, path: str, found: Iterable[Finding]):
+        file_id = self._intern(self.paths, self._path_ids, path)
+        columns = self.columns
+        for finding in found:
+            row, column = finding.start_point
+            columns["file"].append(file_id)
+            columns["row"].append(row)
+            columns["column"].append(column)
+            columns["start_byte"].append(finding.start_byte)
+            columns["end_byte"].append(finding.end_byte)
+            columns["capture"].append(
+                self._intern(self.captures, self._capture_ids, finding.capture)
+            )
+            if self.signatures:
+                signature = finding.signature.encode()
+                columns["signature_start"].append(len(self.buffer))
+                columns["signature_length"].append(len(signature))
+                self.buffer += signature
+            else:
+                columns["signature_start"].append(-1)
+                columns["signature_length"].append(0)
+
+    def __len__(self) -> int:
+        return len(self.columns["file"])
+
+    def __getitem__(self, index: int) -> StoredFinding:
+        columns = self.columns
+        start = columns["signature_start"][index]
+        signature = None
+        if start >= 0:
+            end = start + columns["signature_length"][index]
+            signature = self.buffer[start:end].decode()
+        return StoredFinding(
+            self.paths[columns["file"][index]],
+            self.captures[columns["capture"][index]],
+            columns["row"][index],
+            columns["column"][index],
+            columns["start_byte"][index],
+            columns["end_byte"][index],
+            signature,
+        )
+
+    def __iter__(self) -> Iterator[StoredFinding]:
+        return map(self.__getitem__, range(len(self)))
+
+    def take(self, indices: Iterable[int]) -> "ResultStore":
+        """
+        Returns a store of the findings at `indices`, in that order. It shares
+        the interned names, and its signatures are copied into a new buffer.
+        """
+        from array import array
+
+        indices = array("Q", indices)
+        taken = ResultStore(self.signatures)
+        taken.paths, taken._path_ids = self.paths, self._path_ids
+        taken.captures, taken._capture_ids = self.captures, self._capture_ids
+        for name, code in self.COLUMNS[:-2]:
+            column = self.columns[name]
+            taken.columns[name] = array(code, [column[index] for index in indices])
+        starts, lengths = (
+            self.columns["signature_start"],
+            self.columns["signature_length"],
+        )
+        buffer = self.buffer
+        new_starts = taken.columns["signature_start"]
+        for index in indices:
+            start = starts[index]
+            if start < 0:
+                new_starts.append(-1)
+            else:
+                new_starts.append(len(taken.buffer))
+                taken.buffer += buffer[start : start + lengths[index]]
+        taken.columns["signature_length"] = array(
+            "I", [lengths[index] for index in indices]
+        )
+        return taken
+
+    def _key_column(self, key: str) -> list[int]:
+        """
+        The values to order the findings by `key`. Paths and capture names are
+        ranked, so their order is alphabetical rather than the interning order.
+        """
+        if key not in self.KEYS:
+            raise ValueError(f"unknown key {key!r}, expected one of {self.KEYS}")
+        if key in ("path", "capture"):
+            table = self.paths if key == "path" else self.captures
+            rank = [0] * len(table)
+            for position, id_ in enumerate(
+                sorted(range(len(table)), key=table.__getitem__)
+            ):
+                rank[id_] = position
+            column = self.columns["file" if key == "path" else "capture"]
+            return [rank[id_] for id_ in column]
+        return self.columns[key]
+
+    def sort(self, *keys: str) -> "ResultStore":
+        """
+        Returns the findings sorted by `keys`, by default by path and
+        position. The sort is stable. It uses NumPy when it is installed.
+        """
+        keys = keys or ("path", "start_byte")
+        numpy = _numpy()
+        if numpy is None:
+            order = list(range(len(self)))
+            for key in reversed(keys):
+                column = self._key_column(key)
+                order.sort(key=column.__getitem__)
+        else:
+            # lexsort takes the primary key last.
+            order = numpy.lexsort(
+                [
+                    numpy.asarray(self._key_column(key), dtype=numpy.uint64)
+                    for key in reversed(keys)
+                ]
+            ).tolist()
+        return self.take(order)
+
+    def filter(
+        self, captures: Iterable[str] | None = None, paths: Iterable[str] | None = None
+    ) -> "ResultStore":
+        """
+        Returns the findings with one of `captures` in one of `paths`. Either
+        may be None for any.
+        """
+        wanted_captures = wanted_paths = None
+        if captures is not None:
+            wanted_captures = {
+                self._capture_ids[c] for c in captures if c in self._capture_ids
+            }
+        if paths is not None:
+            wanted_paths = {self._path_ids[p] for p in paths if p in self._path_ids}
+        files, kinds = self.columns["file"], self.columns["capture"]
+        return self.take(
+            index
+            for index in range(len(self))
+            if (wanted_captures is None or kinds[index] in wanted_captures)
+            and (wanted_paths is None or files[index] in wanted_paths)
+        )
+
+    def _groups(self, key: str) -> Tuple[list, Iterable[Hashable]]:
+        if key == "path":
+            return self.paths, self.columns["file"]
+        if key == "capture":
+            return self.captures, self.columns["capture"]
+        self._key_column(key)
+        return None, self.columns[key]
+
+    def count_by(self, key: str) -> Counter:
+        """
+        Counts the findings per value of `key`, such as "capture" or "path".
+        """
+        table, column = self._groups(key)
+        counts = Counter(column)
+        if table is None:
+            return counts
+        return Counter({table[id_]: count for id_, count in counts.items()})
+
+    def group_by(self, key: str) -> dict[Hashable, "ResultStore"]:
+        """
+        Splits the findings into a store per value of `key`, in the order the
+        values first occur.
+        """
+        table, column = self._groups(key)
+        groups: dict[Hashable, list[int]] = {}
+        for index, value in enumerate(column):
+            groups.setdefault(value, []).append(index)
+        return {
+            value if table is None else table[value]: self.take(indices)
+            for value, indices in groups.items()
+        }
+
+    def save(self, path: str):
+        """
+        Writes the store to a binary file: a header, the interned names, the
+        columns as little-endian arrays and the signature buffer.
+        """
+        paths = "\0".join(self.paths).encode()
+        captures = "\0".join(self.captures).encode()
+        with open(path, "wb") as f:
+            f.write(self.MAGIC)
+            f.write(
+                self._HEADER.pack(
+                    self.VERSION,
+                    len(self),
+                    self.signatures,
+                    len(self.paths),
+                    len(self.captures),
+                    len(paths),
+                    len(captures),
+                    len(self.buffer),
+                )
+            )
+            f.write(paths)
+            f.write(captures)
+            for name, _ in self.COLUMNS:
+                column = self.columns[name]
+                if sys.byteorder == "big":
+                    column = column[:]
+                    column.byteswap()
+                f.write(column.tobytes())
+            f.write(self.buffer)
+
+    @classmethod
+    def load(cls, path: str) -> "ResultStore":
+        from array import array
+
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(cls.MAGIC):
+            raise ValueError(f"{path} is not a result store")
+        offset = len(cls.MAGIC)
+        (
+            version,
+            count,
+            signatures,
+            path_count,
+            capture_count,
+            paths_size,
+            captures_size,
+            buffer_size,
+        ) = cls._HEADER.unpack_from(data, offset)
+        if version != cls.VERSION:
+            raise ValueError(
+                f"{path} has result store version {version}, expected {cls.VERSION}"
+            )
+        offset += cls._HEADER.size
+        store = cls(signatures)
+        for table, ids, names, size in (
+            (store.paths, store._path_ids, path_count, paths_size),
+            (store.captures, store._capture_ids, capture_count, captures_size),
+        ):
+            if names:
+                for name in data[offset : offset + size].decode().split("\0"):
+                    store._intern(table, ids, name)
+            offset += size
+        for name, code in cls.COLUMNS:
+            column = array(code)
+            end = offset + count * column.itemsize
+            column.frombytes(data[offset:end])
+            if sys.byteorder == "big":
+                column.byteswap()
+            store.columns[name] = column
+            offset = end
+        store.buffer = bytearray(data[offset : offset + buffer_size])
+        return store
+
+
+# Exit status of a run in which a file was skipped or partially checked.
+EXIT_LIMITED = 3
+
+
+def main():
+    from argparse import ArgumentParser
+
+    argParser = ArgumentParser(
+        description="Find and display commented/uncommented function declarations"
+    )
+    argParser.add_argument(
+        "paths",
+        nargs="*",
+        metavar="path",
+        help="Files or directories to analyze. Directories are searched for headers.",
+    )
+    argParser.add_argument(
+        "--diff",
+        metavar="REV",
+        help="Only check lines changed since the git revision REV.",
+    )
+    argParser.add_argument(
+        "--staged",
+        action="store_true",
+        help="Check the headers staged in the git index instead of the working "
+        "tree, as a pre-commit hook. Paths limit the files checked.",
+    )
+    argParser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=1,
+        help="Number of worker processes. 0 uses every available core.",
+    )
+    argParser.add_argument(
+        "--split",
+        type=int,
+        metavar="BYTES",
+        help="With -j, cut files larger than BYTES at top-level declarations "
+        "into chunks of about BYTES and check the chunks in parallel.",
+    )
+    argParser.add_argument(
+        "--cache",
+        metavar="FILE",
+        help="Cache results in this file so unchanged files are not parsed again.",
+    )
+    argParser.add_argument(
+        "--cache-size",
+        type=int,
+        default=200_000,
+        metavar="N",
+        help="Maximum number of cached files (default: %(default)s).",
+    )
+    argParser.add_argument(
+        "--engine",
+        choices=("auto", *ENGINES, "compare"),
+        default="auto",
+        help="How to search the syntax tree. 'auto' (the default) walks small "
+        "inputs to skip compiling the query. 'compare' runs every engine and "
+        "reports their differences on stderr.",
+    )
+    argParser.add_argument(
+        "--lang",
+        choices=("auto", *LANGUAGES),
+        default="auto",
+        help="Grammar and query to check headers with. 'auto' (the default) "
+        "checks .h files that look like plain C with the smaller C profile.",
+    )
+    argParser.add_argument(
+        "--checks",
+        metavar="LIST",
+        help="Comma-separated checks to run, by capture name (e.g. "
+        "function.declaration), prefix (function) or glob (*operator*). "
+        "A leading - skips a check, as in --checks=-macro,-*operator*. "
+        "The query is compiled with the selected patterns only.",
+    )
+    argParser.add_argument(
+        "--max-file-size",
+        type=int,
+        metavar="BYTES",
+        help="Skip files larger than BYTES.",
+    )
+    argParser.add_argument(
+        "--parse-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Skip files that take longer than SECONDS to parse.",
+    )
+    argParser.add_argument(
+        "--query-timeout",
+        type=float,
+        metavar="SECONDS",
+        help="Stop querying a file after SECONDS and report the findings so far.",
+    )
+    argParser.add_argument(
+        "--match-limit",
+        type=int,
+        metavar="N",
+        help="Let the query of a file have at most N matches in progress, "
+        "dropping the oldest beyond that.",
+    )
+    argParser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Print per-phase timings, matches per capture and filter counts "
+        "to stderr.",
+    )
+    argParser.add_argument(
+        "--stats-format",
+        choices=("text", "json"),
+        default="text",
+        help="With --stats, print them as a table (the default) or as JSON.",
+    )
+    argParser.add_argument(
+        "--format",
+        choices=tuple(WRITERS),
+        default="text",
+        help="Output format: 'text' (the default) prints one line per finding, "
+        "'jsonl' one JSON object per finding and 'sarif' a SARIF 2.1.0 log. "
+        "Findings are written as soon as each file is checked.",
+    )
+    argParser.add_argument(
+        "--store",
+        metavar="FILE",
+        help="Also save the reported findings to FILE as a compact binary "
+        "ResultStore, for sorting, filtering and grouping large reports.",
+    )
+    argParser.add_argument(
+        "--history",
+        metavar="DB",
+        help="Record the findings of a git commit in the SQLite database DB "
+        "instead of reporting them. Only the headers changed since the last "
+        "recorded commit are checked.",
+    )
+    argParser.add_argument(
+        "--commit",
+        default="HEAD",
+        metavar="REV",
+        help="With --history, the commit to record (default: %(default)s).",
+    )
+    argParser.add_argument(
+        "--coverage",
+        action="store_true",
+        help="Instead of the findings, print how many declarations are "
+        "documented per directory and capture name.",
+    )
+    argParser.add_argument(
+        "--coverage-format",
+        choices=("text", "json"),
+        default="text",
+        help="With --coverage, print it as a table (the default) or as JSON.",
+    )
+    argParser.add_argument(
+        "--baseline",
+        metavar="FILE",
+        help="Only report findings that are not recorded in FILE. Findings are "
+        "matched by file, scope and signature, so moved lines still match.",
+    )
+    argParser.add_argument(
+        "--update-baseline",
+        action="store_true",
+        help="Record every current finding in the --baseline FILE instead of "
+        "reporting them.",
+    )
+    argParser.add_argument(
+        "--follow-includes",
+        action="store_true",
+        help="Treat the paths as root headers and check every header they "
+        "reach through #include directives, each once.",
+    )
+    argParser.add_argument(
+        "-I",
+        dest="include_dirs",
+        action="append",
+        default=[],
+        metavar="DIR",
+        help="With --follow-includes, look for included headers in DIR. "
+        "May be given more than once.",
+    )
+    argParser.add_argument(
+        "--watch",
+        metavar="DIR",
+        help="Keep the headers below DIR parsed and, whenever they change, print "
+        "the findings that were added (+) and resolved (-).",
+    )
+    argParser.add_argument(
+        "--serve",
+        action="store_true",
+        help="Run a JSON-RPC server on stdin/stdout that keeps documents parsed "
+        "between edits.",
+    )
+    argParser.add_argument(
+        "--socket",
+        metavar="PATH",
+        help="With --serve, listen on a Unix socket at PATH instead of stdin/stdout.",
+    )
+    args = argParser.parse_args()
+
+    checks = None
+    if args.checks is not None:
+        checks = tuple(
+            check.strip() for check in args.checks.split(",") if check.strip()
+        )
+        try:
+            select_checks(checks)
+        except ValueError as error:
+            argParser.error(str(error))
+
+    if args.serve and args.watch is not None:
+        argParser.error("--serve cannot be combined with --watch")
+    if args.serve or args.watch is not None:
+        # Documents are checked one at a time as they change, so only the
+        # options that choose how a document is checked apply.
+        unsupported = [
+            option
+            for dest, option in (
+                ("paths", "paths"),
+                ("diff", "--diff"),
+                ("staged", "--staged"),
+                ("jobs", "--jobs"),
+                ("split", "--split"),
+                ("cache", "--cache"),
+                ("cache_size", "--cache-size"),
+                ("max_file_size", "--max-file-size"),
+                ("parse_timeout", "--parse-timeout"),
+                ("query_timeout", "--query-timeout"),
+                ("match_limit", "--match-limit"),
+                ("stats", "--stats"),
+                ("stats_format", "--stats-format"),
+                ("format", "--format"),
+                ("store", "--store"),
+                ("history", "--history"),
+                ("commit", "--commit"),
+                ("coverage", "--coverage"),
+                ("coverage_format", "--coverage-format"),
+                ("baseline", "--baseline"),
+                ("update_baseline", "--update-baseline"),
+                ("follow_includes", "--follow-includes"),
+                ("include_dirs", "-I"),
+            )
+            if getattr(args, dest) not in (argParser.get_default(dest), [])
+        ]
+        if unsupported:
+            argParser.error(
+                f"{'--serve' if args.serve else '--watch'} cannot be combined with "
+                + ", ".join(unsupported)
+            )
+        engine = "query" if args.engine in {"auto", "compare"} else args.engine
+
+    if args.serve:
+        server = Server(engine, args.lang, checks)
+        # Compile the query before the first request.
+        _query(args.lang if args.lang in LANGUAGES else "cpp", server.checks)
+        if args.socket is not None:
+            serve_socket(server, args.socket)
+        else:
+            server.serve(sys.stdin.buffer, sys.stdout.buffer)
+        return
+
+    if args.watch is not None:
+        events = watch_events(args.watch)
+        watcher = Watcher(args.watch, engine, args.lang, checks)
+        try:
+            watcher.run(events, sys.stdout)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            events.close()
+        return
+
+    if (
+        not args.paths
+        and args.diff is None
+        and not args.staged
+        and args.history is None
+    ):
+        argParser.error(
+            "at least one path is required unless --diff, --staged or --history "
+            "is given"
+        )
+    if args.follow_includes and args.diff is not None:
+        argParser.error("--follow-includes cannot be combined with --diff")
+    if args.staged and (args.diff is not None or args.follow_includes or args.coverage):
+        argParser.error(
+            "--staged cannot be combined with --diff, --follow-includes or --coverage"
+        )
+    if args.history is not None and (
+        args.diff is not None
+        or args.staged
+        or args.follow_includes
+        or args.coverage
+        or args.baseline is not None
+        or args.store is not None
+    ):
+        argParser.error(
+            "--history cannot be combined with --diff, --staged, --follow-includes, "
+            "--coverage, --baseline or --store"
+        )
+    if args.include_dirs and not args.follow_includes:
+        argParser.error("-I requires --follow-includes")
+    if args.update_baseline and args.baseline is None:
+        argParser.error("--update-baseline requires --baseline")
+    if args.coverage and (args.diff or args.follow_includes or args.baseline):
+        argParser.error(
+            "--coverage cannot be combined with --diff, --follow-includes or --baseline"
+        )
+    limits = Limits(
+        args.max_file_size, args.parse_timeout, args.query_timeout, args.match_limit
+    )
+    if args.coverage and limits != Limits():
+        argParser.error("--coverage cannot be combined with limits")
+    if args.engine == "walk" and (
+        args.query_timeout is not None or args.match_limit is not None
+    ):
+        argParser.error(
+            "--engine walk cannot be combined with --query-timeout or --match-limit"
+        )
+
+    ranges = None
+    if args.staged or args.history is not None:
+        files = args.paths
+    elif args.diff is not None:
+        ranges = diff_ranges(args.diff, args.paths)
+        explicit = set(args.paths)
+        files = [
+            path
+            for path in ranges
+            if (path.endswith(HEADER_SUFFIXES) or path in explicit)
+            and os.path.isfile(path)
+        ]
+    else:
+        files = collect_files(args.paths)
+    jobs = args.jobs if args.jobs > 0 else (os.cpu_count() or 1)
+    if args.coverage:
+        rollups, total = coverage_in_files(files, jobs, args.engine, args.lang, checks)
+        if args.coverage_format == "json":
+            import json
+
+            result = {
+                "directories": {
+                    path: coverage.as_dict() for path, coverage in rollups.items()
+                },
+                "total": total.as_dict(),
+            }
+            print(json.dumps(result, indent=2))
+        else:
+            print(format_coverage(rollups, total))
+        return
+    options = ScanOptions(
+        args.cache, args.engine, args.lang, checks, limits, args.split, args.cache_size
+    )
+    # The files that hit a limit are told apart by their Stats.
+    stats = Stats() if args.stats or limits != Limits() else None
+    if args.history is not None:
+        history = History(args.history)
+        try:
+            commit, checked, total = record_history(
+                history, args.commit, files, jobs, options, stats
+            )
+        finally:
+            history.close()
+        print(f"{commit}: {checked} files checked, {total} findings")
+        if stats is not None:
+            _report_stats(stats, args.stats_format if args.stats else None)
+        return
+    if args.staged:
+        results = find_in_staged(files, jobs, options, stats)
+    elif args.follow_includes:
+        results = find_in_include_graph(files, args.include_dirs, jobs, options, stats)
+    else:
+        results = find_in_files(files, jobs, options, ranges, stats)
+    baseline = None
+    if args.update_baseline:
+        recorded = Baseline()
+    elif args.baseline is not None and os.path.exists(args.baseline):
+        baseline = Baseline.load(args.baseline)
+    store = None if args.store is None else ResultStore()
+    if args.format == "text":
+        # Unless the paths come from the user, name the file of every finding.
+        with_paths = (
+            len(files) > 1
+            or args.follow_includes
+            or args.staged
+            or args.diff is not None
+        )
+        writer = TextWriter(sys.stdout, with_paths)
+    else:
+        writer = WRITERS[args.format](sys.stdout)
+    for path, hooligans in results:
+        if args.update_baseline:
+            recorded.add(path, hooligans)
+            continue
+        if baseline is not None:
+            hooligans = baseline.new(path, hooligans)
+        writer.write(path, hooligans)
+        if store is not None:
+            store.add(path, hooligans)
+    writer.close()
+    if store is not None:
+        store.save(args.store)
+
+    if args.update_baseline:
+        recorded.save(args.baseline)
+
+    if stats is not None:
+        _report_stats(stats, args.stats_format if args.stats else None)
+
+
+def _report_stats(stats: Stats, mode: str | None):
+    """
+    Prints `stats` to stderr in the --stats-format `mode`, or only the files
+    that hit a limit when `mode` is None, and exits with EXIT_LIMITED if any did.
+    """
+    if mode == "json":
+        import json
+
+        print(json.dumps(stats.as_dict(), indent=2), file=sys.stderr)
+    elif mode == "text":
+        print(stats.format(), file=sys.stderr)
+    else:
+        for path, file_stats in stats.per_file.items():
+            if file_stats.limits:
+                limits_hit = ", ".join(file_stats.limits)
+                print(
+                    f"{path}: {file_stats.status}, {limits_hit} exceeded",
+                    file=sys.stderr,
+                )
+    if stats.limits:
+        sys.exit(EXIT_LIMITED)
 
 
 if __name__ == "__main__":